@@ -0,0 +1,111 @@
+"""
+ASGI middleware negotiating brotli/gzip response compression via Accept-Encoding.
+"""
+
+from __future__ import annotations
+
+import gzip
+from typing import List, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:  # brotli — опциональная зависимость: без неё предлагаем только gzip
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    # При равном q предпочитаем brotli: на JSON с кириллицей он на 15-25% компактнее gzip
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Выбрать кодировку по Accept-Encoding (RFC 9110: q-значения, `*`, q=0 — запрет)."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.strip().split(";")
+        q = 1.0
+        for param in params:
+            # Имена параметров регистронезависимы: "gzip;Q=0" — тоже запрет
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.response_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.response_gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы не короче RESPONSE_COMPRESSION_MIN_BYTES. Ответы API небольшие и не потоковые,
+    поэтому тело собирается целиком и сжимается одним вызовом; уже сжатые ответы и нетекстовые
+    типы пропускаются как есть.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.response_compression_min_bytes) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+__all__ = ["CompressionMiddleware", "negotiate_encoding", "supported_encodings", "compress"]
@@ -0,0 +1,62 @@
+"""
+Fast JSON rendering and field projection for API responses.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.models.schemas import ASK_RESPONSE_SECTIONS, AskResponse
+
+try:  # orjson — опциональная зависимость: без неё рендерим стандартным json
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse на orjson: UTF-8 без \\u-экранирования кириллицы и без пробелов.
+    Принимает уже готовый dict — вызывающий сам решает, какие поля сериализовать.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def effective_chunk_limit(requested: int | None) -> int | None:
+    """Меньший из лимитов запроса и CONTEXT_CHUNK_MAX_CHARS; None — без обрезки."""
+    limits = [limit for limit in (requested, settings.context_chunk_max_chars) if limit]
+    return min(limits) if limits else None
+
+
+def project_ask_response(
+    response: AskResponse,
+    include: Iterable[str] | None = None,
+    max_chunk_chars: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Сериализовать в dict только запрошенные разделы ответа. Исключённые разделы не дампятся
+    вовсе (context_chunks — самая тяжёлая часть), тексты чанков обрезаются до лимита.
+    """
+    sections = set(ASK_RESPONSE_SECTIONS if include is None else include)
+    payload = response.model_dump(exclude={name for name in ASK_RESPONSE_SECTIONS if name not in sections})
+    limit = effective_chunk_limit(max_chunk_chars)
+    if limit and payload.get("context_chunks"):
+        for chunk in payload["context_chunks"]:
+            if len(chunk["text"]) > limit:
+                chunk["text"] = chunk["text"][:limit]
+    return payload
+
+
+__all__ = ["FastJSONResponse", "project_ask_response", "effective_chunk_limit", "dumps"]
@@ -2,15 +2,20 @@ from __future__ import annotations
 
 import logging
 
-from fastapi import APIRouter, Header, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
 
+from app.api.responses import FastJSONResponse, project_ask_response
 from app.config import settings
-from app.embeddings.client import EmbeddingsClient
 from app.indexing.pipeline import ReindexService
-from app.llm.client import LLMClient
-from app.models.schemas import AskRequest, AskResponse, ReindexRequest, ReindexResponse
+from app.indexing.stats import load_index_stats
+from app.metrics import REGISTRY
+from app.models.schemas import AskRequest, AskResponse, ChatRequest, ChatResponse, ReindexRequest, ReindexResponse
+from app.rag.chat import ChatService
 from app.rag.pipeline import RAGService
+from app.rag.precomputed import precompute_after_reindex
+from app.rag.sessions import get_session_store
 from app.vector_store import get_vector_store
+from app.vector_store.base import IndexCompatibilityError
 from uuid import uuid4
 
 router = APIRouter()
@@ -27,35 +32,82 @@ def _check_admin_token(x_admin_token: str | None) -> None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
 
+def _client_key(http_request: Request, x_api_key: str | None) -> str | None:
+    """Ключ клиента для честной очереди: API-ключ, иначе IP."""
+    if x_api_key:
+        return f"key:{x_api_key}"
+    return f"ip:{http_request.client.host}" if http_request.client else None
+
+
 @router.post("/admin/reindex", response_model=ReindexResponse, summary="Reindex corpus")
 def admin_reindex(
     reindex_request: ReindexRequest,
     x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
 ) -> ReindexResponse:
     _check_admin_token(x_admin_token)
+    from app.embeddings.client import EmbeddingsClient  # openai импортируется лениво, см. app.warmup
 
-    service = ReindexService(get_vector_store(), EmbeddingsClient())
-    logger.info("Admin reindex requested", extra={"mode": reindex_request.mode})
+    service = ReindexService(get_vector_store(), EmbeddingsClient(), precompute=precompute_after_reindex)
+    logger.info(
+        "Admin reindex requested",
+        extra={"mode": reindex_request.mode, "resume": reindex_request.resume, "profile": reindex_request.profile},
+    )
 
-    summary = service.run()
+    summary = service.run(resume=reindex_request.resume, profile=reindex_request.profile)
     response = ReindexResponse(
         status="completed",
         indexed_chunks=summary.indexed_chunks,
         elapsed_sec=round(summary.elapsed_sec, 2),
+        index_version=summary.index_version,
+        skipped_duplicates=summary.skipped_duplicates,
+        resumed_chunks=summary.resumed_chunks,
+        precomputed_answers=summary.precomputed_answers,
+        profile=summary.profile,
     )
     logger.info(
         "Admin reindex completed",
-        extra={"indexed_chunks": response.indexed_chunks, "elapsed_sec": response.elapsed_sec},
+        extra={
+            "indexed_chunks": response.indexed_chunks,
+            "resumed_chunks": response.resumed_chunks,
+            "elapsed_sec": response.elapsed_sec,
+        },
     )
     return response
 
 
-@router.post("/api/v1/ask", response_model=AskResponse, summary="Ask question about LOTR corpus")
-def ask(request: AskRequest) -> AskResponse:
+@router.get("/admin/metrics", summary="In-process metrics snapshot")
+def admin_metrics(x_admin_token: str | None = Header(default=None, alias="X-Admin-Token")) -> dict:
+    _check_admin_token(x_admin_token)
+    return REGISTRY.snapshot()
+
+
+@router.get("/admin/index/stats", summary="Index statistics manifest")
+def admin_index_stats(x_admin_token: str | None = Header(default=None, alias="X-Admin-Token")) -> dict:
+    _check_admin_token(x_admin_token)
+    stats = load_index_stats()
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Index stats not found, run reindex first")
+    return stats
+
+
+@router.post(
+    "/api/v1/ask",
+    response_model=AskResponse,
+    response_class=FastJSONResponse,
+    summary="Ask question about LOTR corpus",
+)
+def ask(
+    request: AskRequest,
+    http_request: Request,
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+) -> FastJSONResponse:
     question = (request.question or "").strip()
     if not question:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Question must not be empty")
 
+    from app.embeddings.client import EmbeddingsClient
+    from app.llm.client import LLMClient, LLMTimeoutError
+
     request_id = str(uuid4())
     logger.info("Ask request", extra={"len": len(question), "request_id": request_id})
     service = RAGService(
@@ -63,8 +115,66 @@ def ask(request: AskRequest) -> AskResponse:
         embeddings_client=EmbeddingsClient(),
         llm_client=LLMClient(),
         request_id=request_id,
+        client_id=_client_key(http_request, x_api_key),
+    )
+    try:
+        response = service.answer_question(request)
+    except IndexCompatibilityError as exc:
+        logger.error("Index/embeddings mismatch", extra={"error": str(exc), "request_id": request_id})
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
+    except LLMTimeoutError as exc:
+        logger.warning("LLM deadline exceeded", extra={"request_id": request_id})
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="LLM response timed out") from exc
+    # Ответ уже провалидирован моделью: отдаём проекцию напрямую, минуя повторную сериализацию FastAPI
+    return FastJSONResponse(project_ask_response(response, request.include, request.max_chunk_chars))
+
+
+@router.post(
+    "/api/v1/chat",
+    response_model=ChatResponse,
+    response_class=FastJSONResponse,
+    summary="Ask follow-up questions within a chat session",
+)
+def chat(
+    request: ChatRequest,
+    http_request: Request,
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+) -> FastJSONResponse:
+    question = (request.question or "").strip()
+    if not question:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Question must not be empty")
+
+    from app.embeddings.client import EmbeddingsClient
+    from app.llm.client import LLMClient, LLMTimeoutError
+
+    request_id = str(uuid4())
+    logger.info(
+        "Chat request",
+        extra={"len": len(question), "session_id": request.session_id, "request_id": request_id},
+    )
+    service = ChatService(
+        vector_store=get_vector_store(),
+        embeddings_client=EmbeddingsClient(),
+        llm_client=LLMClient(),
+        request_id=request_id,
+        client_id=_client_key(http_request, x_api_key),
     )
-    return service.answer_question(request)
+    try:
+        response = service.chat(request)
+    except IndexCompatibilityError as exc:
+        logger.error("Index/embeddings mismatch", extra={"error": str(exc), "request_id": request_id})
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
+    except LLMTimeoutError as exc:
+        logger.warning("LLM deadline exceeded", extra={"request_id": request_id})
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="LLM response timed out") from exc
+    return FastJSONResponse(project_ask_response(response, request.include, request.max_chunk_chars))
+
+
+@router.delete("/api/v1/chat/{session_id}", status_code=status.HTTP_204_NO_CONTENT, summary="End chat session")
+def end_chat(session_id: str) -> Response:
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 __all__ = ["router"]
@@ -5,7 +5,7 @@ Application configuration loaded from environment variables.
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Literal
 
 from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -22,17 +22,108 @@ class Settings(BaseSettings):
 
     openai_api_key: SecretStr | None = Field(default=None, alias="OPENAI_API_KEY")
     llm_model_name: str = Field(default="gpt-4.1-mini", alias="LLM_MODEL_NAME")
+    llm_timeout_sec: float = Field(default=30.0, gt=0, alias="LLM_TIMEOUT_SEC")
+    llm_hedge_enabled: bool = Field(default=False, alias="LLM_HEDGE_ENABLED")
+    llm_hedge_percentile: float = Field(default=95.0, gt=0, lt=100, alias="LLM_HEDGE_PERCENTILE")
+    llm_hedge_min_samples: int = Field(default=20, ge=1, alias="LLM_HEDGE_MIN_SAMPLES")
+    llm_hedge_window: int = Field(default=200, ge=1, alias="LLM_HEDGE_WINDOW")
+    llm_max_concurrency: int = Field(default=32, ge=1, alias="LLM_MAX_CONCURRENCY")
+    llm_max_retries: int = Field(default=2, ge=0, alias="LLM_MAX_RETRIES")
+    llm_backoff_max_sec: float = Field(default=2.0, gt=0, alias="LLM_BACKOFF_MAX_SEC")
     embedding_model_name: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL_NAME")
+    embedding_dimensions: int | None = Field(default=None, gt=0, alias="EMBEDDING_DIMENSIONS")
+    embed_max_batch_size: int = Field(default=512, gt=0, le=2048, alias="EMBED_MAX_BATCH_SIZE")
+    embed_max_batch_tokens: int = Field(default=100_000, gt=0, alias="EMBED_MAX_BATCH_TOKENS")
+    embed_max_retries: int = Field(default=8, ge=0, alias="EMBED_MAX_RETRIES")
+    embed_backoff_base_sec: float = Field(default=1.0, gt=0, alias="EMBED_BACKOFF_BASE_SEC")
+    embed_backoff_max_sec: float = Field(default=60.0, gt=0, alias="EMBED_BACKOFF_MAX_SEC")
+    # Вопросы пользователя: короткий бюджет повторов, чтобы /ask не ждал минутами (reindex — EMBED_MAX_RETRIES)
+    embed_query_max_retries: int = Field(default=2, ge=0, alias="EMBED_QUERY_MAX_RETRIES")
+    embed_query_backoff_max_sec: float = Field(default=2.0, gt=0, alias="EMBED_QUERY_BACKOFF_MAX_SEC")
+    embed_target_latency_sec: float = Field(default=5.0, gt=0, alias="EMBED_TARGET_LATENCY_SEC")
+    embed_microbatch_enabled: bool = Field(default=False, alias="EMBED_MICROBATCH_ENABLED")
+    embed_microbatch_window_ms: float = Field(default=5.0, ge=0, alias="EMBED_MICROBATCH_WINDOW_MS")
+    embed_microbatch_max_size: int = Field(default=64, gt=0, le=2048, alias="EMBED_MICROBATCH_MAX_SIZE")
+    embed_microbatch_timeout_sec: float = Field(default=30.0, gt=0, alias="EMBED_MICROBATCH_TIMEOUT_SEC")
 
     vector_store_backend: str = Field(default="chroma", alias="VECTOR_STORE_BACKEND")
     vector_store_path: str = Field(default="./data/vector_store", alias="VECTOR_STORE_PATH")
+    vector_metric: Literal["cosine", "ip", "l2"] = Field(default="cosine", alias="VECTOR_METRIC")
+    hnsw_m: int = Field(default=16, gt=0, alias="HNSW_M")
+    hnsw_construction_ef: int = Field(default=100, gt=0, alias="HNSW_CONSTRUCTION_EF")
+    hnsw_search_ef: int = Field(default=100, gt=0, alias="HNSW_SEARCH_EF")
+    compact_quantization: str = Field(default="int8", alias="COMPACT_QUANTIZATION")
+    compact_pq_subvectors: int = Field(default=64, gt=0, alias="COMPACT_PQ_SUBVECTORS")
+    compact_rescore_factor: int = Field(default=4, gt=0, alias="COMPACT_RESCORE_FACTOR")
+    shard_count: int = Field(default=4, gt=0, alias="SHARD_COUNT")
+    shard_backend: str = Field(default="chroma", alias="SHARD_BACKEND")
+    shard_partition: Literal["book_id", "hash"] = Field(default="hash", alias="SHARD_PARTITION")
+    shard_search_workers: int = Field(default=8, gt=0, alias="SHARD_SEARCH_WORKERS")
+    snapshot_poll_interval_sec: float = Field(default=2.0, ge=0, alias="SNAPSHOT_POLL_INTERVAL_SEC")
+    snapshot_keep: int = Field(default=3, ge=1, alias="SNAPSHOT_KEEP")
 
     corpus_dir: str = Field(default="./data/corpus", alias="CORPUS_DIR")
+    dedup_enabled: bool = Field(default=True, alias="DEDUP_ENABLED")
+    dedup_threshold: float = Field(default=0.85, gt=0, le=1, alias="DEDUP_THRESHOLD")
+    dedup_num_perm: int = Field(default=128, ge=16, alias="DEDUP_NUM_PERM")
+    dedup_shingle_size: int = Field(default=3, ge=1, alias="DEDUP_SHINGLE_SIZE")
 
     relevance_threshold: float = Field(default=0.78, alias="RELEVANCE_THRESHOLD")
     min_good_chunks: int = Field(default=2, alias="MIN_GOOD_CHUNKS")
     max_context_chunks: int = Field(default=5, alias="MAX_CONTEXT_CHUNKS")
 
+    warmup_enabled: bool = Field(default=True, alias="WARMUP_ENABLED")
+    warmup_retry_base_sec: float = Field(default=1.0, gt=0, alias="WARMUP_RETRY_BASE_SEC")
+    warmup_retry_max_sec: float = Field(default=30.0, gt=0, alias="WARMUP_RETRY_MAX_SEC")
+
+    ask_coalescing_enabled: bool = Field(default=True, alias="ASK_COALESCING_ENABLED")
+    # Готовые ответы на частые вопросы (VECTOR_STORE_PATH/precomputed_answers.json) отдаются до эмбеддинга и LLM
+    precomputed_answers_enabled: bool = Field(default=True, alias="PRECOMPUTED_ANSWERS_ENABLED")
+    precompute_after_reindex: bool = Field(default=False, alias="PRECOMPUTE_AFTER_REINDEX")
+    precomputed_questions_file: str = Field(
+        default="./data/precomputed/questions_lotr.json", alias="PRECOMPUTED_QUESTIONS_FILE"
+    )
+    precompute_concurrency: int = Field(default=4, gt=0, alias="PRECOMPUTE_CONCURRENCY")
+    # Потолок длины текста каждого context_chunks в ответе /ask (None — без обрезки)
+    context_chunk_max_chars: int | None = Field(default=None, gt=0, alias="CONTEXT_CHUNK_MAX_CHARS")
+
+    response_compression_enabled: bool = Field(default=True, alias="RESPONSE_COMPRESSION_ENABLED")
+    response_compression_min_bytes: int = Field(default=1024, ge=0, alias="RESPONSE_COMPRESSION_MIN_BYTES")
+    response_gzip_level: int = Field(default=5, ge=1, le=9, alias="RESPONSE_GZIP_LEVEL")
+    response_brotli_quality: int = Field(default=4, ge=0, le=11, alias="RESPONSE_BROTLI_QUALITY")
+
+    admission_enabled: bool = Field(default=True, alias="ADMISSION_ENABLED")
+    admission_embedding_concurrency: int = Field(default=32, ge=1, alias="ADMISSION_EMBEDDING_CONCURRENCY")
+    admission_search_concurrency: int = Field(default=16, ge=1, alias="ADMISSION_SEARCH_CONCURRENCY")
+    admission_llm_concurrency: int = Field(default=16, ge=1, alias="ADMISSION_LLM_CONCURRENCY")
+    admission_max_queue: int = Field(default=64, ge=0, alias="ADMISSION_MAX_QUEUE")
+    admission_max_queue_wait_sec: float = Field(default=10.0, gt=0, alias="ADMISSION_MAX_QUEUE_WAIT_SEC")
+    admission_retry_after_sec: float = Field(default=2.0, ge=0, alias="ADMISSION_RETRY_AFTER_SEC")
+
+    hierarchical_retrieval_enabled: bool = Field(default=False, alias="HIERARCHICAL_RETRIEVAL_ENABLED")
+    hierarchy_top_chapters: int = Field(default=8, gt=0, alias="HIERARCHY_TOP_CHAPTERS")
+    hierarchy_summaries_enabled: bool = Field(default=False, alias="HIERARCHY_SUMMARIES_ENABLED")
+    hierarchy_summary_input_chars: int = Field(default=12000, gt=0, alias="HIERARCHY_SUMMARY_INPUT_CHARS")
+
+    mmr_enabled: bool = Field(default=False, alias="MMR_ENABLED")
+    mmr_lambda: float = Field(default=0.7, ge=0.0, le=1.0, alias="MMR_LAMBDA")
+
+    chat_session_backend: Literal["memory", "sqlite"] = Field(default="memory", alias="CHAT_SESSION_BACKEND")
+    chat_session_path: str = Field(default="./data/chat_sessions.sqlite3", alias="CHAT_SESSION_PATH")
+    chat_session_ttl_sec: float = Field(default=1800.0, gt=0, alias="CHAT_SESSION_TTL_SEC")
+    chat_max_sessions: int = Field(default=1000, gt=0, alias="CHAT_MAX_SESSIONS")
+    # Сколько последних ходов (вопрос + краткий ответ) попадает в промпт и хранится в сессии
+    chat_history_turns: int = Field(default=3, ge=0, alias="CHAT_HISTORY_TURNS")
+    chat_history_answer_chars: int = Field(default=300, gt=0, alias="CHAT_HISTORY_ANSWER_CHARS")
+    chat_candidate_pool: int = Field(default=30, gt=0, alias="CHAT_CANDIDATE_POOL")
+    chat_context_decay: float = Field(default=0.5, ge=0.0, le=1.0, alias="CHAT_CONTEXT_DECAY")
+    chat_max_incremental_turns: int = Field(default=3, ge=0, alias="CHAT_MAX_INCREMENTAL_TURNS")
+
+    # Профиль reindex (стадии, пропускная способность, память) в ответе и в REINDEX_PROFILE_DIR
+    reindex_profile_enabled: bool = Field(default=False, alias="REINDEX_PROFILE_ENABLED")
+    reindex_profile_tracemalloc: bool = Field(default=False, alias="REINDEX_PROFILE_TRACEMALLOC")
+    reindex_profile_dir: str = Field(default="./data/reindex_profiles", alias="REINDEX_PROFILE_DIR")
+
     chunk_size_chars: int = Field(default=1000, alias="CHUNK_SIZE_CHARS")
     chunk_overlap_chars: int = Field(default=200, alias="CHUNK_OVERLAP_CHARS")
 
@@ -4,15 +4,45 @@ OpenAI embeddings client.
 
 from __future__ import annotations
 
-from typing import List, Sequence
+import base64
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
 
+import numpy as np
+import openai
 from openai import OpenAI
 
 from app.config import settings
+from app.embeddings.microbatch import EmbeddingMicroBatcher
+from app.embeddings.throttling import RETRYABLE_ERRORS, AdaptiveBatchSize, BackoffPolicy
+from app.embeddings.tokens import count_tokens
+from app.vector_store.batch import ChunkBatch
 
 DEFAULT_EMBEDDING_MODEL = settings.embedding_model_name
+DEFAULT_EMBEDDING_DIMENSIONS = settings.embedding_dimensions
 DEFAULT_EMBED_BATCH_SIZE = 64
 
+logger = logging.getLogger(__name__)
+
+# Микробатчеры запросов на процесс: по одному на (модель, размерность)
+_QUERY_BATCHERS: Dict[Tuple[str, int | None], EmbeddingMicroBatcher] = {}
+_QUERY_BATCHERS_LOCK = threading.Lock()
+
+
+@dataclass
+class EmbeddingStats:
+    """Счётчики клиента: сколько запросов, токенов, повторов и троттлинга было."""
+
+    requests: int = 0
+    texts: int = 0
+    tokens: int = 0
+    retries: int = 0
+    throttled: int = 0
+    backoff_sec: float = 0.0
+
 
 class EmbeddingsClient:
     def __init__(
@@ -20,27 +50,199 @@ class EmbeddingsClient:
         model: str = DEFAULT_EMBEDDING_MODEL,
         batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
         client: OpenAI | None = None,
+        dimensions: int | None = DEFAULT_EMBEDDING_DIMENSIONS,
+        max_batch_tokens: int = settings.embed_max_batch_tokens,
+        max_retries: int = settings.embed_max_retries,
     ) -> None:
         self.model = model
         self.batch_size = batch_size
+        # None — полная размерность модели; text-embedding-3-* умеют укорачивать векторы на стороне API
+        self.dimensions = dimensions
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.backoff = BackoffPolicy(base_sec=settings.embed_backoff_base_sec, max_sec=settings.embed_backoff_max_sec)
+        self.query_max_retries = settings.embed_query_max_retries
+        self.query_backoff = BackoffPolicy(
+            base_sec=min(settings.embed_backoff_base_sec, settings.embed_query_backoff_max_sec),
+            max_sec=settings.embed_query_backoff_max_sec,
+        )
+        self.adaptive = AdaptiveBatchSize(
+            initial=batch_size,
+            minimum=1,
+            maximum=settings.embed_max_batch_size,
+            target_latency_sec=settings.embed_target_latency_sec,
+        )
+        self.stats = EmbeddingStats()
         api_key = settings.openai_api_key.get_secret_value() if settings.openai_api_key else None
-        self.client = client or OpenAI(api_key=api_key)
+        # Повторы делаем сами (с учётом Retry-After и адаптивного батча), поэтому SDK-ретраи выключены
+        self.client = client or OpenAI(api_key=api_key, max_retries=0)
 
-    def embed_texts(self, texts: Sequence[str]) -> List[List[float]]:
+    def embed_texts(self, texts: Sequence[str] | ChunkBatch) -> List[List[float]] | ChunkBatch:
+        """
+        Эмбеддинги списка текстов (списки float) или ChunkBatch — тогда векторы пишутся
+        в его матрицу float32 на месте и возвращается тот же батч (см. embed_batch).
+        """
+        if isinstance(texts, ChunkBatch):
+            return self.embed_batch(texts)
         if not texts:
             return []
 
         embeddings: List[List[float]] = []
-        for i in range(0, len(texts), self.batch_size):
-            batch = list(texts[i : i + self.batch_size])
-            response = self.client.embeddings.create(model=self.model, input=batch)
-            embeddings.extend([item.embedding for item in response.data])
+        for _, vectors in self.iter_embeddings(texts):
+            embeddings.extend(vectors)
         return embeddings
 
+    def embed_batch(self, batch: ChunkBatch) -> ChunkBatch:
+        for _ in self.iter_batch_embeddings(batch):
+            pass
+        return batch
+
+    def iter_batch_embeddings(self, batch: ChunkBatch, start: int = 0) -> Iterator[Tuple[int, int]]:
+        """
+        Заполнить batch.embeddings по мере ответов API; отдаёт (смещение, число строк)
+        после каждого запроса, чтобы вызывающий мог сразу писать batch[offset:offset + n].
+        start > 0 — строки до start уже заполнены (resume reindex), эмбеддятся только остальные.
+        """
+        for offset, vectors in self.iter_embedding_arrays(batch.texts, start=start):
+            if batch.embeddings is None:
+                batch.allocate_embeddings(vectors.shape[1])
+            elif batch.embeddings.shape[1] != vectors.shape[1]:
+                raise ValueError(f"API returned {vectors.shape[1]}-dim embeddings, batch holds {batch.dim}-dim")
+            batch.embeddings[offset : offset + len(vectors)] = vectors
+            yield offset, len(vectors)
+
+    def iter_embeddings(self, texts: Sequence[str]) -> Iterator[Tuple[int, List[List[float]]]]:
+        """То же, что iter_embedding_arrays, но векторы — списки float (для кода, ждущего JSON-совместимые значения)."""
+        for offset, vectors in self.iter_embedding_arrays(texts):
+            yield offset, vectors.tolist()
+
+    def iter_embedding_arrays(
+        self,
+        texts: Sequence[str],
+        start: int = 0,
+        max_retries: int | None = None,
+        backoff: BackoffPolicy | None = None,
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Эмбеддить тексты (начиная с start) батчами, ограниченными числом элементов (адаптивно)
+        и бюджетом токенов. Отдаёт (смещение первого текста, матрица float32) после каждого запроса.
+        max_retries/backoff — свой бюджет повторов (по умолчанию — индексационный).
+        """
+        pos = start
+        while pos < len(texts):
+            batch, tokens = self._next_batch(texts, pos)
+            yield pos, self._create_with_retry(batch, tokens, max_retries=max_retries, backoff=backoff)
+            pos += len(batch)
+
+    def _next_batch(self, texts: Sequence[str], start: int) -> Tuple[List[str], int]:
+        batch: List[str] = []
+        tokens = 0
+        for text in texts[start : start + self.adaptive.current]:
+            text_tokens = count_tokens(text, self.model)
+            if batch and tokens + text_tokens > self.max_batch_tokens:
+                break
+            batch.append(text)
+            tokens += text_tokens
+        return batch, tokens
+
+    def _create_with_retry(
+        self,
+        batch: List[str],
+        tokens: int,
+        max_retries: int | None = None,
+        backoff: BackoffPolicy | None = None,
+    ) -> np.ndarray:
+        max_retries = self.max_retries if max_retries is None else max_retries
+        backoff = backoff or self.backoff
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.client.embeddings.create(**self._request_kwargs(batch))
+            except RETRYABLE_ERRORS as exc:
+                throttled = isinstance(exc, openai.RateLimitError)
+                if throttled:
+                    self.stats.throttled += 1
+                    self.adaptive.on_throttle()
+                if attempt >= max_retries:
+                    raise
+                delay = backoff.delay(attempt, exc)
+                attempt += 1
+                self.stats.retries += 1
+                self.stats.backoff_sec += delay
+                logger.warning(
+                    "Embeddings request failed, retrying",
+                    extra={
+                        "error": type(exc).__name__,
+                        "attempt": attempt,
+                        "delay_sec": round(delay, 2),
+                        "batch": len(batch),
+                        "next_batch_size": self.adaptive.current,
+                    },
+                )
+                time.sleep(delay)
+                continue
+
+            self.adaptive.on_success(time.perf_counter() - started)
+            self.stats.requests += 1
+            self.stats.texts += len(batch)
+            usage = getattr(response, "usage", None)
+            self.stats.tokens += getattr(usage, "total_tokens", None) or tokens
+            return _decode_embeddings(response.data)
+
+    def _request_kwargs(self, batch: List[str]) -> Dict[str, Any]:
+        # base64 явно: SDK тогда не раскладывает ответ в списки float, декодируем сразу в float32
+        kwargs: Dict[str, Any] = {"model": self.model, "input": batch, "encoding_format": "base64"}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
     def embed_text(self, text: str) -> List[float]:
         vectors = self.embed_texts([text])
         return vectors[0] if vectors else []
 
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Эмбеддинг вопроса пользователя. При EMBED_MICROBATCH_ENABLED запросы из параллельных
+        вызовов склеиваются в один embeddings.create общим на процесс микробатчером.
+        Повторы — по короткому бюджету EMBED_QUERY_MAX_RETRIES/EMBED_QUERY_BACKOFF_MAX_SEC.
+        """
+        if not settings.embed_microbatch_enabled:
+            return self.embed_query_texts([text])[0]
+        return self._query_batcher().embed(text)
+
+    def embed_query_texts(self, texts: Sequence[str]) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for _, vectors in self.iter_embedding_arrays(texts, max_retries=self.query_max_retries, backoff=self.query_backoff):
+            embeddings.extend(vectors.tolist())
+        return embeddings
+
+    def _query_batcher(self) -> EmbeddingMicroBatcher:
+        key = (self.model, self.dimensions)
+        with _QUERY_BATCHERS_LOCK:
+            batcher = _QUERY_BATCHERS.get(key)
+            if batcher is None:
+                # Все клиенты с той же моделью/размерностью эквивалентны — батчер держит первый
+                batcher = _QUERY_BATCHERS[key] = EmbeddingMicroBatcher(
+                    self.embed_query_texts,
+                    window_sec=settings.embed_microbatch_window_ms / 1000.0,
+                    max_batch_size=settings.embed_microbatch_max_size,
+                    timeout_sec=settings.embed_microbatch_timeout_sec,
+                )
+            return batcher
+
+
+def _decode_embeddings(data: Sequence[Any]) -> np.ndarray:
+    """Ответ embeddings.create -> матрица (n, dim) float32; поддерживает и base64, и списки float."""
+    rows = [
+        np.frombuffer(base64.b64decode(item.embedding), dtype="<f4")
+        if isinstance(item.embedding, str)
+        else np.asarray(item.embedding, dtype=np.float32)
+        for item in data
+    ]
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack(rows)
 
-__all__ = ["EmbeddingsClient", "DEFAULT_EMBEDDING_MODEL"]
 
+__all__ = ["EmbeddingsClient", "EmbeddingStats", "DEFAULT_EMBEDDING_MODEL", "DEFAULT_EMBEDDING_DIMENSIONS"]
@@ -0,0 +1,109 @@
+"""
+Micro-batching of single-text query embeddings across concurrent requests.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.metrics import REGISTRY
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+FLUSH_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = REGISTRY.histogram(
+    "embed_query_batch_size", buckets=BATCH_SIZE_BUCKETS, description="Вызовов embed_query в одном микробатче"
+)
+_BATCH_LATENCY = REGISTRY.histogram("embed_query_batch_latency_seconds", description="Латентность запроса микробатча")
+_QUERIES = REGISTRY.counter("embed_query_requests_total", "Запросов эмбеддинга через микробатчер")
+
+
+class EmbeddingMicroBatcher:
+    """
+    Копит тексты от параллельных вызовов embed() в течение окна (или до max_batch_size)
+    и отправляет их одним запросом embed_fn; каждый вызывающий получает свой вектор.
+    Сборщик — фоновый поток; запросы к API идут из небольшого пула, чтобы
+    следующий батч копился, пока предыдущий в полёте. Вызывающий ждёт не дольше timeout_sec.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[Sequence[str]], List[List[float]]],
+        window_sec: float,
+        max_batch_size: int,
+        timeout_sec: float | None = None,
+    ) -> None:
+        self.embed_fn = embed_fn
+        self.window_sec = window_sec
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout_sec = timeout_sec
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, Future]] = []
+        self._worker: threading.Thread | None = None
+        self._flush_pool = ThreadPoolExecutor(max_workers=FLUSH_WORKERS, thread_name_prefix="embed-microbatch")
+
+    def embed(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((text, future))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._collect, name="embed-microbatch-collector", daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+        _QUERIES.inc()
+        try:
+            return future.result(timeout=self.timeout_sec)
+        except FutureTimeoutError:
+            with self._cond:
+                # Ещё не забран сборщиком — убираем, чтобы не эмбеддить впустую
+                self._pending = [item for item in self._pending if item[1] is not future]
+            future.cancel()
+            raise TimeoutError(f"Micro-batch embedding took longer than {self.timeout_sec}s") from None
+
+    def _collect(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window_sec
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch_size]
+                del self._pending[: len(batch)]
+            self._flush_pool.submit(self._flush, batch)
+
+    def _flush(self, batch: List[Tuple[str, Future]]) -> None:
+        # Одинаковые тексты в батче эмбеддим один раз
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        started = time.perf_counter()
+        # Любая ошибка (в т.ч. при раздаче результатов) должна завершить все future батча,
+        # иначе вызывающие embed() ждут до таймаута
+        try:
+            vectors = self.embed_fn(list(unique))
+            if len(vectors) != len(unique):
+                raise RuntimeError(f"Embeddings API returned {len(vectors)} vectors for {len(unique)} texts")
+            _BATCH_LATENCY.observe(time.perf_counter() - started)
+            _BATCH_SIZE.observe(len(batch))
+            for text, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(vectors[unique[text]])
+        except BaseException as exc:
+            logger.warning("Micro-batch embedding failed", extra={"size": len(batch), "error": type(exc).__name__})
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+
+__all__ = ["EmbeddingMicroBatcher"]
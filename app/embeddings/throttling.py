@@ -0,0 +1,83 @@
+"""
+Retry/backoff and adaptive batch sizing for rate-limited embedding calls.
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+
+import openai
+
+# Ошибки, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Пауза, которую просит провайдер (заголовки retry-after-ms / retry-after), если есть."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue  # retry-after в формате HTTP-date не поддерживаем
+    return None
+
+
+@dataclass
+class BackoffPolicy:
+    """Экспоненциальный backoff с full jitter; Retry-After провайдера имеет приоритет."""
+
+    base_sec: float = 1.0
+    max_sec: float = 60.0
+
+    def delay(self, attempt: int, exc: BaseException | None = None) -> float:
+        hinted = retry_after_seconds(exc) if exc is not None else None
+        if hinted is not None:
+            return min(self.max_sec, hinted)
+        return random.uniform(0.0, min(self.max_sec, self.base_sec * (2 ** attempt)))
+
+
+class AdaptiveBatchSize:
+    """
+    AIMD-регулятор размера батча: растём аддитивно, пока запросы укладываются в целевую
+    латентность, и делим пополам при троттлинге или медленных ответах.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency_sec: float) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.current = min(self.maximum, max(self.minimum, initial))
+        self.target_latency_sec = target_latency_sec
+        self.step = max(1, self.current // 4)
+
+    def reset(self, size: int) -> None:
+        """Задать стартовый размер (например, --embed-batch) в пределах [minimum, maximum]."""
+        self.current = min(self.maximum, max(self.minimum, size))
+        self.step = max(1, self.current // 4)
+
+    def on_success(self, latency_sec: float) -> None:
+        if latency_sec > 2 * self.target_latency_sec:
+            self._shrink()
+        elif latency_sec < self.target_latency_sec:
+            self.current = min(self.maximum, self.current + self.step)
+
+    def on_throttle(self) -> None:
+        self._shrink()
+
+    def _shrink(self) -> None:
+        self.current = max(self.minimum, self.current // 2)
+
+
+__all__ = ["RETRYABLE_ERRORS", "retry_after_seconds", "BackoffPolicy", "AdaptiveBatchSize"]
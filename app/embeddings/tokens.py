@@ -0,0 +1,39 @@
+"""
+Local token counting for embedding requests (tiktoken when available).
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable
+
+try:  # tiktoken — опциональная зависимость: без неё считаем грубую верхнюю оценку
+    import tiktoken
+except ImportError:  # pragma: no cover - зависит от окружения
+    tiktoken = None
+
+# Для кириллицы у cl100k/o200k выходит ~2-3 символа на токен; берём с запасом,
+# чтобы батч по оценке не превысил реальный лимит запроса.
+FALLBACK_CHARS_PER_TOKEN = 2
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=8)
+def _encoder_for(model: str) -> Callable[[str], int] | None:
+    if tiktoken is None:
+        return None
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoder = _encoder_for(model)
+    if encoder is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN + 1
+    return encoder(text)
+
+
+__all__ = ["count_tokens", "FALLBACK_CHARS_PER_TOKEN"]
@@ -0,0 +1,165 @@
+"""
+Chapter-level index for two-level retrieval: per-chapter routing vectors built at reindex time.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.base import DocumentChunk, WhereFilter, normalize_where
+from app.vector_store.batch import ChunkBatch
+
+if TYPE_CHECKING:
+    from app.llm.client import LLMClient
+
+CHAPTER_INDEX_FILE = os.path.join(settings.vector_store_path, "chapter_index.npz")
+# Поля чанка, по которым можно сузить выбор глав where-фильтром
+CHAPTER_FILTER_FIELDS = ("book_id", "book_part", "chapter_index")
+SUMMARY_PROMPT = (
+    "Кратко (3-5 предложений) перескажи главу: ключевые персонажи, места и события. "
+    "Отвечай только пересказом."
+)
+
+logger = logging.getLogger(__name__)
+
+
+def chapter_key(metadata: Dict[str, Any]) -> str:
+    return f"{metadata.get('book_id')}:{metadata.get('chapter_index')}"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+@dataclass
+class ChapterIndex:
+    """Маршрутизирующие векторы глав (нормализованный центроид чанков, опционально + пересказ)."""
+
+    keys: np.ndarray
+    vectors: np.ndarray
+    fields: Dict[str, np.ndarray]
+    chunk_counts: np.ndarray
+    summaries: np.ndarray
+    index_version: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def select(self, query: Sequence[float], top_n: int, where: WhereFilter | None = None) -> List[str]:
+        """Ключи top_n глав по косинусу с запросом среди глав, проходящих фильтр."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for key, values in normalize_where(where).items():
+            if key in self.fields:
+                mask &= np.isin(self.fields[key], np.asarray(values, dtype=self.fields[key].dtype))
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        q = _normalize(np.asarray(query, dtype=np.float32))
+        scores = self.vectors[candidates] @ q
+        top = candidates[np.argsort(-scores)[:top_n]]
+        return [str(k) for k in self.keys[top]]
+
+    def save(self, path: str | Path = CHAPTER_INDEX_FILE) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name("tmp_" + path.name)
+        np.savez(
+            tmp,
+            keys=self.keys,
+            vectors=self.vectors,
+            chunk_counts=self.chunk_counts,
+            summaries=self.summaries,
+            index_version=np.asarray(self.index_version or ""),
+            **{f"field_{name}": values for name, values in self.fields.items()},
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | Path = CHAPTER_INDEX_FILE) -> "ChapterIndex":
+        with np.load(path) as data:
+            return cls(
+                keys=data["keys"],
+                vectors=data["vectors"],
+                fields={name[len("field_"):]: data[name] for name in data.files if name.startswith("field_")},
+                chunk_counts=data["chunk_counts"],
+                summaries=data["summaries"],
+                index_version=str(data["index_version"]) or None,
+            )
+
+
+def build_chapter_index(
+    chunks: Sequence[DocumentChunk] | ChunkBatch,
+    summary_embeddings: Dict[str, Sequence[float]] | None = None,
+    summaries: Dict[str, str] | None = None,
+    index_version: str | None = None,
+) -> ChapterIndex:
+    """
+    Центроид главы — среднее нормализованных эмбеддингов её чанков. Если есть эмбеддинг
+    пересказа, маршрутизирующий вектор — нормализованная сумма центроида и пересказа.
+    """
+    if not len(chunks):
+        raise ValueError("Cannot build a chapter index without chunks")
+    groups: Dict[str, List[int]] = {}
+    for idx, chunk in enumerate(chunks):
+        groups.setdefault(chapter_key(chunk.metadata), []).append(idx)
+
+    keys = list(groups)
+    # У ChunkBatch эмбеддинги уже лежат матрицей — без сборки из построчных векторов
+    embeddings = chunks.embeddings if isinstance(chunks, ChunkBatch) else [c.embedding for c in chunks]
+    matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+    vectors = np.vstack([_normalize(matrix[rows].mean(axis=0)) for rows in groups.values()])
+    if summary_embeddings:
+        for i, key in enumerate(keys):
+            if key in summary_embeddings:
+                vectors[i] = _normalize(vectors[i] + _normalize(np.asarray(summary_embeddings[key], dtype=np.float32)))
+
+    first = [chunks[rows[0]].metadata for rows in groups.values()]
+    fields = {
+        "book_id": np.asarray([str(m.get("book_id")) for m in first]),
+        "book_part": np.asarray([int(m.get("book_part") or 0) for m in first], dtype=np.int64),
+        "chapter_index": np.asarray([int(m.get("chapter_index") or 0) for m in first], dtype=np.int64),
+    }
+    return ChapterIndex(
+        keys=np.asarray(keys),
+        vectors=vectors,
+        fields=fields,
+        chunk_counts=np.asarray([len(rows) for rows in groups.values()], dtype=np.int64),
+        summaries=np.asarray([(summaries or {}).get(key, "") for key in keys]),
+        index_version=index_version,
+    )
+
+
+def summarize_chapters(
+    chunks: Sequence[DocumentChunk],
+    llm_client: "LLMClient",
+    max_input_chars: int = settings.hierarchy_summary_input_chars,
+) -> Dict[str, str]:
+    """Пересказ каждой главы через LLM по началу её текста (склейка чанков до max_input_chars)."""
+    texts: Dict[str, List[str]] = {}
+    for chunk in chunks:
+        texts.setdefault(chapter_key(chunk.metadata), []).append(chunk.text)
+    summaries: Dict[str, str] = {}
+    for key, parts in texts.items():
+        source = "\n\n".join(parts)[:max_input_chars]
+        summaries[key] = llm_client.chat(
+            [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": source}]
+        ).strip()
+    logger.info("Chapter summaries generated", extra={"chapters": len(summaries)})
+    return summaries
+
+
+__all__ = [
+    "ChapterIndex",
+    "build_chapter_index",
+    "summarize_chapters",
+    "chapter_key",
+    "CHAPTER_INDEX_FILE",
+]
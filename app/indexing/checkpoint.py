@@ -0,0 +1,165 @@
+"""
+Durable reindex checkpoints: committed embedding rows and the chunk manifest hash, for resuming an interrupted reindex.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.batch import ChunkBatch
+
+CHECKPOINT_DIR = os.path.join(settings.vector_store_path, "reindex_checkpoint")
+CHECKPOINT_FORMAT_VERSION = 1
+STATE_FILE = "state.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+
+logger = logging.getLogger(__name__)
+
+
+def manifest_hash(
+    chunks: ChunkBatch, embedding_model: str, embedding_dimensions: int | None, store: str | None = None
+) -> str:
+    """
+    sha256 состава reindex: id, текст и метаданные каждого чанка по порядку плюс модель,
+    запрошенная размерность и бэкенд хранилища. Совпадает только у прогонов, которым подходят
+    одни и те же векторы и уже записанные в хранилище строки.
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps({"model": embedding_model, "dimensions": embedding_dimensions, "store": store}, sort_keys=True).encode()
+    )
+    for doc_id, text, metadata in zip(chunks.ids, chunks.texts, chunks.metadatas()):
+        digest.update(json.dumps([doc_id, text, metadata], ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _fsync_write(path: Path, payload: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as fh:
+        fh.write(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+class ReindexCheckpoint:
+    """
+    Чекпоинт reindex на диске: embeddings.f32 — закоммиченные строки матрицы float32 подряд
+    (чанки идут в детерминированном порядке корпуса), state.json — хэш манифеста, число
+    закоммиченных строк и последний батч. Батч считается закоммиченным, только когда его
+    векторы дописаны и синхронизированы и state.json атомарно заменён; хвост embeddings.f32
+    сверх committed (падение между записями) отбрасывается при resume.
+    """
+
+    def __init__(self, directory: str | Path = CHECKPOINT_DIR) -> None:
+        self.directory = Path(directory)
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def state_path(self) -> Path:
+        return self.directory / STATE_FILE
+
+    @property
+    def embeddings_path(self) -> Path:
+        return self.directory / EMBEDDINGS_FILE
+
+    @property
+    def committed(self) -> int:
+        return int(self.state.get("committed", 0))
+
+    def load_state(self) -> Dict[str, Any] | None:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def resume(self, manifest: str) -> np.ndarray | None:
+        """
+        Векторы закоммиченных строк (committed, dim), если чекпоинт есть и собран для того же
+        манифеста; иначе None (начинать с нуля).
+        """
+        state = self.load_state()
+        if state is None:
+            return None
+        if state.get("format_version") != CHECKPOINT_FORMAT_VERSION or state.get("manifest_hash") != manifest:
+            logger.warning(
+                "Reindex checkpoint does not match current corpus, ignoring it",
+                extra={"checkpoint_manifest": state.get("manifest_hash"), "manifest": manifest},
+            )
+            return None
+        committed, dim = int(state.get("committed", 0)), int(state.get("dim") or 0)
+        expected_bytes = committed * dim * 4
+        if not committed or not dim:
+            vectors = np.empty((0, dim), dtype=np.float32)
+        else:
+            actual_bytes = self.embeddings_path.stat().st_size if self.embeddings_path.exists() else 0
+            if actual_bytes < expected_bytes:
+                logger.warning(
+                    "Reindex checkpoint embeddings are truncated, ignoring it",
+                    extra={"expected_bytes": expected_bytes, "actual_bytes": actual_bytes},
+                )
+                return None
+            vectors = np.fromfile(self.embeddings_path, dtype="<f4", count=committed * dim).reshape(committed, dim)
+        if self.embeddings_path.exists():
+            # Незакоммиченный хвост от прерванного батча: следующие строки допишутся ровно после committed
+            os.truncate(self.embeddings_path, expected_bytes)
+        self.state = state
+        return vectors
+
+    def start(self, manifest: str, total: int, embedding_model: str) -> None:
+        """Новый чекпоинт для полного прогона (старый удаляется)."""
+        self.clear()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embeddings_path.touch()
+        self.state = {
+            "format_version": CHECKPOINT_FORMAT_VERSION,
+            "manifest_hash": manifest,
+            "embedding_model": embedding_model,
+            "total": total,
+            "committed": 0,
+            "dim": None,
+            "batches": 0,
+            "last_batch": None,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        self._write_state()
+
+    def commit(self, offset: int, vectors: np.ndarray) -> None:
+        """Зафиксировать батч: строки [offset, offset + len(vectors)) уже записаны в хранилище."""
+        if offset != self.committed:
+            raise ValueError(f"Checkpoint expects batch at offset {self.committed}, got {offset}")
+        if self.state.get("dim") not in (None, vectors.shape[1]):
+            raise ValueError(f"Checkpoint dim is {self.state['dim']}, batch has {vectors.shape[1]}")
+        with self.embeddings_path.open("ab") as fh:
+            fh.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.state.update(
+            committed=offset + len(vectors),
+            dim=int(vectors.shape[1]),
+            batches=self.state.get("batches", 0) + 1,
+            last_batch={"offset": offset, "count": len(vectors)},
+            updated_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        )
+        self._write_state()
+
+    def clear(self) -> None:
+        self.state = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write_state(self) -> None:
+        _fsync_write(self.state_path, json.dumps(self.state, indent=2).encode("utf-8"))
+
+
+__all__ = ["ReindexCheckpoint", "manifest_hash", "CHECKPOINT_DIR"]
@@ -9,8 +9,10 @@ from typing import Dict, List, Tuple
 MAX_PARAGRAPH_OVERLAP_CHARS = 500
 MIN_CORE_CHARS = 800  # минимальный размер основы чанка без учета оверлапа
 
+import numpy as np
+
 from app.config import settings
-from app.vector_store.base import DocumentChunk
+from app.vector_store.batch import ChunkBatch
 
 CHUNK_SIZE_CHARS = settings.chunk_size_chars
 CHUNK_OVERLAP_CHARS = settings.chunk_overlap_chars
@@ -48,9 +50,15 @@ def _truncate_overlap(paragraph: str) -> str:
     return paragraph[:MAX_PARAGRAPH_OVERLAP_CHARS]
 
 
-def chunk_chapter_text(text: str, chapter_index: int, book_info: Dict[str, str]) -> List[DocumentChunk]:
+def chunk_chapter_text(text: str, chapter_index: int, book_info: Dict[str, str]) -> ChunkBatch:
+    """
+    Нарезать главу на чанки. Результат — колоночный ChunkBatch: общие для главы поля
+    хранятся одной колонкой, словарь метаданных на чанк не создаётся.
+    """
     paragraphs = _split_paragraphs(text)
-    chunks: List[DocumentChunk] = []
+    ids: List[str] = []
+    texts: List[str] = []
+    positions: List[int] = []
     chunk_index = 0
     idx = 0
 
@@ -89,22 +97,29 @@ def chunk_chapter_text(text: str, chapter_index: int, book_info: Dict[str, str])
             chunk_parts.append(_truncate_overlap(next_para))
 
         chunk_text = "\n\n".join(chunk_parts)
-        position = core[0][1]
-        chunk_id = f"{book_info['book_id']}_ch{chapter_index}_{chunk_index:04d}"
-        metadata = {
-            "book": book_info["book"],
-            "book_id": book_info["book_id"],
-            "book_part": book_info.get("book_part"),
-            "chapter_title": book_info["chapter_title"],
-            "chapter_index": chapter_index,
-            "chunk_index": chunk_index,
-            "position": position,
-            "source_file": book_info["source_file"],
-        }
-        chunks.append(DocumentChunk(id=chunk_id, text=chunk_text, metadata=metadata, embedding=[]))
+        ids.append(f"{book_info['book_id']}_ch{chapter_index}_{chunk_index:04d}")
+        texts.append(chunk_text)
+        positions.append(core[0][1])
         chunk_index += 1
 
-    return chunks
+    count = len(ids)
+
+    def constant(value: object) -> np.ndarray:
+        values = np.empty(count, dtype=object)
+        values[:] = [value] * count
+        return values
+
+    columns = {
+        "book": constant(book_info["book"]),
+        "book_id": constant(book_info["book_id"]),
+        "book_part": constant(book_info.get("book_part")),
+        "chapter_title": constant(book_info["chapter_title"]),
+        "chapter_index": np.full(count, chapter_index, dtype=np.int64),
+        "chunk_index": np.arange(count, dtype=np.int64),
+        "position": np.asarray(positions, dtype=np.int64),
+        "source_file": constant(book_info["source_file"]),
+    }
+    return ChunkBatch(ids, texts, columns)
 
 
 __all__ = ["chunk_chapter_text", "CHUNK_SIZE_CHARS", "CHUNK_OVERLAP_CHARS"]
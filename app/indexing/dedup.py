@@ -0,0 +1,223 @@
+"""
+Near-duplicate chunk detection (MinHash + LSH) run before embedding.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.embeddings.tokens import count_tokens
+from app.vector_store.base import DocumentChunk, WhereFilter, matches_where
+
+NEAR_DUPLICATES_FILE = os.path.join(settings.vector_store_path, "near_duplicates.json")
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+SEED = 20240601
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class DuplicateMatch:
+    id: str
+    canonical_id: str
+    similarity: float
+
+
+@dataclass
+class DedupResult:
+    """Канонические чанки (идут в эмбеддинг) и дубли со ссылкой на канонический."""
+
+    canonical: List[DocumentChunk]
+    duplicates: List[DuplicateMatch] = field(default_factory=list)
+    candidate_pairs: int = 0
+
+
+def shingles(text: str, size: int) -> Set[int]:
+    """Хэши словесных n-грамм нормализованного текста (регистр и пунктуация не важны)."""
+    words = _WORD_RE.findall(text.casefold())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i : i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash-подписи: num_perm универсальных хэш-функций (a*x + b) mod p."""
+
+    def __init__(self, num_perm: int = 128, seed: int = SEED) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: Set[int]) -> np.ndarray:
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        # Переполнение uint64 допустимо: нужна лишь перемешивающая функция, не точная арифметика
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(values, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) с bands*rows <= num_perm, у которых порог (1/b)^(1/r) ближе всего к threshold."""
+    best = (num_perm, 1)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        gap = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+def find_near_duplicates(
+    chunks: Sequence[DocumentChunk],
+    threshold: float = 0.85,
+    num_perm: int = 128,
+    shingle_size: int = 3,
+) -> DedupResult:
+    """
+    Жадный проход в порядке корпуса: чанк — дубль, если LSH находит кандидата среди уже
+    принятых канонических и точное сходство Жаккара по шинглам не ниже threshold.
+    Первое вхождение остаётся каноническим, поэтому результат детерминирован.
+    """
+    hasher = MinHasher(num_perm)
+    bands, rows = lsh_params(num_perm, threshold)
+    buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+    shingle_sets: List[Set[int]] = []
+    result = DedupResult(canonical=[])
+
+    for idx, chunk in enumerate(chunks):
+        current = shingles(chunk.text, shingle_size)
+        shingle_sets.append(current)
+        signature = hasher.signature(current)
+        keys = [signature[b * rows : (b + 1) * rows].tobytes() for b in range(bands)]
+
+        candidates: Set[int] = set()
+        for band, key in enumerate(keys):
+            candidates.update(buckets[band].get(key, ()))
+        result.candidate_pairs += len(candidates)
+
+        best_idx, best_sim = -1, 0.0
+        for other in candidates:
+            sim = _jaccard(current, shingle_sets[other])
+            if sim > best_sim:
+                best_idx, best_sim = other, sim
+        if best_idx >= 0 and best_sim >= threshold:
+            result.duplicates.append(DuplicateMatch(chunk.id, chunks[best_idx].id, round(best_sim, 4)))
+            continue
+
+        result.canonical.append(chunk)
+        for band, key in enumerate(keys):
+            buckets[band][key].append(idx)
+    return result
+
+
+def summarize_dedup(
+    result: DedupResult,
+    chunks: Sequence[DocumentChunk],
+    embedding_model: str,
+    embedding_dimensions: int,
+    threshold: float,
+) -> Dict[str, Any]:
+    """Отчёт для манифеста: сколько эмбеддингов, токенов и байт индекса (векторов) сэкономлено, и карта дублей."""
+    by_id = {chunk.id: chunk for chunk in chunks}
+    skipped = [by_id[match.id] for match in result.duplicates]
+    # Тексты дублей остаются в таблице почти-дублей, экономятся только их векторы
+    vector_bytes = len(skipped) * embedding_dimensions * 4
+    return {
+        "threshold": threshold,
+        "input_chunks": len(chunks),
+        "canonical_chunks": len(result.canonical),
+        "duplicates": len(result.duplicates),
+        "lsh_candidate_pairs": result.candidate_pairs,
+        "embeddings_saved": len(skipped),
+        "embedding_tokens_saved": sum(count_tokens(chunk.text, embedding_model) for chunk in skipped),
+        "index_bytes_saved": {"vectors": vector_bytes, "total": vector_bytes},
+        "matches": [
+            {
+                "id": match.id,
+                "canonical_id": match.canonical_id,
+                "similarity": match.similarity,
+                "book_id": by_id[match.id].metadata.get("book_id"),
+                "chapter_index": by_id[match.id].metadata.get("chapter_index"),
+            }
+            for match in result.duplicates
+        ],
+    }
+
+
+class DuplicateTable:
+    """
+    Почти-дубли без собственных векторов: в индексе только канонический чанк (у него canonical_id — свой id),
+    дубли (id, текст, метаданные) лежат рядом с индексом и подставляются в выдачу после поиска.
+    """
+
+    def __init__(self, duplicates: Sequence[DocumentChunk], index_version: str | None = None) -> None:
+        self.index_version = index_version
+        self.by_canonical: Dict[str, List[DocumentChunk]] = {}
+        for chunk in duplicates:
+            self.by_canonical.setdefault(chunk.metadata["canonical_id"], []).append(chunk)
+
+    def __len__(self) -> int:
+        return sum(len(chunks) for chunks in self.by_canonical.values())
+
+    def duplicates_of(self, canonical_id: str, where: WhereFilter | None = None) -> List[DocumentChunk]:
+        return [chunk for chunk in self.by_canonical.get(canonical_id, ()) if matches_where(chunk.metadata, where)]
+
+    def groups_matching(self, where: WhereFilter | None) -> List[str]:
+        """Канонические id, у которых есть дубль под фильтром (сам канонический чанк может быть вне его)."""
+        return [canonical_id for canonical_id in self.by_canonical if self.duplicates_of(canonical_id, where)]
+
+    def save(self, path: str | Path = NEAR_DUPLICATES_FILE) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "index_version": self.index_version,
+            "duplicates": [
+                {"id": chunk.id, "text": chunk.text, "metadata": chunk.metadata}
+                for chunks in self.by_canonical.values()
+                for chunk in chunks
+            ],
+        }
+        tmp = path.with_name("tmp_" + path.name)
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | Path = NEAR_DUPLICATES_FILE) -> "DuplicateTable":
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        duplicates = [
+            DocumentChunk(id=item["id"], text=item["text"], metadata=item["metadata"], embedding=[])
+            for item in payload["duplicates"]
+        ]
+        return cls(duplicates, index_version=payload.get("index_version"))
+
+
+def _jaccard(left: Set[int], right: Set[int]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+__all__ = [
+    "find_near_duplicates",
+    "summarize_dedup",
+    "DuplicateTable",
+    "NEAR_DUPLICATES_FILE",
+    "DedupResult",
+    "DuplicateMatch",
+    "MinHasher",
+    "lsh_params",
+    "shingles",
+]
@@ -6,28 +6,45 @@ from __future__ import annotations
 
 import logging
 import time
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
 
 from tqdm import tqdm
 
 from app.config import settings
-from app.embeddings.client import EmbeddingsClient
+from app.indexing.chapters import build_chapter_index, chapter_key, summarize_chapters
+from app.indexing.checkpoint import ReindexCheckpoint, manifest_hash
 from app.indexing.chunker import chunk_chapter_text
+from app.indexing.dedup import DedupResult, DuplicateTable, find_near_duplicates, summarize_dedup
 from app.indexing.parser import parse_books
+from app.indexing.profiling import ReindexProfiler, embedding_stats_delta, write_profile_report
+from app.indexing.stats import build_index_stats, corpus_file_hashes, write_index_stats
 from app.vector_store.base import DocumentChunk, VectorStore
+from app.vector_store.batch import MISSING, ChunkBatch
+
+if TYPE_CHECKING:
+    from app.embeddings.client import EmbeddingsClient, EmbeddingStats
 
 logger = logging.getLogger(__name__)
 
 
-def reindex_corpus(vector_store: VectorStore, embeddings_client: EmbeddingsClient, embed_batch: int = 64) -> int:
-    started = time.time()
-    vector_store.clear()
+def build_corpus_batch(corpus_dir: str | None = None, profiler: ReindexProfiler | None = None) -> ChunkBatch:
+    """Разобрать корпус и нарезать все главы на чанки (без эмбеддингов) одним колоночным батчем."""
+    profiler = profiler or ReindexProfiler(enabled=False)
+    with profiler.stage("parse"):
+        books = parse_books(corpus_dir) if corpus_dir else parse_books()
+    with profiler.stage("chunk"):
+        corpus, total_chapters = _chunk_books(books)
+    logger.info(
+        "Parsed corpus",
+        extra={"books": len(books), "chapters": total_chapters, "chunks": len(corpus)},
+    )
+    return corpus
+
 
-    books = parse_books()
-    total_books = len(books)
+def _chunk_books(books: List[Dict]) -> Tuple[ChunkBatch, int]:
     total_chapters = 0
-    all_chunks: List[DocumentChunk] = []
+    chapters: List[ChunkBatch] = []
 
     for book in books:
         book_id = book["book_id"]
@@ -37,51 +54,285 @@ def reindex_corpus(vector_store: VectorStore, embeddings_client: EmbeddingsClien
             total_chapters += 1
             chapter_index = chapter["chapter_index"]
             chapter_title = chapter["chapter_title"]
-            chunks = chunk_chapter_text(
-                chapter["text"],
-                chapter_index,
-                {
-                    "book": book_title,
-                    "book_id": book_id,
-                    "chapter_title": chapter_title,
-                    "book_part": chapter.get("book_part"),
-                    "source_file": source_file,
-                },
+            chapters.append(
+                chunk_chapter_text(
+                    chapter["text"],
+                    chapter_index,
+                    {
+                        "book": book_title,
+                        "book_id": book_id,
+                        "chapter_title": chapter_title,
+                        "book_part": chapter.get("book_part"),
+                        "source_file": source_file,
+                    },
+                )
             )
-            all_chunks.extend(chunks)
 
-    total_chunks = len(all_chunks)
+    corpus = ChunkBatch.concat(chapters)
+    # Ключ главы для второго уровня иерархического поиска (фильтр chapter_key $in [...])
+    if len(corpus):
+        corpus.set_column(
+            "chapter_key",
+            [
+                chapter_key({"book_id": book_id, "chapter_index": index})
+                for book_id, index in zip(corpus.columns["book_id"], corpus.columns["chapter_index"].tolist())
+            ],
+        )
+    return corpus, total_chapters
+
+
+def build_corpus_chunks(corpus_dir: str | None = None) -> List[DocumentChunk]:
+    """То же, что build_corpus_batch, списком DocumentChunk (для скриптов, которым нужны изменяемые чанки)."""
+    return build_corpus_batch(corpus_dir).to_chunks()
+
+
+def split_near_duplicates(corpus: ChunkBatch) -> Tuple[ChunkBatch, ChunkBatch, DedupResult]:
+    """
+    Разделить корпус на канонические чанки (идут в эмбеддинг и в индекс) и почти-дубли. Дубли не получают
+    своих строк в индексе: они уходят в DuplicateTable и подставляются в выдачу после поиска, так что
+    не занимают top-k и место под векторы. У канонического чанка — duplicate_count и canonical_id (свой id,
+    по нему ищутся группы дублей под фильтром); у дубля — canonical_id; карта дублей — в манифесте статистики.
+    """
+    if not settings.dedup_enabled:
+        return corpus, corpus.take([]), DedupResult(canonical=list(corpus))
+    result = find_near_duplicates(
+        corpus,
+        threshold=settings.dedup_threshold,
+        num_perm=settings.dedup_num_perm,
+        shingle_size=settings.dedup_shingle_size,
+    )
+    canonical = corpus.take([row.index for row in result.canonical])
+    positions = {doc_id: i for i, doc_id in enumerate(corpus.ids)}
+    duplicates = corpus.take([positions[match.id] for match in result.duplicates])
+    counts: Dict[str, int] = {}
+    for match in result.duplicates:
+        counts[match.canonical_id] = counts.get(match.canonical_id, 0) + 1
+    if counts:
+        canonical.set_column("duplicate_count", [counts.get(doc_id, MISSING) for doc_id in canonical.ids])
+        canonical.set_column("canonical_id", [doc_id if doc_id in counts else MISSING for doc_id in canonical.ids])
+        duplicates.set_column("canonical_id", [match.canonical_id for match in result.duplicates])
     logger.info(
-        "Parsed corpus",
-        extra={"books": total_books, "chapters": total_chapters, "chunks": total_chunks},
+        "Near-duplicate pass",
+        extra={"chunks": len(corpus), "duplicates": len(result.duplicates), "candidates": result.candidate_pairs},
     )
+    return canonical, duplicates, result
+
+
+def attach_duplicate_vectors(duplicates: ChunkBatch, canonical: ChunkBatch) -> ChunkBatch:
+    """Дублям — копии векторов их канонических чанков в памяти (для центроидов глав; в индекс не пишутся)."""
+    if not len(duplicates):
+        return duplicates
+    rows = {doc_id: i for i, doc_id in enumerate(canonical.ids)}
+    duplicates.embeddings = canonical.embeddings[[rows[doc_id] for doc_id in duplicates.columns["canonical_id"]]]
+    return duplicates
+
 
-    # Embed and upsert in batches with progress bar
-    for i in tqdm(range(0, total_chunks, embed_batch), desc="Indexing", unit="chunks"):
-        batch = all_chunks[i : i + embed_batch]
-        texts = [c.text for c in batch]
-        embeddings = embeddings_client.embed_texts(texts)
-        for c, emb in zip(batch, embeddings):
-            c.embedding = emb
-        vector_store.upsert_documents(batch)
-        logger.info("Upserted batch", extra={"count": len(batch), "offset": i})
+def build_chapter_level(
+    chunks: ChunkBatch, embeddings_client: EmbeddingsClient, index_version: str | None
+) -> None:
+    """Второй уровень иерархического поиска: векторы глав (центроиды, опционально + пересказы)."""
+    if not len(chunks):
+        # Пустой корпус: строить нечего, запросы без актуального индекса глав идут плоским поиском
+        logger.warning("No chunks indexed, chapter index not built")
+        return
+    summaries: Dict[str, str] = {}
+    summary_embeddings: Dict[str, List[float]] = {}
+    if settings.hierarchy_summaries_enabled:
+        from app.llm.client import LLMClient
+
+        summaries = summarize_chapters(chunks, LLMClient())
+        keys = list(summaries)
+        summary_embeddings = dict(zip(keys, embeddings_client.embed_texts([summaries[k] for k in keys])))
+    chapter_index = build_chapter_index(chunks, summary_embeddings, summaries, index_version=index_version)
+    chapter_index.save()
+    logger.info("Chapter index built", extra={"chapters": len(chapter_index), "summaries": len(summaries)})
+
+
+def restore_checkpoint(
+    vector_store: VectorStore,
+    chunks: ChunkBatch,
+    checkpoint: ReindexCheckpoint,
+    manifest: str,
+    embedding_model: str,
+    resume: bool,
+) -> int:
+    """
+    Подготовить хранилище и чекпоинт к прогону; вернуть число уже закоммиченных чанков.
+    prepare() идёт первым: неподходящая конфигурация хранилища отклоняется до очистки старого индекса.
+    При resume с подходящим чекпоинтом их векторы берутся из чекпоинта (без API), а в хранилище
+    они дописываются заново, только если оно не сохраняет upsert до finalize (durable_upserts).
+    Durable-хранилищу, в котором меньше строк, чем закоммичено (коллекцию очистили, сменили путь),
+    не доверяем: прогон начинается заново.
+    """
+    vector_store.prepare(chunks)
+    vectors = checkpoint.resume(manifest) if resume else None
+    if vectors is not None and vector_store.durable_upserts and vector_store.count_documents() < len(vectors):
+        logger.warning(
+            "Vector store lost committed chunks, ignoring reindex checkpoint",
+            extra={"committed": len(vectors), "stored": vector_store.count_documents()},
+        )
+        vectors = None
+    if vectors is None:
+        if resume:
+            logger.warning("No reindex checkpoint for current corpus, starting from scratch")
+        vector_store.clear()
+        checkpoint.start(manifest, total=len(chunks), embedding_model=embedding_model)
+        return 0
+
+    committed = len(vectors)
+    if committed:
+        chunks.allocate_embeddings(vectors.shape[1])[:committed] = vectors
+    if not vector_store.durable_upserts:
+        vector_store.clear()
+        if committed:
+            vector_store.upsert_documents(chunks[:committed])
+    logger.info(
+        "Resuming reindex from checkpoint",
+        extra={"committed": committed, "total": len(chunks), "last_batch": checkpoint.state.get("last_batch")},
+    )
+    return committed
+
+
+@dataclass
+class ReindexResult:
+    indexed_chunks: int  # строк в индексе (канонические чанки)
+    embedded_chunks: int  # из них эмбеддились в этом прогоне
+    duplicate_chunks: int  # почти-дубли в DuplicateTable
+    resumed_chunks: int
+    index_version: str
+    elapsed_sec: float
+    embedding_stats: EmbeddingStats  # приращение счётчиков клиента за стадию embed (без саммари глав)
+
+
+def reindex_corpus(
+    vector_store: VectorStore,
+    embeddings_client: EmbeddingsClient,
+    embed_batch: int = 64,
+    resume: bool = False,
+    profiler: ReindexProfiler | None = None,
+) -> ReindexResult:
+    """
+    Полный reindex. Каждый записанный батч фиксируется в чекпоинте (VECTOR_STORE_PATH/reindex_checkpoint);
+    resume=True после падения продолжает с последнего закоммиченного батча, если состав чанков
+    (хэш манифеста) не изменился. Чекпоинт удаляется после успешного завершения.
+    profiler собирает время по стадиям (см. ReindexService.run(profile=True)).
+    """
+    started = time.time()
+    profiler = profiler or ReindexProfiler(enabled=False)
+
+    with profiler.stage("corpus_hash"):
+        corpus_files = corpus_file_hashes()
+    corpus_chunks = build_corpus_batch(profiler=profiler)
+    with profiler.stage("dedup"):
+        all_chunks, duplicates, dedup = split_near_duplicates(corpus_chunks)
+    total_chunks = len(all_chunks)
+
+    checkpoint = ReindexCheckpoint()
+    with profiler.stage("checkpoint_restore"):
+        manifest = manifest_hash(
+            all_chunks, embeddings_client.model, embeddings_client.dimensions, store=type(vector_store).__name__
+        )
+        resumed_chunks = restore_checkpoint(
+            vector_store, all_chunks, checkpoint, manifest, embeddings_client.model, resume
+        )
+
+    # Размер батча подбирает клиент (бюджет токенов, троттлинг), upsert идёт по мере готовности.
+    # Векторы пишутся в общую матрицу float32 батча, в хранилище уходят срезы-view без копий.
+    # Время next() итератора — ожидание API (с повторами и backoff), отдельно от записи в хранилище.
+    embeddings_client.adaptive.reset(embed_batch)
+    # Счётчики клиента накопительные (клиент живёт дольше прогона) — в результат идёт приращение за стадию embed
+    stats_before = replace(embeddings_client.stats)
+    batches = embeddings_client.iter_batch_embeddings(all_chunks, start=resumed_chunks)
+    with tqdm(total=total_chunks, initial=resumed_chunks, desc="Indexing", unit="chunks") as progress:
+        for offset, count in profiler.iterate("embed", batches):
+            with profiler.upsert(count):
+                vector_store.upsert_documents(all_chunks[offset : offset + count])
+            with profiler.stage("checkpoint"):
+                checkpoint.commit(offset, all_chunks.embeddings[offset : offset + count])
+            progress.update(count)
+            logger.info("Upserted batch", extra={"count": count, "offset": offset})
+    embedding_stats = embedding_stats_delta(stats_before, embeddings_client.stats)
+    dimensions: int | None = all_chunks.dim or None
+
+    # Статистика и главы — по всему корпусу: дубли в индекс не пишутся, но остаются найденными через таблицу
+    if len(duplicates) and dimensions:
+        attach_duplicate_vectors(duplicates, all_chunks)
+    corpus_indexed = ChunkBatch.concat([all_chunks, duplicates])
+
+    with profiler.stage("stats"):
+        stats = build_index_stats(
+            corpus_indexed,
+            embedding_model=embeddings_client.model,
+            embedding_dimensions=dimensions or 0,
+            build_started_at=started,
+            build_duration_sec=0.0,
+            corpus_files=corpus_files,
+        )
+        if settings.dedup_enabled:
+            stats["dedup"] = summarize_dedup(
+                dedup, corpus_chunks, embeddings_client.model, dimensions or 0, settings.dedup_threshold
+            )
+    # Фиксируем модель и фактическую размерность: запросы с другими параметрами будут отклонены.
+    # index_version связывает индекс с манифестом статистики.
+    vector_store.set_index_info(
+        {
+            "embedding_model": embeddings_client.model,
+            "embedding_dimensions": dimensions or 0,
+            "index_version": stats["index_version"],
+        }
+    )
+    with profiler.stage("near_duplicates"):
+        DuplicateTable(list(duplicates), index_version=stats["index_version"]).save()
+    with profiler.stage("chapter_index"):
+        build_chapter_level(corpus_indexed, embeddings_client, index_version=stats["index_version"])
+    with profiler.stage("finalize"):
+        vector_store.finalize()
 
     elapsed = time.time() - started
+    stats["build"]["duration_sec"] = round(elapsed, 2)
+    stats["build"]["resumed_chunks"] = resumed_chunks
+    write_index_stats(stats)
+    checkpoint.clear()
     logger.info(
         "Reindex completed",
-        extra={"chunks_indexed": total_chunks, "elapsed_sec": round(elapsed, 2)},
+        extra={
+            "chunks_indexed": len(all_chunks),
+            "duplicates": len(duplicates),
+            "elapsed_sec": round(elapsed, 2),
+            "index_version": stats["index_version"],
+        },
+    )
+    return ReindexResult(
+        indexed_chunks=len(all_chunks),
+        embedded_chunks=total_chunks - resumed_chunks,
+        duplicate_chunks=len(duplicates),
+        resumed_chunks=resumed_chunks,
+        index_version=stats["index_version"],
+        elapsed_sec=elapsed,
+        embedding_stats=embedding_stats,
     )
-    return total_chunks
 
 
 @dataclass
 class ReindexSummary:
     indexed_chunks: int
     elapsed_sec: float
+    index_version: str | None = None
+    skipped_duplicates: int = 0
+    resumed_chunks: int = 0
+    precomputed_answers: int = 0
+    profile: Dict[str, Any] | None = None
+
+
+# Стадия после reindex (готовые ответы, app.rag.precomputed): (хранилище, клиент эмбеддингов) -> сколько собрано
+PostReindexHook = Callable[[VectorStore, "EmbeddingsClient"], int]
 
 
 class ReindexService:
-    """Сервисный класс для переиндексации корпуса."""
+    """
+    Сервисный класс для переиндексации корпуса. precompute — стадия готовых ответов, запускается
+    при PRECOMPUTE_AFTER_REINDEX; передаётся снаружи, чтобы индексация не зависела от RAG-слоя.
+    """
 
     def __init__(
         self,
@@ -89,22 +340,71 @@ class ReindexService:
         embeddings_client: EmbeddingsClient,
         embed_batch: int = 64,
         logger_: logging.Logger | None = None,
+        precompute: PostReindexHook | None = None,
     ) -> None:
         self.vector_store = vector_store
         self.embeddings_client = embeddings_client
         self.embed_batch = embed_batch
         self.logger = logger_ or logging.getLogger(__name__)
+        self.precompute = precompute
+
+    def run(self, resume: bool = False, profile: bool | None = None) -> ReindexSummary:
+        """
+        profile=True (по умолчанию REINDEX_PROFILE_ENABLED) — замеры по стадиям в summary.profile
+        и JSON-артефакт в REINDEX_PROFILE_DIR.
+        """
+        profile = settings.reindex_profile_enabled if profile is None else profile
+        profiler = ReindexProfiler(enabled=profile, trace_memory=settings.reindex_profile_tracemalloc)
 
-    def run(self) -> ReindexSummary:
         started = time.time()
-        indexed = reindex_corpus(self.vector_store, self.embeddings_client, embed_batch=self.embed_batch)
-        elapsed = time.time() - started
-        self.logger.info(
-            "ReindexService completed",
-            extra={"indexed_chunks": indexed, "elapsed_sec": round(elapsed, 2)},
+        profiler.start()
+        # stop() и при ошибке: иначе tracemalloc останется включённым в процессе сервера
+        try:
+            result = reindex_corpus(
+                self.vector_store, self.embeddings_client, embed_batch=self.embed_batch, resume=resume, profiler=profiler
+            )
+            elapsed = time.time() - started
+            self.logger.info(
+                "ReindexService completed",
+                extra={
+                    "indexed_chunks": result.indexed_chunks,
+                    "resumed_chunks": result.resumed_chunks,
+                    "elapsed_sec": round(elapsed, 2),
+                },
+            )
+            precomputed = 0
+            if settings.precompute_after_reindex and self.precompute is None:
+                self.logger.warning("PRECOMPUTE_AFTER_REINDEX is set but ReindexService has no precompute stage")
+            elif settings.precompute_after_reindex:
+                with profiler.stage("precompute"):
+                    precomputed = self.precompute(self.vector_store, self.embeddings_client)
+        finally:
+            profiler.stop()
+
+        index_version = self.vector_store.get_index_info().get("index_version")
+        report = None
+        if profile:
+            report = profiler.report(
+                result.embedding_stats,
+                indexed_chunks=result.indexed_chunks,
+                resumed_chunks=result.resumed_chunks,
+                index_version=index_version,
+            )
+            report["artifact"] = str(write_profile_report(report))
+            self.logger.info(
+                "Reindex profile written",
+                extra={"path": report["artifact"], "wall_sec": report["wall_sec"], "cpu_sec": report["cpu_sec"]},
+            )
+        return ReindexSummary(
+            indexed_chunks=result.indexed_chunks,
+            elapsed_sec=elapsed,
+            index_version=index_version,
+            skipped_duplicates=result.duplicate_chunks,
+            resumed_chunks=result.resumed_chunks,
+            precomputed_answers=precomputed,
+            profile=report,
         )
-        return ReindexSummary(indexed_chunks=indexed, elapsed_sec=elapsed)
 
 
-__all__ = ["reindex_corpus", "ReindexService", "ReindexSummary"]
+__all__ = ["build_corpus_batch", "build_corpus_chunks", "split_near_duplicates", "attach_duplicate_vectors", "build_chapter_level", "restore_checkpoint", "reindex_corpus", "ReindexResult", "ReindexService", "ReindexSummary", "PostReindexHook"]
 
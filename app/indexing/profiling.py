@@ -0,0 +1,194 @@
+"""
+Reindex profiling: wall/CPU time per stage, embedding throughput, upsert latency percentiles and peak memory.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, TypeVar
+
+import numpy as np
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from app.embeddings.client import EmbeddingStats
+
+PROFILE_FORMAT_VERSION = 1
+
+T = TypeVar("T")
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса за всё время жизни (ru_maxrss: КБ в Linux, байты в macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def latency_percentiles(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "mean": round(float(ms.mean()), 2),
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+def embedding_stats_delta(before: EmbeddingStats, after: EmbeddingStats) -> EmbeddingStats:
+    """Приращение накопительных счётчиков клиента за прогон."""
+    return type(after)(**{f.name: getattr(after, f.name) - getattr(before, f.name) for f in fields(after)})
+
+
+class ReindexProfiler:
+    """
+    Замеры reindex по стадиям. Стадия может встречаться многократно (embed/upsert на каждый батч) —
+    время суммируется, calls считает вхождения. Выключенный профайлер ничего не меряет,
+    поэтому его можно передавать в пайплайн всегда. trace_memory включает tracemalloc
+    (пик Python-аллокаций по стадиям); он замедляет аллокации, поэтому отдельный флаг.
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False) -> None:
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.upsert_seconds: List[float] = []
+        self.upsert_rows = 0
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+        self._elapsed_wall = 0.0
+        self._elapsed_cpu = 0.0
+        self._started_at = 0.0
+        self._tracemalloc_owner = False
+        # reset_peak() в стадиях обнуляет пик tracemalloc, поэтому общий пик копится здесь
+        self._tracemalloc_peak: int | None = None
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._started_at = time.time()
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_owner = True
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        self._elapsed_wall = time.perf_counter() - self._started_wall
+        self._elapsed_cpu = time.process_time() - self._started_cpu
+        if tracemalloc.is_tracing():
+            self._tracemalloc_peak = max(self._tracemalloc_peak or 0, tracemalloc.get_traced_memory()[1])
+        if self._tracemalloc_owner:
+            tracemalloc.stop()
+            self._tracemalloc_owner = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._tracemalloc_peak = max(self._tracemalloc_peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0, "calls": 0})
+            entry["wall_sec"] += time.perf_counter() - wall
+            entry["cpu_sec"] += time.process_time() - cpu
+            entry["calls"] += 1
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                self._tracemalloc_peak = max(self._tracemalloc_peak or 0, peak)
+                entry["tracemalloc_peak_mb"] = max(entry.get("tracemalloc_peak_mb", 0.0), peak / 2**20)
+
+    def iterate(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Отдавать элементы iterable, засчитывая время каждого next() в стадию name (ожидание API и т.п.)."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @contextmanager
+    def upsert(self, rows: int) -> Iterator[None]:
+        """Стадия upsert + латентность отдельного вызова для перцентилей."""
+        started = time.perf_counter()
+        with self.stage("upsert"):
+            yield
+        if self.enabled:
+            self.upsert_seconds.append(time.perf_counter() - started)
+            self.upsert_rows += rows
+
+    def report(
+        self,
+        embedding_stats: EmbeddingStats,
+        indexed_chunks: int,
+        resumed_chunks: int = 0,
+        index_version: str | None = None,
+    ) -> Dict[str, Any]:
+        """embedding_stats — приращение счётчиков клиента за стадию embed (к ней относятся chunks_per_sec и tokens_per_sec)."""
+        embed_wall = self.stages.get("embed", {}).get("wall_sec", 0.0)
+        upsert_wall = sum(self.upsert_seconds)
+        stats = asdict(embedding_stats)
+        stats["backoff_sec"] = round(stats["backoff_sec"], 2)
+        memory: Dict[str, Any] = {"peak_rss_mb": peak_rss_mb()}
+        if self._tracemalloc_peak is not None:
+            memory["tracemalloc_peak_mb"] = round(self._tracemalloc_peak / 2**20, 1)
+        return {
+            "format_version": PROFILE_FORMAT_VERSION,
+            "index_version": index_version,
+            "vector_store_backend": settings.vector_store_backend,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self._started_at)),
+            "wall_sec": round(self._elapsed_wall, 3),
+            "cpu_sec": round(self._elapsed_cpu, 3),
+            "chunks": {"indexed": indexed_chunks, "resumed": resumed_chunks},
+            "stages": {
+                name: {key: round(value, 3) if isinstance(value, float) else value for key, value in entry.items()}
+                for name, entry in self.stages.items()
+            },
+            "embedding": {
+                **stats,
+                "chunks_per_sec": round(embedding_stats.texts / embed_wall, 1) if embed_wall else None,
+                "tokens_per_sec": round(embedding_stats.tokens / embed_wall, 1) if embed_wall else None,
+            },
+            "upsert": {
+                "batches": len(self.upsert_seconds),
+                "rows": self.upsert_rows,
+                "rows_per_sec": round(self.upsert_rows / upsert_wall, 1) if upsert_wall else None,
+                "latency_ms": latency_percentiles(self.upsert_seconds),
+            },
+            "memory": memory,
+        }
+
+
+def write_profile_report(report: Dict[str, Any], directory: str | Path = settings.reindex_profile_dir) -> Path:
+    """JSON-артефакт прогона: reindex-<index_version>.json (версия уже содержит время сборки), атомарная запись."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = report.get("index_version") or report["started_at"].replace("-", "").replace(":", "")
+    path = directory / f"reindex-{name}.json"
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+__all__ = ["ReindexProfiler", "write_profile_report", "embedding_stats_delta", "latency_percentiles", "peak_rss_mb"]
@@ -0,0 +1,178 @@
+"""
+Index statistics manifest: built once at reindex time, read in O(1) by the API and CLIs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.indexing.chunker import CHUNK_OVERLAP_CHARS, CHUNK_SIZE_CHARS, MAX_PARAGRAPH_OVERLAP_CHARS, MIN_CORE_CHARS
+from app.indexing.parser import CORPUS_DIR
+from app.vector_store.base import DocumentChunk
+
+INDEX_STATS_FILE = os.path.join(settings.vector_store_path, "index_stats.json")
+INDEX_STATS_FORMAT_VERSION = 1
+TEXT_SIZE_BUCKETS = (250, 500, 750, 1000, 1250, 1500, 2000, 3000)
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def corpus_file_hashes(corpus_dir: str | Path = CORPUS_DIR) -> List[Dict[str, Any]]:
+    """sha256 и размер каждого файла корпуса (тот же набор *.txt, что читает парсер)."""
+    base = Path(corpus_dir)
+    files: List[Dict[str, Any]] = []
+    if not base.exists():
+        return files
+    for path in sorted(base.glob("*.txt")):
+        digest = hashlib.sha256()
+        with path.open("rb") as fh:
+            for block in iter(lambda: fh.read(HASH_BLOCK_BYTES), b""):
+                digest.update(block)
+        files.append({"file": path.name, "bytes": path.stat().st_size, "sha256": digest.hexdigest()})
+    return files
+
+
+def text_size_distribution(chunks: Sequence[DocumentChunk]) -> Dict[str, Any]:
+    sizes = np.asarray([len(c.text) for c in chunks], dtype=np.int64)
+    if not len(sizes):
+        return {"count": 0}
+    histogram: Dict[str, int] = {}
+    lower = 0
+    for upper in TEXT_SIZE_BUCKETS:
+        histogram[f"{lower}-{upper}"] = int(((sizes > lower) & (sizes <= upper)).sum())
+        lower = upper
+    histogram[f">{lower}"] = int((sizes > lower).sum())
+    return {
+        "count": int(len(sizes)),
+        "total_chars": int(sizes.sum()),
+        "min": int(sizes.min()),
+        "max": int(sizes.max()),
+        "mean": round(float(sizes.mean()), 1),
+        "p50": int(np.percentile(sizes, 50)),
+        "p90": int(np.percentile(sizes, 90)),
+        "p99": int(np.percentile(sizes, 99)),
+        "histogram_chars": histogram,
+    }
+
+
+def chunk_counts(chunks: Sequence[DocumentChunk]) -> Dict[str, Any]:
+    """Число чанков по книгам, частям (book_part) и главам."""
+    books: Dict[str, Dict[str, Any]] = {}
+    parts: Counter = Counter()
+    for chunk in chunks:
+        meta = chunk.metadata or {}
+        book_id = str(meta.get("book_id"))
+        book = books.setdefault(
+            book_id,
+            {"book_id": book_id, "book": meta.get("book"), "source_file": meta.get("source_file"), "chunks": 0,
+             "book_parts": Counter(), "chapters": {}},
+        )
+        book["chunks"] += 1
+        part = meta.get("book_part")
+        if part is not None:
+            book["book_parts"][str(part)] += 1
+            parts[str(part)] += 1
+        chapter_index = meta.get("chapter_index")
+        chapter = book["chapters"].setdefault(
+            chapter_index,
+            {"chapter_index": chapter_index, "chapter_title": meta.get("chapter_title"), "book_part": part, "chunks": 0},
+        )
+        chapter["chunks"] += 1
+
+    book_list = []
+    for book in books.values():
+        book["book_parts"] = dict(sorted(book["book_parts"].items(), key=lambda kv: int(kv[0])))
+        book["chapters"] = sorted(book["chapters"].values(), key=lambda c: (c["chapter_index"] is None, c["chapter_index"]))
+        book_list.append(book)
+    return {
+        "totals": {
+            "books": len(book_list),
+            "chapters": sum(len(b["chapters"]) for b in book_list),
+            "chunks": len(chunks),
+        },
+        "book_parts": dict(sorted(parts.items(), key=lambda kv: int(kv[0]))),
+        "books": book_list,
+    }
+
+
+def build_index_stats(
+    chunks: Sequence[DocumentChunk],
+    embedding_model: str,
+    embedding_dimensions: int,
+    build_started_at: float,
+    build_duration_sec: float,
+    corpus_files: List[Dict[str, Any]] | None = None,
+) -> Dict[str, Any]:
+    """
+    Собрать манифест. index_version уникален для каждой сборки (время + отпечаток),
+    fingerprint совпадает у сборок из тех же файлов с теми же настройками и моделью.
+    """
+    corpus_files = corpus_file_hashes() if corpus_files is None else corpus_files
+    chunking = {
+        "chunk_size_chars": CHUNK_SIZE_CHARS,
+        "chunk_overlap_chars": CHUNK_OVERLAP_CHARS,
+        "max_paragraph_overlap_chars": MAX_PARAGRAPH_OVERLAP_CHARS,
+        "min_core_chars": MIN_CORE_CHARS,
+        # Отсев почти-дублей меняет состав индекса, поэтому входит в отпечаток
+        "dedup_threshold": settings.dedup_threshold if settings.dedup_enabled else None,
+        "dedup_shingle_size": settings.dedup_shingle_size,
+        "dedup_num_perm": settings.dedup_num_perm,
+    }
+    embedding = {"model": embedding_model, "dimensions": embedding_dimensions}
+    fingerprint = hashlib.sha256(
+        json.dumps(
+            {"files": [f["sha256"] for f in corpus_files], "chunking": chunking, "embedding": embedding},
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+    built_at = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(build_started_at))
+    return {
+        "format_version": INDEX_STATS_FORMAT_VERSION,
+        "index_version": f"{built_at}-{fingerprint[:8]}",
+        "fingerprint": fingerprint,
+        "vector_store_backend": settings.vector_store_backend,
+        "embedding": embedding,
+        "chunking": chunking,
+        "corpus_files": corpus_files,
+        "build": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(build_started_at)),
+            "duration_sec": round(build_duration_sec, 2),
+        },
+        "text_size_chars": text_size_distribution(chunks),
+        **chunk_counts(chunks),
+    }
+
+
+def write_index_stats(stats: Dict[str, Any], path: str | Path = INDEX_STATS_FILE) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(stats, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_index_stats(path: str | Path = INDEX_STATS_FILE) -> Dict[str, Any] | None:
+    """Прочитать манифест; None, если reindex ещё не выполнялся."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+__all__ = [
+    "build_index_stats",
+    "write_index_stats",
+    "load_index_stats",
+    "corpus_file_hashes",
+    "chunk_counts",
+    "text_size_distribution",
+    "INDEX_STATS_FILE",
+]
@@ -4,15 +4,41 @@ OpenAI chat LLM client.
 
 from __future__ import annotations
 
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any, Dict, List, Optional
 
+import openai
 from openai import OpenAI
 
 from app.config import settings
+from app.embeddings.throttling import RETRYABLE_ERRORS, BackoffPolicy
+from app.llm.hedging import LatencyTracker
+from app.metrics import REGISTRY
 
 DEFAULT_LLM_MODEL = settings.llm_model_name
 DEFAULT_TEMPERATURE = 0.0
 
+logger = logging.getLogger(__name__)
+
+# Общие для всех экземпляров (клиент создаётся на каждый запрос): пул для вызовов с дедлайном
+# и hedge-дублей, история латентностей для порога hedge.
+_EXECUTOR = ThreadPoolExecutor(max_workers=settings.llm_max_concurrency, thread_name_prefix="llm-call")
+_LATENCY = LatencyTracker(window=settings.llm_hedge_window, min_samples=settings.llm_hedge_min_samples)
+
+_CALLS = REGISTRY.counter("llm_calls_total", "Логических вызовов LLMClient.chat")
+_REQUESTS = REGISTRY.counter("llm_requests_total", "Запросов к API, включая hedge-дубли и повторы")
+_RETRIES = REGISTRY.counter("llm_retries_total", "Повторов после 429/5xx/обрыва соединения")
+_HEDGES_FIRED = REGISTRY.counter("llm_hedges_fired_total", "Сколько раз отправлен hedge-дубль")
+_HEDGES_WON = REGISTRY.counter("llm_hedges_won_total", "Сколько раз hedge-дубль ответил первым")
+_TIMEOUTS = REGISTRY.counter("llm_timeouts_total", "Вызовы, не уложившиеся в дедлайн")
+_LATENCY_HIST = REGISTRY.histogram("llm_call_latency_seconds", description="Латентность LLMClient.chat")
+
+
+class LLMTimeoutError(TimeoutError):
+    """LLM не ответил до дедлайна вызова."""
+
 
 class LLMClient:
     def __init__(
@@ -20,11 +46,21 @@ class LLMClient:
         model: str = DEFAULT_LLM_MODEL,
         temperature: float = DEFAULT_TEMPERATURE,
         client: OpenAI | None = None,
+        timeout_sec: float = settings.llm_timeout_sec,
+        hedge_enabled: bool = settings.llm_hedge_enabled,
+        hedge_percentile: float = settings.llm_hedge_percentile,
+        max_retries: int = settings.llm_max_retries,
     ) -> None:
         self.model = model
         self.temperature = temperature
+        self.timeout_sec = timeout_sec
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.max_retries = max_retries
+        self.backoff = BackoffPolicy(base_sec=min(0.5, settings.llm_backoff_max_sec), max_sec=settings.llm_backoff_max_sec)
         api_key = settings.openai_api_key.get_secret_value() if settings.openai_api_key else None
-        self.client = client or OpenAI(api_key=api_key)
+        # Повторы SDK не знают о дедлайне вызова: повторяем сами (_complete), медленный ответ дублирует hedge
+        self.client = client or OpenAI(api_key=api_key, max_retries=0)
 
     def chat(self, messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]] = None) -> str:
         kwargs: Dict[str, Any] = {
@@ -35,9 +71,83 @@ class LLMClient:
         if response_format:
             kwargs["response_format"] = response_format
 
-        response = self.client.chat.completions.create(**kwargs)
-        choice = response.choices[0].message
-        return choice.content or ""
+        _CALLS.inc()
+        started = time.monotonic()
+        deadline = started + self.timeout_sec
+        hedge_after = _LATENCY.percentile(self.hedge_percentile) if self.hedge_enabled else None
+
+        primary = _EXECUTOR.submit(self._complete, kwargs, deadline)
+        pending: Dict[Future, str] = {primary: "primary"}
+        if hedge_after is not None and hedge_after < self.timeout_sec:
+            done, _ = wait([primary], timeout=hedge_after)
+            if not done:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    _HEDGES_FIRED.inc()
+                    logger.info("LLM hedge request fired", extra={"after_sec": round(hedge_after, 2)})
+                    pending[_EXECUTOR.submit(self._complete, kwargs, deadline)] = "hedge"
+
+        last_error: BaseException | None = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                role = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    last_error = error
+                    continue
+                # Первый успешный ответ побеждает; проигравший отменяется (если ещё не стартовал),
+                # иначе его HTTP-вызов ограничен собственным таймаутом, а результат отбрасывается.
+                for loser in pending:
+                    loser.cancel()
+                if role == "hedge":
+                    _HEDGES_WON.inc()
+                _LATENCY_HIST.observe(time.monotonic() - started)
+                return future.result()
+
+        for future in pending:
+            future.cancel()
+        if pending or isinstance(last_error, openai.APITimeoutError):
+            _TIMEOUTS.inc()
+            raise LLMTimeoutError(f"LLM call exceeded deadline of {self.timeout_sec:.1f}s") from last_error
+        if last_error is None:
+            # Недостижимо: без pending цикл выходит только после ошибки каждого запроса
+            raise RuntimeError("LLM call finished without a result or an error")
+        raise last_error
+
+    def _complete(self, kwargs: Dict[str, Any], deadline: float) -> str:
+        """
+        Один запрос (основной или hedge) с повтором на 429/5xx/обрыв соединения, пока укладываемся в дедлайн.
+        Таймаут запроса не повторяем: он и есть остаток дедлайна.
+        """
+        attempt = 0
+        while True:
+            _REQUESTS.inc()
+            started = time.monotonic()
+            try:
+                response = self.client.chat.completions.create(**kwargs, timeout=max(0.0, deadline - started))
+            except RETRYABLE_ERRORS as exc:
+                if isinstance(exc, openai.APITimeoutError) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff.delay(attempt, exc)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                _RETRIES.inc()
+                logger.warning(
+                    "LLM request failed, retrying",
+                    extra={"error": type(exc).__name__, "attempt": attempt, "delay_sec": round(delay, 2)},
+                )
+                time.sleep(delay)
+                continue
+            _LATENCY.record(time.monotonic() - started)
+            choice = response.choices[0].message
+            return choice.content or ""
 
 
-__all__ = ["LLMClient", "DEFAULT_LLM_MODEL", "DEFAULT_TEMPERATURE"]
\ No newline at end of file
+__all__ = ["LLMClient", "LLMTimeoutError", "DEFAULT_LLM_MODEL", "DEFAULT_TEMPERATURE"]
@@ -0,0 +1,35 @@
+"""
+Latency tracking used to decide when to hedge an LLM request.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque
+
+import numpy as np
+
+
+class LatencyTracker:
+    """Скользящее окно латентностей успешных вызовов; перцентиль — порог для hedge-запроса."""
+
+    def __init__(self, window: int, min_samples: int) -> None:
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_sec: float) -> None:
+        with self._lock:
+            self._samples.append(latency_sec)
+
+    def percentile(self, pct: float) -> float | None:
+        """None, пока истории недостаточно: без неё hedge не отправляем."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = list(self._samples)
+        return float(np.percentile(samples, pct))
+
+
+__all__ = ["LatencyTracker"]
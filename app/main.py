@@ -1,14 +1,28 @@
 import logging
+import math
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from app.api.compression import CompressionMiddleware
 from app.api.routes import router as api_router
-from app.config import public_settings, setup_logging
+from app.config import public_settings, settings, setup_logging
+from app.rag.admission import AdmissionRejected
+from app.warmup import STATE as WARMUP_STATE, start_warmup
 
 logger = setup_logging()
-app = FastAPI(title="LOTR RAG Bot")
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Прогрев в фоне: порт открывается сразу, трафик пускаем по /ready
+    start_warmup()
+    yield
+
+
+app = FastAPI(title="LOTR RAG Bot", lifespan=lifespan)
 
 # CORS/OPTIONS support for фронт
 app.add_middleware(
@@ -18,6 +32,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.response_compression_enabled:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.response_compression_min_bytes)
 
 logger.info("Application starting")
 logger.info("Loaded settings: %s", public_settings())
@@ -28,6 +44,22 @@ def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """Готовность принимать трафик: 200 только после успешного warm-up, иначе 503."""
+    return JSONResponse(status_code=200 if WARMUP_STATE.ready else 503, content=WARMUP_STATE.as_dict())
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    logger.warning("Request shed by admission control", extra={"stage": exc.stage, "reason": exc.reason})
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Service overloaded ({exc.stage}: {exc.reason}), retry later"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after_sec)))},
+    )
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     logger.exception("Unhandled error", extra={"path": request.url.path})
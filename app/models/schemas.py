@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Literal
+from typing import Any, Dict, List, Literal
 
 from pydantic import BaseModel, Field
 
@@ -10,6 +10,14 @@ class ReindexRequest(BaseModel):
     """Запрос на переиндексацию корпуса."""
 
     mode: Literal["full"] = Field(default="full", description="Режим переиндексации")
+    resume: bool = Field(
+        default=False,
+        description="Продолжить прерванный reindex с последнего закоммиченного батча (если корпус не менялся)",
+    )
+    profile: bool | None = Field(
+        default=None,
+        description="Собрать профиль прогона (время по стадиям, пропускная способность, память); по умолчанию REINDEX_PROFILE_ENABLED",
+    )
 
 
 class ReindexResponse(BaseModel):
@@ -18,9 +26,32 @@ class ReindexResponse(BaseModel):
     status: Literal["completed"] = Field(default="completed")
     indexed_chunks: int = Field(..., ge=0, description="Сколько чанков проиндексировано")
     elapsed_sec: float | None = Field(None, ge=0, description="Сколько секунд заняла операция")
+    index_version: str | None = Field(None, description="Версия собранного индекса (см. /admin/index/stats)")
+    skipped_duplicates: int = Field(0, ge=0, description="Сколько почти-дублей не эмбеддилось (ссылаются на канонический чанк)")
+    resumed_chunks: int = Field(0, ge=0, description="Сколько чанков взято из чекпоинта прерванного reindex без повторного эмбеддинга")
+    precomputed_answers: int = Field(0, ge=0, description="Сколько готовых ответов на частые вопросы собрано (PRECOMPUTE_AFTER_REINDEX)")
+    profile: Dict[str, Any] | None = Field(
+        None, description="Профиль прогона (если запрошен); тот же JSON сохранён в файл profile.artifact"
+    )
 
 
 # RAG
+# Необязательные разделы AskResponse; answer_short/answer_full/can_answer возвращаются всегда
+AskResponseSection = Literal["citations", "context_chunks", "raw_scores"]
+ASK_RESPONSE_SECTIONS = ("citations", "context_chunks", "raw_scores")
+
+
+class RetrievalFilters(BaseModel):
+    """Ограничение поиска частью корпуса (условия объединяются через AND)."""
+
+    book_id: str | None = Field(
+        default=None,
+        description="Идентификатор книги: fellowship, two_towers, return_of_king",
+    )
+    book_part: int | None = Field(default=None, ge=1, description="Номер части (книги) 1–6")
+    chapter_index: int | None = Field(default=None, ge=1, description="Порядковый номер главы внутри book_id")
+
+
 class AskRequest(BaseModel):
     """Запрос на ответ по корпусу."""
 
@@ -31,6 +62,29 @@ class AskRequest(BaseModel):
         gt=0,
         description="Переопределить количество чанков контекста",
     )
+    filters: RetrievalFilters | None = Field(
+        default=None,
+        description="Фильтры по метаданным, применяемые на стороне векторного хранилища",
+    )
+    include: List[AskResponseSection] | None = Field(
+        default=None,
+        description="Какие необязательные разделы вернуть в ответе; не задано — все, [] — только сам ответ",
+    )
+    max_chunk_chars: int | None = Field(
+        default=None,
+        gt=0,
+        description="Обрезать текст каждого context_chunks до N символов (не больше CONTEXT_CHUNK_MAX_CHARS)",
+    )
+
+
+class ChatRequest(AskRequest):
+    """Вопрос в диалоге: уточняющие вопросы переиспользуют кандидатов и историю сессии."""
+
+    session_id: str | None = Field(
+        default=None,
+        max_length=64,
+        description="Идентификатор сессии из предыдущего ответа; не задан или истёк — новая сессия",
+    )
 
 
 class Citation(BaseModel):
@@ -63,12 +117,25 @@ class AskResponse(BaseModel):
     raw_scores: List[RetrievalScore] | None = None
 
 
+class ChatResponse(AskResponse):
+    session_id: str
+    turn: int = Field(..., ge=1, description="Номер хода в сессии")
+    retrieval: Literal["full", "incremental"] = Field(
+        ..., description="full — новый поиск в индексе, incremental — переранжирование кандидатов сессии"
+    )
+
+
 __all__ = [
     "ReindexRequest",
     "ReindexResponse",
+    "RetrievalFilters",
+    "AskResponseSection",
+    "ASK_RESPONSE_SECTIONS",
     "AskRequest",
+    "ChatRequest",
     "Citation",
     "ContextChunk",
     "AskResponse",
+    "ChatResponse",
     "RetrievalScore",
 ]
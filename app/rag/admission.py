@@ -0,0 +1,146 @@
+"""
+Admission control for RAG pipeline stages: per-stage concurrency limits with fair, bounded wait queues.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator
+
+from app.config import settings
+from app.metrics import REGISTRY
+
+STAGES = ("embedding", "search", "llm")
+ANONYMOUS_CLIENT = "anonymous"
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен: очередь переполнена (429) или ожидание слота истекло (503)."""
+
+    def __init__(self, stage: str, reason: str, status_code: int, retry_after_sec: float) -> None:
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after_sec = retry_after_sec
+
+
+class FairLimiter:
+    """
+    Семафор на `limit` одновременных вызовов с ограниченной очередью ожидания.
+    Очередь разбита по клиентам, освободившийся слот отдаётся клиентам по кругу,
+    поэтому один шумный клиент не вытесняет остальных.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait_sec: float, retry_after_sec: float) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_sec = max_wait_sec
+        self.retry_after_sec = retry_after_sec
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._queues: "OrderedDict[str, Deque[threading.Event]]" = OrderedDict()
+        self._rejected_full = REGISTRY.counter(f"admission_{name}_rejected_queue_full_total")
+        self._rejected_timeout = REGISTRY.counter(f"admission_{name}_rejected_timeout_total")
+        self._wait = REGISTRY.histogram(f"admission_{name}_wait_seconds")
+
+    @contextmanager
+    def slot(self, client_key: str | None) -> Iterator[None]:
+        self.acquire(client_key or ANONYMOUS_CLIENT)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, client_key: str) -> None:
+        started = time.monotonic()
+        with self._lock:
+            if self._active < self.limit and not self._queued:
+                self._active += 1
+                self._wait.observe(0.0)
+                return
+            if self._queued >= self.max_queue:
+                self._rejected_full.inc()
+                raise AdmissionRejected(self.name, "queue full", 429, self.retry_after_sec)
+            ticket = threading.Event()
+            self._queues.setdefault(client_key, deque()).append(ticket)
+            self._queued += 1
+
+        if not ticket.wait(self.max_wait_sec):
+            with self._lock:
+                # Слот мог быть выдан между таймаутом и захватом lock — тогда он наш
+                if not ticket.is_set():
+                    self._remove(client_key, ticket)
+                    self._rejected_timeout.inc()
+                    raise AdmissionRejected(self.name, "queue wait timeout", 503, self.retry_after_sec)
+        self._wait.observe(time.monotonic() - started)
+
+    def release(self) -> None:
+        with self._lock:
+            ticket = self._next_ticket()
+            if ticket is None:
+                self._active -= 1
+            else:
+                ticket.set()  # слот переходит ожидающему, _active не меняется
+
+    def _next_ticket(self) -> threading.Event | None:
+        if not self._queues:
+            return None
+        client_key, queue = next(iter(self._queues.items()))
+        ticket = queue.popleft()
+        self._queued -= 1
+        if queue:
+            self._queues.move_to_end(client_key)
+        else:
+            del self._queues[client_key]
+        return ticket
+
+    def _remove(self, client_key: str, ticket: threading.Event) -> None:
+        queue = self._queues.get(client_key)
+        if queue is None:
+            return
+        queue.remove(ticket)
+        self._queued -= 1
+        if not queue:
+            del self._queues[client_key]
+
+
+_LIMITERS: Dict[str, FairLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(stage: str) -> FairLimiter:
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(stage)
+        if limiter is None:
+            limits = {
+                "embedding": settings.admission_embedding_concurrency,
+                "search": settings.admission_search_concurrency,
+                "llm": settings.admission_llm_concurrency,
+            }
+            limiter = _LIMITERS[stage] = FairLimiter(
+                stage,
+                limit=limits[stage],
+                max_queue=settings.admission_max_queue,
+                max_wait_sec=settings.admission_max_queue_wait_sec,
+                retry_after_sec=settings.admission_retry_after_sec,
+            )
+        return limiter
+
+
+@contextmanager
+def admission(stage: str, client_key: str | None) -> Iterator[None]:
+    """Занять слот стадии на время блока; при выключенном ADMISSION_ENABLED — ничего не делает."""
+    if not settings.admission_enabled:
+        yield
+        return
+    with get_limiter(stage).slot(client_key):
+        yield
+
+
+__all__ = ["AdmissionRejected", "FairLimiter", "admission", "get_limiter", "STAGES"]
@@ -0,0 +1,157 @@
+"""
+Conversational follow-ups: reuse session candidates with an incremental re-rank instead of a new vector search.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import REGISTRY
+from app.models.schemas import ChatRequest, ChatResponse
+from app.rag.pipeline import RAGService, RetrievedChunk
+from app.rag.sessions import ChatSession, ChatTurn, SessionStore, get_session_store
+from app.vector_store.base import VectorStore, WhereFilter
+from app.vector_store.batch import ChunkBatch
+
+if TYPE_CHECKING:
+    from app.embeddings.client import EmbeddingsClient
+    from app.llm.client import LLMClient
+
+_INCREMENTAL = REGISTRY.counter("chat_incremental_total", "Ходов /chat, отвеченных переранжированием кандидатов сессии")
+_FULL = REGISTRY.counter("chat_full_retrieval_total", "Ходов /chat с новым поиском в индексе")
+
+
+def rerank_candidates(candidates: ChunkBatch, query: np.ndarray) -> List[RetrievedChunk]:
+    """Косинус каждого кандидата с вектором запроса (один matmul по матрице пула), по убыванию."""
+    matrix = candidates.embeddings
+    norms = np.linalg.norm(matrix, axis=1)
+    scores = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+    order = np.argsort(-scores, kind="stable")
+    return [
+        RetrievedChunk(chunk=candidates[int(i)], score=float(scores[i]), distance=float(1.0 - scores[i]))
+        for i in order
+    ]
+
+
+class ChatService(RAGService):
+    """
+    Диалог поверх RAG-пайплайна. Первый ход — обычный поиск, но с запасом кандидатов
+    (CHAT_CANDIDATE_POOL) и их эмбеддингами; пул сохраняется в сессии. Уточняющий вопрос
+    эмбеддится (один запрос к API), смешивается с прошлыми вопросами и переранжирует пул
+    в памяти вместо поиска в индексе. Новый поиск — если переранжированный пул не проходит
+    guardrails, поменялись фильтры или индекс, либо пул переиспользован CHAT_MAX_INCREMENTAL_TURNS раз.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embeddings_client: EmbeddingsClient,
+        llm_client: LLMClient,
+        session_store: SessionStore | None = None,
+        logger_: logging.Logger | None = None,
+        request_id: str | None = None,
+        client_id: str | None = None,
+    ) -> None:
+        super().__init__(
+            vector_store, embeddings_client, llm_client, logger_=logger_, request_id=request_id, client_id=client_id
+        )
+        self.session_store = session_store or get_session_store()
+
+    def chat(self, request: ChatRequest) -> ChatResponse:
+        session = self.session_store.get(request.session_id) if request.session_id else None
+        if session is None:
+            session = ChatSession.new()
+            if request.session_id:
+                self.logger.info(
+                    "Chat session expired or unknown, starting new one",
+                    extra={"session_id": request.session_id, "request_id": self.request_id},
+                )
+
+        question = self.normalize_question(request.question)
+        context_limit = request.max_context_chunks or settings.max_context_chunks
+        where = self.filters_to_where(request.filters)
+        index_info = self.vector_store.get_index_info()
+        embedding = np.asarray(self.embed_question(question, index_info), dtype=np.float32)
+        query = session.context_embedding(embedding, settings.chat_context_decay)
+
+        retrievals = self._incremental_candidates(session, query, where, index_info, context_limit)
+        if retrievals is not None:
+            retrieval = "incremental"
+            session.incremental_turns += 1
+            _INCREMENTAL.inc()
+        else:
+            retrieval = "full"
+            retrievals = self.search_chunks(
+                query,
+                max(settings.chat_candidate_pool, context_limit * 2),
+                where,
+                index_info,
+                with_embeddings=True,
+            )
+            session.candidates = ChunkBatch.from_chunks([r.chunk for r in retrievals]) if retrievals else None
+            session.where = where
+            session.index_version = index_info.get("index_version")
+            session.incremental_turns = 0
+            _FULL.inc()
+
+        response = self.generate_answer(
+            question,
+            retrievals[: context_limit * 2],
+            context_limit,
+            history=session.history_pairs(settings.chat_history_turns),
+        )
+        session.record_turn(
+            embedding,
+            ChatTurn(
+                question=question,
+                answer=response.answer_short[: settings.chat_history_answer_chars],
+                cited_chunk_ids=[c.chunk_id for c in response.citations if c.chunk_id],
+                retrieval=retrieval,
+            ),
+            max_turns=settings.chat_history_turns,
+        )
+        self.session_store.put(session)
+        self.logger.info(
+            "Chat turn answered",
+            extra={
+                "session_id": session.session_id,
+                "turn": session.turns,
+                "retrieval": retrieval,
+                "candidates": len(session.candidates) if session.candidates is not None else 0,
+                "can_answer": response.can_answer,
+                "request_id": self.request_id,
+            },
+        )
+        return ChatResponse(**dict(response), session_id=session.session_id, turn=session.turns, retrieval=retrieval)
+
+    def _incremental_candidates(
+        self,
+        session: ChatSession,
+        query: np.ndarray,
+        where: WhereFilter | None,
+        index_info: Dict[str, Any],
+        context_limit: int,
+    ) -> List[RetrievedChunk] | None:
+        """Переранжированный пул сессии или None, если нужен новый поиск."""
+        candidates = session.candidates
+        if candidates is None or candidates.embeddings is None or candidates.dim != len(query):
+            return None
+        if session.where != where or session.index_version != index_info.get("index_version"):
+            return None
+        if session.incremental_turns >= settings.chat_max_incremental_turns:
+            return None
+        reranked = rerank_candidates(candidates, query)
+        if self._should_refuse(reranked[: context_limit * 2]):
+            self.logger.info(
+                "Session candidates below guardrails, running full retrieval",
+                extra={"session_id": session.session_id, "top_score": round(reranked[0].score, 3) if reranked else None},
+            )
+            return None
+        return reranked
+
+
+__all__ = ["ChatService", "rerank_candidates"]
@@ -0,0 +1,32 @@
+"""
+Near-duplicate table cache: duplicates have no rows in the vector store and are resolved after search.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from app.indexing.dedup import NEAR_DUPLICATES_FILE, DuplicateTable
+
+_CACHE: Dict[str, Tuple[int, DuplicateTable]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_duplicate_table(path: str | Path = NEAR_DUPLICATES_FILE) -> DuplicateTable | None:
+    """Таблица почти-дублей, общая на процесс; перечитывается, если файл перезаписан reindex."""
+    path = str(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _CACHE[path] = (mtime, DuplicateTable.load(path))
+        return cached[1]
+
+
+__all__ = ["get_duplicate_table", "DuplicateTable", "NEAR_DUPLICATES_FILE"]
@@ -0,0 +1,346 @@
+"""
+Offline retrieval evaluation: golden LOTR questions -> recall@k, MRR, refusal rate and search latency.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.rag.pipeline import RAGService, RetrievedChunk
+from app.vector_store.base import DocumentChunk, VectorStore
+
+if TYPE_CHECKING:
+    from app.embeddings.client import EmbeddingsClient
+
+EVAL_DIR = os.path.join("data", "eval")
+GOLDEN_SET_FILE = os.path.join(EVAL_DIR, "golden_lotr_v1.json")
+DEFAULT_KS = (1, 3, 5, 10)
+REPORT_FORMAT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class MissingQueryEmbeddings(LookupError):
+    """В кэше нет эмбеддингов части вопросов, а сеть запрещена (--offline)."""
+
+
+@dataclass
+class GoldenQuestion:
+    """
+    Вопрос эталонного набора. Релевантный чанк задаётся явно (chunk_ids) или местом:
+    чанк из ожидаемой главы, содержащий хотя бы одну evidence-фразу (без фраз — любой чанк главы).
+    """
+
+    id: str
+    question: str
+    expected: List[Tuple[str, int]] = field(default_factory=list)
+    evidence: List[str] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    answerable: bool = True
+
+    def in_expected_chapter(self, chunk: DocumentChunk) -> bool:
+        meta = chunk.metadata or {}
+        return (str(meta.get("book_id")), int(meta.get("chapter_index") or 0)) in self.expected
+
+    def is_relevant(self, chunk: DocumentChunk) -> bool:
+        if self.chunk_ids:
+            return chunk.id in self.chunk_ids
+        if not self.in_expected_chapter(chunk):
+            return False
+        return not self.evidence or any(phrase in chunk.text for phrase in self.evidence)
+
+
+@dataclass
+class GoldenSet:
+    name: str
+    version: int
+    questions: List[GoldenQuestion]
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}_v{self.version}"
+
+
+def load_golden_set(path: str | Path = GOLDEN_SET_FILE) -> GoldenSet:
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    questions = [
+        GoldenQuestion(
+            id=item["id"],
+            question=item["question"],
+            expected=[(str(loc["book_id"]), int(loc["chapter_index"])) for loc in item.get("expected", [])],
+            evidence=list(item.get("evidence", [])),
+            chunk_ids=list(item.get("chunk_ids", [])),
+            answerable=bool(item.get("answerable", True)),
+        )
+        for item in raw["questions"]
+    ]
+    ids = [q.id for q in questions]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate question ids in golden set {path}")
+    return GoldenSet(name=raw["name"], version=int(raw["version"]), questions=questions)
+
+
+def query_cache_path(model: str, dimensions: int | None, directory: str | Path = EVAL_DIR) -> Path:
+    """Свой файл на (модель, размерность): смена EMBEDDING_DIMENSIONS не затирает кэш."""
+    safe_model = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+    return Path(directory) / f"query_embeddings_{safe_model}_{dimensions or 'full'}.npz"
+
+
+class QueryEmbeddingCache:
+    """npz-кэш эмбеддингов вопросов: eval воспроизводим и не ходит в API при повторных прогонах."""
+
+    def __init__(self, path: str | Path, model: str, dimensions: int | None) -> None:
+        self.path = Path(path)
+        self.model = model
+        self.dimensions = dimensions
+        self.vectors: Dict[str, List[float]] = {}
+        if self.path.exists():
+            with np.load(self.path) as data:
+                if str(data["model"]) == model and int(data["dimensions"]) == int(dimensions or 0):
+                    self.vectors = {str(t): v.tolist() for t, v in zip(data["texts"], data["vectors"])}
+
+    def missing(self, texts: Sequence[str]) -> List[str]:
+        return [t for t in dict.fromkeys(texts) if t not in self.vectors]
+
+    def fill(self, texts: Sequence[str], offline: bool = False, client: EmbeddingsClient | None = None) -> int:
+        """
+        Досчитать недостающие эмбеддинги через API и сохранить кэш; вернуть, сколько досчитано.
+        client — свой клиент (размер батча, счётчики запросов); модель и размерность должны совпадать с кэшем.
+        """
+        missing = self.missing(texts)
+        if not missing:
+            return 0
+        if offline:
+            raise MissingQueryEmbeddings(
+                f"{len(missing)} questions have no cached embeddings in {self.path}; run once without --offline"
+            )
+        if client is None:
+            from app.embeddings.client import EmbeddingsClient
+
+            client = EmbeddingsClient(model=self.model, dimensions=self.dimensions)
+        for text, vector in zip(missing, client.embed_texts(missing)):
+            self.vectors[text] = vector
+        self.save()
+        return len(missing)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        texts = list(self.vectors)
+        tmp = self.path.with_name("tmp_" + self.path.name)
+        np.savez(
+            tmp,
+            texts=np.asarray(texts),
+            vectors=np.asarray([self.vectors[t] for t in texts], dtype=np.float32),
+            model=np.asarray(self.model),
+            dimensions=np.asarray(int(self.dimensions or 0)),
+        )
+        os.replace(tmp, self.path)
+
+
+class CachedQueryEmbedder:
+    """Замена EmbeddingsClient для RAGService: embed_query только из кэша, без сети."""
+
+    def __init__(self, cache: QueryEmbeddingCache) -> None:
+        self.cache = cache
+        self.model = cache.model
+        self.dimensions = cache.dimensions
+
+    def embed_query(self, text: str) -> List[float]:
+        try:
+            return self.cache.vectors[text]
+        except KeyError:
+            raise MissingQueryEmbeddings(f"No cached embedding for question {text!r}") from None
+
+
+def count_relevant(store: VectorStore, questions: Sequence[GoldenQuestion], batch_size: int = 1000) -> Dict[str, int]:
+    """Сколько релевантных чанков у каждого вопроса в индексе (знаменатель recall и проверка разметки)."""
+    counts = {q.id: 0 for q in questions if q.answerable}
+    answerable = [q for q in questions if q.answerable]
+    for batch in store.iter_documents(batch_size):
+        for chunk in batch:
+            for q in answerable:
+                if q.is_relevant(chunk):
+                    counts[q.id] += 1
+    return counts
+
+
+def _first_rank(flags: Sequence[bool]) -> int | None:
+    return next((i + 1 for i, flag in enumerate(flags) if flag), None)
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": round(float(arr.mean()), 3),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def evaluate_question(
+    service: RAGService,
+    question: GoldenQuestion,
+    results: Sequence[RetrievedChunk],
+    latency_ms: float,
+    relevant_total: int,
+    ks: Sequence[int],
+    refusal_window: int,
+) -> Dict[str, Any]:
+    # Отказ считается ровно как в /ask: по тем же max_context_chunks * 2 кандидатам
+    row: Dict[str, Any] = {
+        "id": question.id,
+        "answerable": question.answerable,
+        "refused": service._should_refuse(results[:refusal_window]),
+        "top_score": round(results[0].score, 4) if results else None,
+        "latency_ms": round(latency_ms, 3),
+        "top_ids": [r.chunk.id for r in results[: max(ks)]],
+    }
+    if not question.answerable:
+        return row
+    relevant = [question.is_relevant(r.chunk) for r in results]
+    chapter = [question.in_expected_chapter(r.chunk) for r in results]
+    rank = _first_rank(relevant)
+    chapter_rank = _first_rank(chapter)
+    row.update(
+        {
+            "relevant_in_index": relevant_total,
+            "first_relevant_rank": rank,
+            "first_chapter_rank": chapter_rank,
+            "recall_at_k": {
+                str(k): round(sum(relevant[:k]) / min(k, relevant_total), 4) if relevant_total else 0.0 for k in ks
+            },
+        }
+    )
+    return row
+
+
+def summarize(rows: Sequence[Dict[str, Any]], ks: Sequence[int]) -> Dict[str, Any]:
+    answerable = [r for r in rows if r["answerable"]]
+    unanswerable = [r for r in rows if not r["answerable"]]
+
+    def mean(values: Sequence[float]) -> float:
+        return round(float(np.mean(values)), 4) if values else 0.0
+
+    def hit_at(key: str, k: int) -> float:
+        return mean([1.0 if r[key] is not None and r[key] <= k else 0.0 for r in answerable])
+
+    return {
+        "questions": len(rows),
+        "answerable": len(answerable),
+        "unanswerable": len(unanswerable),
+        "recall_at_k": {str(k): mean([r["recall_at_k"][str(k)] for r in answerable]) for k in ks},
+        "hit_at_k": {str(k): hit_at("first_relevant_rank", k) for k in ks},
+        "mrr": mean([1.0 / r["first_relevant_rank"] if r["first_relevant_rank"] else 0.0 for r in answerable]),
+        "chapter_hit_at_k": {str(k): hit_at("first_chapter_rank", k) for k in ks},
+        "chapter_mrr": mean([1.0 / r["first_chapter_rank"] if r["first_chapter_rank"] else 0.0 for r in answerable]),
+        # Отказ на вопрос из корпуса — ошибка; на вопрос вне корпуса — правильное поведение
+        "refusal_rate_answerable": mean([1.0 if r["refused"] else 0.0 for r in answerable]),
+        "refusal_rate_unanswerable": mean([1.0 if r["refused"] else 0.0 for r in unanswerable]),
+        "latency_ms": _percentiles([r["latency_ms"] for r in rows]),
+    }
+
+
+def run_evaluation(
+    store: VectorStore,
+    golden: GoldenSet,
+    embedder: CachedQueryEmbedder,
+    ks: Sequence[int] = DEFAULT_KS,
+    hierarchical: bool | None = None,
+) -> Dict[str, Any]:
+    """
+    Прогнать эталонные вопросы через тот же retrieve, что и /ask (проверка совместимости,
+    иерархический поиск, перевод дистанций в score), и собрать отчёт.
+    Латентность — время retrieve_relevant_chunks: эмбеддинг берётся из кэша, так что это поиск.
+    """
+    ks = sorted(set(ks))
+    refusal_window = settings.max_context_chunks * 2
+    max_candidates = max(max(ks), refusal_window)
+    service = RAGService(vector_store=store, embeddings_client=embedder, llm_client=None)  # type: ignore[arg-type]
+    relevant_totals = count_relevant(store, golden.questions)
+    index_info = store.get_index_info()
+
+    # Прогрев: первый запрос к бэкенду платит за ленивую загрузку индекса, в замер его не берём
+    if golden.questions:
+        service.retrieve_relevant_chunks(golden.questions[0].question, max_candidates, hierarchical=hierarchical)
+
+    rows: List[Dict[str, Any]] = []
+    for question in golden.questions:
+        started = time.perf_counter()
+        results = service.retrieve_relevant_chunks(question.question, max_candidates, hierarchical=hierarchical)
+        latency_ms = (time.perf_counter() - started) * 1000
+        rows.append(
+            evaluate_question(
+                service, question, results, latency_ms, relevant_totals.get(question.id, 0), ks, refusal_window
+            )
+        )
+
+    unlabeled = [q for q, total in relevant_totals.items() if total == 0]
+    if unlabeled:
+        logger.warning("Golden questions without relevant chunks in index", extra={"questions": unlabeled})
+    return {
+        "format_version": REPORT_FORMAT_VERSION,
+        "golden_set": golden.label,
+        "config": {
+            "vector_store_backend": settings.vector_store_backend,
+            "store": type(store).__name__,
+            "metric": store.metric,
+            "index_version": index_info.get("index_version"),
+            "embedding_model": embedder.model,
+            "embedding_dimensions": embedder.dimensions,
+            "relevance_threshold": settings.relevance_threshold,
+            "min_good_chunks": settings.min_good_chunks,
+            "max_candidates": max_candidates,
+            "hierarchical": settings.hierarchical_retrieval_enabled if hierarchical is None else hierarchical,
+            "ks": ks,
+        },
+        "unlabeled_questions": unlabeled,
+        "summary": summarize(rows, ks),
+        "queries": rows,
+    }
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]) -> List[Tuple[str, float, float]]:
+    """Пары (метрика, было, стало) по summary двух отчётов — для сравнения прогонов."""
+    before: Dict[str, float] = {}
+    after: Dict[str, float] = {}
+    _flatten("", old.get("summary", {}), before)
+    _flatten("", new.get("summary", {}), after)
+    return [(key, before[key], after[key]) for key in after if key in before]
+
+
+__all__ = [
+    "GoldenQuestion",
+    "GoldenSet",
+    "load_golden_set",
+    "QueryEmbeddingCache",
+    "CachedQueryEmbedder",
+    "MissingQueryEmbeddings",
+    "query_cache_path",
+    "count_relevant",
+    "run_evaluation",
+    "summarize",
+    "compare_reports",
+    "GOLDEN_SET_FILE",
+    "DEFAULT_KS",
+]
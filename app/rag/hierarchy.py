@@ -0,0 +1,40 @@
+"""
+Two-level retrieval: route the query to the best chapters by centroid, then search only their chunks.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Сборка индекса глав живёт в индексации (app.indexing.chapters); здесь — кэш для запросов, имена реэкспортируются
+from app.indexing.chapters import CHAPTER_INDEX_FILE, ChapterIndex, build_chapter_index, chapter_key, summarize_chapters
+
+_CACHE: Dict[str, Tuple[int, ChapterIndex]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_chapter_index(path: str | Path = CHAPTER_INDEX_FILE) -> ChapterIndex | None:
+    """Индекс глав, общий на процесс; перечитывается, если файл перезаписан reindex."""
+    path = str(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _CACHE[path] = (mtime, ChapterIndex.load(path))
+        return cached[1]
+
+
+__all__ = [
+    "ChapterIndex",
+    "build_chapter_index",
+    "summarize_chapters",
+    "get_chapter_index",
+    "chapter_key",
+    "CHAPTER_INDEX_FILE",
+]
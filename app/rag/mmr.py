@@ -0,0 +1,56 @@
+"""
+Maximal marginal relevance (MMR) re-ranking over candidate embeddings.
+"""
+
+from __future__ import annotations
+
+from typing import List, Sequence
+
+import numpy as np
+
+DEFAULT_MMR_LAMBDA = 0.7
+
+
+def mmr_select(
+    relevance: Sequence[float],
+    embeddings: Sequence[Sequence[float]] | np.ndarray,
+    k: int,
+    lambda_: float = DEFAULT_MMR_LAMBDA,
+) -> List[int]:
+    """
+    Выбрать k индексов кандидатов по MMR:
+    argmax_i [lambda * relevance_i - (1 - lambda) * max_{j in selected} cos(e_i, e_j)].
+
+    relevance — уже посчитанное сходство кандидата с вопросом (score), поэтому
+    эмбеддинг вопроса не нужен. Матрица попарных косинусов считается один раз.
+    """
+    n = len(relevance)
+    if k <= 0 or n == 0:
+        return []
+    if k >= n:
+        return list(range(n))
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+    similarity = matrix @ matrix.T
+
+    rel = np.asarray(relevance, dtype=np.float32)
+    selected: List[int] = [int(np.argmax(rel))]
+    # max сходства каждого кандидата с уже выбранными; обновляется инкрементально
+    max_sim = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        mmr = lambda_ * rel - (1.0 - lambda_) * max_sim
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, similarity[best], out=max_sim)
+
+    return selected
+
+
+__all__ = ["mmr_select", "DEFAULT_MMR_LAMBDA"]
@@ -4,27 +4,52 @@ RAG pipeline: normalize question, retrieve context, guardrails, LLM answer.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 from dataclasses import dataclass
-from typing import List, Sequence, Dict, Set
+from typing import TYPE_CHECKING, Any, Hashable, List, Sequence, Dict, Set, Tuple
+
+import numpy as np
 
 from app.config import settings
-from app.embeddings.client import EmbeddingsClient
-from app.llm.client import LLMClient
+from app.metrics import REGISTRY
 from app.models.schemas import (
     AskRequest,
     AskResponse,
     Citation,
     ContextChunk,
+    RetrievalFilters,
     RetrievalScore,
 )
-from app.vector_store.base import DocumentChunk, VectorStore
+from app.rag.admission import admission
+from app.rag.duplicates import get_duplicate_table
+from app.rag.hierarchy import get_chapter_index
+from app.rag.mmr import mmr_select
+from app.rag.precomputed import get_answer_table
+from app.rag.singleflight import SingleFlight
+from app.vector_store.base import (
+    DocumentChunk,
+    VectorStore,
+    WhereFilter,
+    check_index_compatibility,
+    distance_to_similarity,
+    matches_where,
+)
+
+if TYPE_CHECKING:  # клиенты тянут openai; импортируются при первом запросе или в warm-up
+    from app.embeddings.client import EmbeddingsClient
+    from app.llm.client import LLMClient
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_REFUSAL = "В загруженных текстах недостаточно информации для точного ответа."
 
+# Общая на процесс таблица выполняющихся ответов: одинаковые одновременные вопросы считаются один раз
+_ASK_FLIGHTS: SingleFlight[AskResponse] = SingleFlight()
+_COALESCED = REGISTRY.counter("ask_coalesced_total", "Ответов, полученных от уже выполнявшегося запроса")
+_PRECOMPUTED_HITS = REGISTRY.counter("ask_precomputed_hits_total", "Ответов из таблицы готовых ответов")
+
 
 @dataclass
 class RetrievedChunk:
@@ -43,34 +68,119 @@ class RAGService:
         llm_client: LLMClient,
         logger_: logging.Logger | None = None,
         request_id: str | None = None,
+        client_id: str | None = None,
     ) -> None:
         self.vector_store = vector_store
         self.embeddings_client = embeddings_client
         self.llm_client = llm_client
         self.logger = logger_ or logging.getLogger(__name__)
         self.request_id = request_id
+        # Ключ клиента для честной очереди admission control (API-ключ или IP)
+        self.client_id = client_id
 
     # --- Public API ---
     def answer_question(self, request: AskRequest) -> AskResponse:
         """Главная точка входа для ответа на вопрос."""
+        precomputed = self.precomputed_answer(request)
+        if precomputed is not None:
+            return precomputed
+        if not settings.ask_coalescing_enabled:
+            return self._answer_question(request)
+        response, shared = _ASK_FLIGHTS.do(self.coalescing_key(request), lambda: self._answer_question(request))
+        return self._coalesced_result(response, shared)
+
+    async def answer_question_async(self, request: AskRequest) -> AskResponse:
+        """Async-вариант: пайплайн выполняется в пуле потоков, дубли ждут без блокировки цикла."""
+        precomputed = self.precomputed_answer(request)
+        if precomputed is not None:
+            return precomputed
+        if not settings.ask_coalescing_enabled:
+            return await asyncio.get_running_loop().run_in_executor(None, self._answer_question, request)
+        response, shared = await _ASK_FLIGHTS.do_async(
+            self.coalescing_key(request), lambda: self._answer_question(request)
+        )
+        return self._coalesced_result(response, shared)
+
+    @classmethod
+    def coalescing_key(cls, request: AskRequest) -> Hashable:
+        """
+        Ключ склейки: нормализованный вопрос (без учёта регистра) и опции, влияющие на ответ.
+        Проекция (include, max_chunk_chars) применяется к готовому ответу и в ключ не входит.
+        """
+        options = request.model_dump(exclude={"question", "include", "max_chunk_chars"}, mode="json")
+        return (cls.normalize_question(request.question).casefold(), json.dumps(options, sort_keys=True))
+
+    def precomputed_answer(self, request: AskRequest) -> AskResponse | None:
+        """
+        Готовый ответ на частый вопрос: точное совпадение ключа склейки (нормализованный вопрос
+        и опции) в таблице, собранной для текущего index_version. Без эмбеддинга и LLM.
+        """
+        if not settings.precomputed_answers_enabled:
+            return None
+        table = get_answer_table()
+        response = table.get(self.coalescing_key(request)) if table is not None else None
+        if response is None:
+            return None
+        # Версию индекса сверяем только при попадании: промахи не трогают хранилище
+        index_version = self.vector_store.get_index_info().get("index_version")
+        if table.index_version != index_version:
+            if table.first_stale_hit(index_version):
+                self.logger.warning(
+                    "Precomputed answers built for another index version, ignoring until rebuilt",
+                    extra={
+                        "table_index_version": table.index_version,
+                        "index_version": index_version,
+                        "request_id": self.request_id,
+                    },
+                )
+            return None
+        _PRECOMPUTED_HITS.inc()
+        self.logger.info("Ask served from precomputed answers", extra={"request_id": self.request_id})
+        return response.model_copy(deep=True)
+
+    def _coalesced_result(self, response: AskResponse, shared: bool) -> AskResponse:
+        if not shared:
+            return response
+        _COALESCED.inc()
+        self.logger.info("Ask coalesced with in-flight request", extra={"request_id": self.request_id})
+        # Каждому вызывающему — своя копия, чтобы пост-обработка одного не задевала других
+        return response.model_copy(deep=True)
+
+    def _answer_question(self, request: AskRequest) -> AskResponse:
         normalized_question = self.normalize_question(request.question)
+        context_limit = request.max_context_chunks or settings.max_context_chunks
         retrievals = self.retrieve_relevant_chunks(
             normalized_question,
-            max_candidates=(request.max_context_chunks or settings.max_context_chunks) * 2,
+            max_candidates=context_limit * 2,
+            where=self.filters_to_where(request.filters),
         )
+        return self.generate_answer(normalized_question, retrievals, context_limit)
 
-        if self._should_refuse(retrievals):
+    def generate_answer(
+        self,
+        question: str,
+        retrievals: Sequence[RetrievedChunk],
+        context_limit: int,
+        history: Sequence[Tuple[str, str]] | None = None,
+    ) -> AskResponse:
+        """
+        Guardrails -> выбор контекста -> LLM -> цитаты по уже найденным кандидатам.
+        history — предыдущие пары (вопрос, краткий ответ) диалога для /chat, уже урезанные вызывающим.
+        """
+        # Соседи для расширения ищутся по всем найденным строкам, guardrails и контекст — по уникальным текстам
+        unique = self._collapse_duplicates(retrievals)
+        if self._should_refuse(unique):
             self.logger.info(
                 "Guardrails refusal before LLM",
                 extra={"reason": "low_relevance", "request_id": self.request_id},
             )
             return self._refusal_response()
 
-        context_limit = request.max_context_chunks or settings.max_context_chunks
-        context = self._select_context(retrievals, limit=context_limit)
-        messages = self._build_messages(question=normalized_question, context=context)
+        candidates = self._diversify(unique, limit=context_limit) if settings.mmr_enabled else unique
+        context = self._select_context(candidates, limit=context_limit)
+        messages = self._build_messages(question=question, context=context, history=history)
 
-        raw_answer = self.llm_client.chat(messages, response_format={"type": "json_object"})
+        raw_answer = self._chat(messages)
         parsed_primary = self._parse_llm_response(raw_answer)
 
         if not parsed_primary:
@@ -94,8 +204,10 @@ class RAGService:
         context_used = context
 
         if expanded_context != context:
-            messages_expanded = self._build_messages(question=normalized_question, context=expanded_context)
-            raw_expanded = self.llm_client.chat(messages_expanded, response_format={"type": "json_object"})
+            messages_expanded = self._build_messages(
+                question=question, context=expanded_context, history=history
+            )
+            raw_expanded = self._chat(messages_expanded)
             parsed_expanded = self._parse_llm_response(raw_expanded)
 
             if parsed_expanded and parsed_expanded.get("can_answer", False):
@@ -133,21 +245,71 @@ class RAGService:
         """Трим и схлопывание пробелов/переносов."""
         return " ".join(text.strip().split())
 
-    def retrieve_relevant_chunks(self, question: str, max_candidates: int) -> List[RetrievedChunk]:
-        embedding = self.embeddings_client.embed_text(question)
-        raw_results = self.vector_store.search(embedding, top_k=max_candidates)
+    @staticmethod
+    def filters_to_where(filters: RetrievalFilters | None) -> WhereFilter | None:
+        """Фильтры запроса -> where для VectorStore (только заданные поля)."""
+        if filters is None:
+            return None
+        where: Dict[str, Any] = filters.model_dump(exclude_none=True)
+        return where or None
+
+    def retrieve_relevant_chunks(
+        self,
+        question: str,
+        max_candidates: int,
+        where: WhereFilter | None = None,
+        hierarchical: bool | None = None,
+    ) -> List[RetrievedChunk]:
+        """
+        Эмбеддинг вопроса -> поиск в векторке. hierarchical=True (по умолчанию
+        HIERARCHICAL_RETRIEVAL_ENABLED) сначала выбирает лучшие главы по их векторам
+        и ищет только среди их чанков.
+        """
+        index_info = self.vector_store.get_index_info()
+        embedding = self.embed_question(question, index_info)
+        return self.search_chunks(embedding, max_candidates, where, index_info, hierarchical=hierarchical)
+
+    def embed_question(self, question: str, index_info: Dict[str, Any]) -> List[float]:
+        # До вызова API: несовпадение модели/настроенной размерности видно без трат на эмбеддинг
+        check_index_compatibility(index_info, self.embeddings_client.model, self.embeddings_client.dimensions)
+        with admission("embedding", self.client_id):
+            embedding = self.embeddings_client.embed_query(question)
+        check_index_compatibility(index_info, self.embeddings_client.model, len(embedding))
+        return embedding
+
+    def search_chunks(
+        self,
+        embedding: Sequence[float] | np.ndarray,
+        max_candidates: int,
+        where: WhereFilter | None,
+        index_info: Dict[str, Any],
+        hierarchical: bool | None = None,
+        with_embeddings: bool | None = None,
+    ) -> List[RetrievedChunk]:
+        """Поиск по готовому эмбеддингу; результаты — по убыванию score (косинусное сходство)."""
+        if settings.hierarchical_retrieval_enabled if hierarchical is None else hierarchical:
+            where = self._scope_to_chapters(embedding, where, index_info)
+        with_embeddings = settings.mmr_enabled if with_embeddings is None else with_embeddings
+        with admission("search", self.client_id):
+            raw_results = self.vector_store.search(
+                embedding, top_k=max_candidates, where=where, with_embeddings=with_embeddings
+            )
+            raw_results = self._resolve_duplicates(embedding, raw_results, where, with_embeddings, index_info)
         processed: List[RetrievedChunk] = []
 
         for chunk, distance in raw_results:
-            score = self._distance_to_score(distance)
+            score = self._distance_to_score(distance, self.vector_store.metric)
             processed.append(RetrievedChunk(chunk=chunk, score=score, distance=distance))
 
+        # Сортировка устойчивая: дубль остаётся сразу за своим каноническим чанком
         processed.sort(key=lambda x: x.score, reverse=True)
+        processed = self._limit_groups(processed, max_candidates)
         self.logger.info(
             "Retrieved chunks",
             extra={
                 "requested": max_candidates,
                 "returned": len(processed),
+                "where": where,
                 "top_score": round(processed[0].score, 3) if processed else None,
                 "request_id": self.request_id,
                 "results": [
@@ -158,6 +320,72 @@ class RAGService:
         )
         return processed
 
+    def _resolve_duplicates(
+        self,
+        embedding: Sequence[float] | np.ndarray,
+        results: List[Tuple[DocumentChunk, float]],
+        where: WhereFilter | None,
+        with_embeddings: bool,
+        index_info: Dict[str, Any],
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Подставить почти-дубли (в индексе их нет) сразу за каноническим чанком, с его дистанцией и вектором.
+        С фильтром дубль может подходить, а канонический чанк — нет (стих повторён в другой книге):
+        такие группы дозапрашиваются по canonical_id, а сам канонический чанк в выдачу не идёт.
+        """
+        table = get_duplicate_table()
+        if table is None or not len(table) or table.index_version != index_info.get("index_version"):
+            return results
+        if where:
+            found = {chunk.id for chunk, _ in results}
+            groups = [group for group in table.groups_matching(where) if group not in found]
+            if groups:
+                results = results + self.vector_store.search(
+                    embedding,
+                    top_k=len(groups),
+                    where={"canonical_id": {"$in": groups}},
+                    with_embeddings=with_embeddings,
+                )
+        resolved: List[Tuple[DocumentChunk, float]] = []
+        for chunk, distance in results:
+            if matches_where(chunk.metadata, where):
+                resolved.append((chunk, distance))
+            for duplicate in table.duplicates_of(chunk.id, where):
+                resolved.append(
+                    (DocumentChunk(duplicate.id, duplicate.text, duplicate.metadata, chunk.embedding), distance)
+                )
+        return resolved
+
+    @staticmethod
+    def _limit_groups(results: List[RetrievedChunk], limit: int) -> List[RetrievedChunk]:
+        """Не больше limit групп (канонический чанк со своими дублями), строки дублей не занимают слоты."""
+        groups: Set[str] = set()
+        limited: List[RetrievedChunk] = []
+        for item in results:
+            key = item.chunk.metadata.get("canonical_id") or item.chunk.id
+            if key not in groups:
+                if len(groups) >= limit:
+                    continue
+                groups.add(key)
+            limited.append(item)
+        return limited
+
+    def _scope_to_chapters(
+        self, embedding: Sequence[float], where: WhereFilter | None, index_info: Dict[str, Any]
+    ) -> WhereFilter | None:
+        """Добавить к фильтру chapter_key $in [лучшие главы]; без актуального индекса глав — плоский поиск."""
+        chapter_index = get_chapter_index()
+        if chapter_index is None or chapter_index.index_version != index_info.get("index_version"):
+            self.logger.warning(
+                "Chapter index missing or stale, falling back to flat search",
+                extra={"request_id": self.request_id, "index_version": index_info.get("index_version")},
+            )
+            return where
+        chapters = chapter_index.select(embedding, settings.hierarchy_top_chapters, where)
+        if not chapters:
+            return where
+        return {**(where or {}), "chapter_key": {"$in": chapters}}
+
     def _should_refuse(self, results: Sequence[RetrievedChunk]) -> bool:
         if not results:
             return True
@@ -170,19 +398,62 @@ class RAGService:
             return True
         return False
 
+    @staticmethod
+    def _collapse_duplicates(results: Sequence[RetrievedChunk]) -> List[RetrievedChunk]:
+        """Из строк почти-дублей (общий canonical_id) оставить лучшую по рангу."""
+        seen: set[str] = set()
+        unique: List[RetrievedChunk] = []
+        for item in results:
+            key = item.chunk.metadata.get("canonical_id") or item.chunk.id
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(item)
+        return unique
+
     @staticmethod
     def _select_context(results: Sequence[RetrievedChunk], limit: int) -> List[RetrievedChunk]:
         return list(results[:limit])
 
+    def _diversify(self, results: Sequence[RetrievedChunk], limit: int) -> List[RetrievedChunk]:
+        """
+        MMR-переранжировка: убираем почти одинаковых соседей (общий overlap абзацев),
+        чтобы слоты контекста не тратились на дубли. Без эмбеддингов — порядок не меняется.
+        """
+        if len(results) <= limit or any(len(r.chunk.embedding) == 0 for r in results):
+            return list(results)
+        order = mmr_select(
+            [r.score for r in results],
+            [r.chunk.embedding for r in results],
+            k=limit,
+            lambda_=settings.mmr_lambda,
+        )
+        self.logger.info(
+            "MMR context selection",
+            extra={
+                "candidates": len(results),
+                "selected": [results[i].chunk.id for i in order],
+                "request_id": self.request_id,
+            },
+        )
+        return [results[i] for i in order]
+
     @staticmethod
-    def _distance_to_score(distance: float) -> float:
-        # Chroma возвращает дистанцию (меньше — лучше). Переводим в псевдо-сходство.
-        try:
-            return max(0.0, min(1.0, 1.0 - float(distance)))
-        except Exception:
-            return 0.0
+    def _distance_to_score(distance: float, metric: str) -> float:
+        # Бэкенд возвращает дистанцию (меньше — лучше) в своей метрике; переводим в косинусное сходство,
+        # чтобы RELEVANCE_THRESHOLD означал одно и то же для cosine/ip/l2.
+        return distance_to_similarity(distance, metric)
 
-    def _build_messages(self, question: str, context: Sequence[RetrievedChunk]) -> List[dict]:
+    def _chat(self, messages: List[dict]) -> str:
+        with admission("llm", self.client_id):
+            return self.llm_client.chat(messages, response_format={"type": "json_object"})
+
+    def _build_messages(
+        self,
+        question: str,
+        context: Sequence[RetrievedChunk],
+        history: Sequence[Tuple[str, str]] | None = None,
+    ) -> List[dict]:
         fragments: List[str] = []
         for idx, item in enumerate(context, start=1):
             meta = item.chunk.metadata
@@ -208,10 +479,17 @@ class RAGService:
             ),
         }
 
+        # История диалога — только для понимания вопроса (местоимения, «а дальше?»), факты — из фрагментов
+        dialogue = [
+            "Предыдущие вопросы и ответы этого диалога:\n"
+            + "\n".join(f"— Вопрос: {q}\n  Ответ: {a}" for q, a in history)
+        ] if history else []
+
         user_message = {
             "role": "user",
             "content": "\n\n".join(
-                [
+                dialogue
+                + [
                     f'Вопрос пользователя: "{question}"',
                     "Ниже приведены фрагменты из корпуса. Используй только их.",
                     "\n\n".join(fragments),
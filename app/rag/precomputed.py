@@ -0,0 +1,219 @@
+"""
+Precomputed answers for frequent questions: built after reindex, served by /ask before any embedding or LLM call.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Hashable, List, Tuple
+
+from app.config import settings
+from app.models.schemas import AskRequest, AskResponse
+from app.vector_store.base import VectorStore
+
+if TYPE_CHECKING:
+    from app.embeddings.client import EmbeddingsClient
+    from app.llm.client import LLMClient
+
+PRECOMPUTED_ANSWERS_FILE = os.path.join(settings.vector_store_path, "precomputed_answers.json")
+PRECOMPUTED_FORMAT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def table_key(key: Hashable) -> str:
+    """Ключ склейки RAGService.coalescing_key (вопрос без регистра + опции) -> строка для JSON."""
+    return json.dumps(list(key), ensure_ascii=False)
+
+
+def load_question_list(path: str | Path = settings.precomputed_questions_file) -> List[str]:
+    """Список вопросов: {"questions": ["...", {"question": "..."}]} или просто массив."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    items = data.get("questions", []) if isinstance(data, dict) else data
+    return [item["question"] if isinstance(item, dict) else str(item) for item in items]
+
+
+class AnswerTable:
+    """
+    Таблица готовых ответов, привязанная к index_version. Файл читается целиком один раз
+    (ответы валидируются в AskResponse при загрузке), дальше поиск — словарь по ключу.
+    """
+
+    def __init__(self, index_version: str | None, answers: Dict[str, AskResponse], built_at: str | None = None) -> None:
+        self.index_version = index_version
+        self.answers = answers
+        self.built_at = built_at
+        # Версия индекса, о несовпадении с которой уже предупредили (таблица кэшируется на процесс)
+        self.stale_for: str | None = None
+
+    @classmethod
+    def load(cls, path: str | Path = PRECOMPUTED_ANSWERS_FILE) -> "AnswerTable":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("format_version") != PRECOMPUTED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported precomputed answers format: {data.get('format_version')}")
+        answers = {row["key"]: AskResponse.model_validate(row["response"]) for row in data.get("answers", [])}
+        return cls(data.get("index_version"), answers, data.get("built_at"))
+
+    def get(self, key: Hashable) -> AskResponse | None:
+        return self.answers.get(table_key(key))
+
+    def first_stale_hit(self, index_version: str | None) -> bool:
+        """True только при первом попадании в устаревшую таблицу для данной версии индекса (для лога)."""
+        if self.stale_for == index_version:
+            return False
+        self.stale_for = index_version
+        return True
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+
+def write_answer_table(
+    rows: List[Tuple[str, str, AskResponse]],
+    index_version: str,
+    path: str | Path = PRECOMPUTED_ANSWERS_FILE,
+) -> None:
+    """rows — (ключ, исходный вопрос, ответ); запись атомарная, читатели видят старую или новую таблицу."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "format_version": PRECOMPUTED_FORMAT_VERSION,
+        "index_version": index_version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "answers": [
+            {"key": key, "question": question, "response": response.model_dump(mode="json")}
+            for key, question, response in rows
+        ],
+    }
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+_CACHE: Dict[str, Tuple[int, AnswerTable]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_table(path: str | Path = PRECOMPUTED_ANSWERS_FILE) -> AnswerTable | None:
+    """Таблица, общая на процесс; перечитывается, если файл перезаписан новой сборкой."""
+    path = str(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _CACHE[path] = (mtime, AnswerTable.load(path))
+        return cached[1]
+
+
+@dataclass
+class PrecomputeSummary:
+    questions: int
+    answered: int
+    refused: int
+    failed: int
+    elapsed_sec: float
+    index_version: str | None = None
+
+
+def precompute_answers(
+    vector_store: VectorStore,
+    embeddings_client: EmbeddingsClient,
+    llm_client: LLMClient,
+    questions: List[str],
+    concurrency: int = settings.precompute_concurrency,
+    path: str | Path = PRECOMPUTED_ANSWERS_FILE,
+) -> PrecomputeSummary:
+    """
+    Прогнать вопросы через RAGService (минуя саму таблицу и склейку) не более чем в concurrency
+    потоков и сохранить ответы для текущего index_version. Отказы не сохраняются: на такие
+    вопросы /ask продолжит отвечать обычным путём.
+    """
+    from app.rag.pipeline import RAGService  # pipeline сам импортирует этот модуль
+
+    started = time.time()
+    index_version = vector_store.get_index_info().get("index_version")
+    if not index_version:
+        raise ValueError("Index has no index_version; run reindex before precomputing answers")
+
+    unique: Dict[str, Tuple[str, AskRequest]] = {}
+    for question in questions:
+        request = AskRequest(question=question)
+        unique.setdefault(table_key(RAGService.coalescing_key(request)), (question, request))
+
+    def answer(key: str, request: AskRequest) -> AskResponse:
+        service = RAGService(vector_store, embeddings_client, llm_client, request_id=f"precompute:{key}")
+        return service._answer_question(request)
+
+    rows: List[Tuple[str, str, AskResponse]] = []
+    refused = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="precompute") as pool:
+        futures = {pool.submit(answer, key, request): (key, question) for key, (question, request) in unique.items()}
+        for future in as_completed(futures):
+            key, question = futures[future]
+            try:
+                response = future.result()
+            except Exception:
+                failed += 1
+                logger.exception("Precompute failed", extra={"question": question})
+                continue
+            if response.can_answer:
+                rows.append((key, question, response))
+            else:
+                refused += 1
+                logger.warning("Precompute refused, question left to live path", extra={"question": question})
+
+    rows.sort(key=lambda row: row[0])
+    write_answer_table(rows, index_version, path)
+    summary = PrecomputeSummary(
+        questions=len(unique),
+        answered=len(rows),
+        refused=refused,
+        failed=failed,
+        elapsed_sec=round(time.time() - started, 2),
+        index_version=index_version,
+    )
+    logger.info("Precomputed answers written", extra={**summary.__dict__, "path": str(path)})
+    return summary
+
+
+def precompute_after_reindex(vector_store: VectorStore, embeddings_client: EmbeddingsClient) -> int:
+    """
+    Стадия ReindexService (PRECOMPUTE_AFTER_REINDEX): готовые ответы для нового index_version.
+    Ошибка здесь не отменяет reindex — /ask просто отвечает обычным путём.
+    """
+    from app.llm.client import LLMClient
+
+    try:
+        summary = precompute_answers(
+            vector_store,
+            embeddings_client,
+            LLMClient(),
+            load_question_list(settings.precomputed_questions_file),
+        )
+    except Exception:
+        logger.exception("Precomputing answers failed")
+        return 0
+    return summary.answered
+
+
+__all__ = [
+    "AnswerTable",
+    "PrecomputeSummary",
+    "precompute_answers",
+    "precompute_after_reindex",
+    "get_answer_table",
+    "write_answer_table",
+    "load_question_list",
+    "table_key",
+    "PRECOMPUTED_ANSWERS_FILE",
+]
@@ -0,0 +1,282 @@
+"""
+Server-side chat sessions: retrieval state per conversation in a bounded LRU+TTL store (in-memory or local SQLite).
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, List, Protocol, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.base import WhereFilter
+from app.vector_store.batch import ChunkBatch
+
+
+@dataclass
+class ChatTurn:
+    question: str
+    answer: str
+    cited_chunk_ids: List[str]
+    retrieval: str
+
+
+@dataclass
+class ChatSession:
+    """
+    Состояние диалога. Всё ограничено по размеру: query_embeddings и history — последние
+    CHAT_HISTORY_TURNS ходов, candidates — пул из последнего полного поиска
+    (до CHAT_CANDIDATE_POOL чанков с эмбеддингами), а не всё, что когда-либо находилось.
+    """
+
+    session_id: str
+    created_at: float
+    updated_at: float
+    where: WhereFilter | None = None
+    index_version: str | None = None
+    turns: int = 0
+    # Подряд идущие ходы без нового поиска: после CHAT_MAX_INCREMENTAL_TURNS пул обновляется
+    incremental_turns: int = 0
+    query_embeddings: np.ndarray | None = None
+    candidates: ChunkBatch | None = None
+    history: List[ChatTurn] = field(default_factory=list)
+
+    @classmethod
+    def new(cls) -> "ChatSession":
+        now = time.time()
+        return cls(session_id=uuid.uuid4().hex, created_at=now, updated_at=now)
+
+    def context_embedding(self, embedding: np.ndarray, decay: float) -> np.ndarray:
+        """
+        Вектор запроса с учётом диалога: текущий вопрос + предыдущие с весами decay, decay², ...
+        «А что было дальше?» сам по себе почти пуст — смысл ему дают прошлые вопросы.
+        """
+        query = _unit(np.asarray(embedding, dtype=np.float32))
+        if self.query_embeddings is None or not len(self.query_embeddings) or decay == 0:
+            return query
+        if self.query_embeddings.shape[1] != len(query):
+            return query
+        weights = decay ** np.arange(len(self.query_embeddings), 0, -1, dtype=np.float32)
+        return _unit(query + weights @ self.query_embeddings)
+
+    def copy(self) -> "ChatSession":
+        """
+        Независимая копия для хода диалога. Поверхностной достаточно: ход не меняет массивы
+        и списки на месте, а присваивает новые (record_turn, пул кандидатов в ChatService).
+        """
+        return replace(self, history=list(self.history))
+
+    def history_pairs(self, limit: int) -> List[Tuple[str, str]]:
+        return [(turn.question, turn.answer) for turn in self.history[-limit:]] if limit else []
+
+    def record_turn(self, embedding: np.ndarray, turn: ChatTurn, max_turns: int) -> None:
+        vector = _unit(np.asarray(embedding, dtype=np.float32))[None, :]
+        if self.query_embeddings is None or self.query_embeddings.shape[1] != vector.shape[1]:
+            stacked = vector
+        else:
+            stacked = np.concatenate([self.query_embeddings, vector])
+        keep = max(max_turns, 1)
+        self.query_embeddings = stacked[-keep:]
+        self.history = (self.history + [turn])[-max_turns:] if max_turns else []
+        self.turns += 1
+        self.updated_at = time.time()
+
+    def to_payload(self) -> Dict[str, Any]:
+        candidates = None
+        if self.candidates is not None:
+            candidates = {
+                "ids": self.candidates.ids.tolist(),
+                "texts": self.candidates.texts.tolist(),
+                "metadatas": self.candidates.metadatas(),
+                "embeddings": _encode_matrix(self.candidates.embeddings),
+            }
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "where": self.where,
+            "index_version": self.index_version,
+            "turns": self.turns,
+            "incremental_turns": self.incremental_turns,
+            "query_embeddings": _encode_matrix(self.query_embeddings),
+            "candidates": candidates,
+            "history": [asdict(turn) for turn in self.history],
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "ChatSession":
+        candidates = payload.get("candidates")
+        return cls(
+            session_id=payload["session_id"],
+            created_at=payload["created_at"],
+            updated_at=payload["updated_at"],
+            where=payload.get("where"),
+            index_version=payload.get("index_version"),
+            turns=payload.get("turns", 0),
+            incremental_turns=payload.get("incremental_turns", 0),
+            query_embeddings=_decode_matrix(payload.get("query_embeddings")),
+            candidates=None
+            if candidates is None
+            else ChunkBatch.from_records(
+                candidates["ids"], candidates["texts"], candidates["metadatas"], _decode_matrix(candidates["embeddings"])
+            ),
+            history=[ChatTurn(**turn) for turn in payload.get("history") or []],
+        )
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _encode_matrix(matrix: np.ndarray | None) -> Dict[str, Any] | None:
+    if matrix is None:
+        return None
+    data = np.ascontiguousarray(matrix, dtype="<f4")
+    return {"shape": list(data.shape), "data": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def _decode_matrix(encoded: Dict[str, Any] | None) -> np.ndarray | None:
+    if encoded is None:
+        return None
+    return np.frombuffer(base64.b64decode(encoded["data"]), dtype="<f4").reshape(encoded["shape"]).copy()
+
+
+class SessionStore(Protocol):
+    def get(self, session_id: str) -> ChatSession | None:
+        ...
+
+    def put(self, session: ChatSession) -> None:
+        ...
+
+    def delete(self, session_id: str) -> bool:
+        ...
+
+
+class MemorySessionStore:
+    """
+    LRU на OrderedDict: сессии старше ttl_sec с последнего хода и сверх max_sessions вытесняются.
+    get/put отдают и сохраняют копии, как SQLite-хранилище: параллельные ходы одной сессии
+    не меняют общий объект, побеждает последний put.
+    """
+
+    def __init__(self, max_sessions: int = settings.chat_max_sessions, ttl_sec: float = settings.chat_session_ttl_sec) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> ChatSession | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.updated_at > self.ttl_sec:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session.copy()
+
+    def put(self, session: ChatSession) -> None:
+        with self._lock:
+            self._sessions[session.session_id] = session.copy()
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """
+    Сессии в локальном SQLite-файле: переживают рестарт и общие для воркеров uvicorn на одной машине.
+    Сессия хранится JSON-ом (векторы — base64 float32); вытеснение — по updated_at.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = settings.chat_session_path,
+        max_sessions: int = settings.chat_max_sessions,
+        ttl_sec: float = settings.chat_session_ttl_sec,
+    ) -> None:
+        self.path = Path(path)
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions (session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_updated ON chat_sessions (updated_at)")
+
+    def get(self, session_id: str) -> ChatSession | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM chat_sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl_sec),
+            ).fetchone()
+        return ChatSession.from_payload(json.loads(row[0])) if row else None
+
+    def put(self, session: ChatSession) -> None:
+        payload = json.dumps(session.to_payload(), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, updated_at, payload) VALUES (?, ?, ?)",
+                (session.session_id, session.updated_at, payload),
+            )
+            self._conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - self.ttl_sec,))
+            self._conn.execute(
+                "DELETE FROM chat_sessions WHERE session_id IN "
+                "(SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+
+_STORE: SessionStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Хранилище сессий, общее на процесс (CHAT_SESSION_BACKEND=memory|sqlite)."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            if settings.chat_session_backend == "sqlite":
+                _STORE = SqliteSessionStore()
+            else:
+                _STORE = MemorySessionStore()
+        return _STORE
+
+
+__all__ = [
+    "ChatSession",
+    "ChatTurn",
+    "SessionStore",
+    "MemorySessionStore",
+    "SqliteSessionStore",
+    "get_session_store",
+]
@@ -0,0 +1,64 @@
+"""
+Single-flight: concurrent calls with the same key share one in-flight computation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Первый вызов с ключом (лидер) выполняет fn, остальные, пришедшие до его завершения,
+    ждут тот же Future. Синхронные и асинхронные вызовы делят общую таблицу,
+    поэтому дубль из async-кода присоединяется к вычислению, начатому в потоке, и наоборот.
+    Результат не кэшируется: после завершения ключ освобождается.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Вернуть (результат, shared); shared=True — результат получен от чужого вызова."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result(), not leader
+
+    async def do_async(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """То же для async-вызывающих: fn лидера выполняется в пуле потоков, цикл событий не блокируется."""
+        future, leader = self._join(key)
+        if leader:
+            await asyncio.get_running_loop().run_in_executor(None, self._run, key, future, fn)
+        return await asyncio.wrap_future(future), not leader
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[[], T]) -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as exc:  # ошибка лидера достаётся всем ожидающим
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+__all__ = ["SingleFlight"]
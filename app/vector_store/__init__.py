@@ -1,23 +1,58 @@
 """
 Vector store abstractions and factories.
+
+Backends are imported lazily: importing this package (or `app.vector_store.base`)
+does not pull in chromadb until a Chroma store is actually requested.
 """
 
+from importlib import import_module
+
 from app.config import settings
-from app.vector_store.chroma_store import ChromaVectorStore
 
 DEFAULT_VECTOR_STORE_BACKEND = settings.vector_store_backend
 
+# Имя класса -> модуль бэкенда
+_BACKENDS = {
+    "ChromaVectorStore": "app.vector_store.chroma_store",
+    "CompactVectorStore": "app.vector_store.compact_store",
+    "SnapshotVectorStore": "app.vector_store.snapshot_store",
+    "ShardedVectorStore": "app.vector_store.sharded_store",
+}
+_BACKEND_CLASSES = {
+    "chroma": "ChromaVectorStore",
+    "compact": "CompactVectorStore",
+    "snapshot": "SnapshotVectorStore",
+    "sharded": "ShardedVectorStore",
+}
+
+
+def __getattr__(name: str):
+    if name in _BACKENDS:
+        return getattr(import_module(_BACKENDS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_vector_store():
     """
     Factory to obtain configured VectorStore instance.
-    Currently supports only Chroma backend.
+    Supports Chroma, the quantized compact index, read-only shared snapshots
+    and a sharded store over N Chroma/compact partitions (SHARD_* settings).
     """
     backend = DEFAULT_VECTOR_STORE_BACKEND.lower()
-    if backend == "chroma":
-        return ChromaVectorStore()
-    raise ValueError(f"Unsupported vector store backend: {backend}")
-
+    class_name = _BACKEND_CLASSES.get(backend)
+    if class_name is None:
+        raise ValueError(f"Unsupported vector store backend: {backend}")
+    store_cls = __getattr__(class_name)
+    if backend == "sharded":
+        return store_cls.from_settings()
+    return store_cls()
 
-__all__ = ["DEFAULT_VECTOR_STORE_BACKEND", "get_vector_store", "ChromaVectorStore"]
 
+__all__ = [
+    "DEFAULT_VECTOR_STORE_BACKEND",
+    "get_vector_store",
+    "ChromaVectorStore",
+    "CompactVectorStore",
+    "SnapshotVectorStore",
+    "ShardedVectorStore",
+]
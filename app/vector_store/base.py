@@ -5,7 +5,16 @@ Vector store interface and shared types.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Protocol, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Protocol, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from app.vector_store.batch import ChunkBatch
+
+# Фильтр по метаданным: {"book_id": "two_towers", "book_part": {"$in": [3, 4]}}.
+# Несколько ключей объединяются через AND; поддерживается равенство и $in.
+WhereFilter = Dict[str, Any]
 
 
 @dataclass
@@ -17,15 +26,134 @@ class DocumentChunk:
 
 
 class VectorStore(Protocol):
+    # Метрика, в которой search возвращает дистанции: cosine | ip | l2 (квадрат L2, как в Chroma)
+    metric: str
+    # upsert_documents сразу на диске (переживает падение процесса до finalize): resume reindex
+    # не повторяет закоммиченные батчи; иначе они заново пишутся из векторов чекпоинта
+    durable_upserts: bool
+
     def clear(self) -> None:
         ...
 
-    def upsert_documents(self, documents: List[DocumentChunk]) -> None:
+    def upsert_documents(self, documents: List[DocumentChunk] | ChunkBatch) -> None:
+        """ChunkBatch пишется без поэлементной конвертации; список DocumentChunk — как раньше."""
+        ...
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int,
+        where: WhereFilter | None = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """Результаты — строки ChunkBatch (ChunkRow): embedding — view на матрицу float32."""
+        ...
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[DocumentChunk]]:
+        """Все документы индекса с эмбеддингами, пачками по batch_size (для экспорта)."""
+        ...
+
+    def count_documents(self) -> int:
+        """Сколько документов уже записано (без upsert, ждущих finalize): resume сверяет с чекпоинтом."""
+        ...
+
+    def prepare(self, chunks: ChunkBatch) -> None:
+        """
+        Вызывается в reindex до clear() и первого upsert, со всеми чанками прогона (ещё без эмбеддингов):
+        бэкенды, раскладывающие данные по составу корпуса (шарды по книгам), планируют размещение
+        и отклоняют неподходящую конфигурацию, пока старый индекс ещё не стёрт.
+        """
+
+    def finalize(self) -> None:
+        """Вызывается после последнего upsert в reindex; бэкенды с отложенной записью сбрасывают индекс на диск."""
+
+    def get_index_info(self) -> Dict[str, Any]:
         ...
 
-    def search(self, query_embedding: List[float], top_k: int) -> List[Tuple[DocumentChunk, float]]:
+    def set_index_info(self, info: Dict[str, Any]) -> None:
         ...
 
 
-__all__ = ["DocumentChunk", "VectorStore"]
+class IndexCompatibilityError(RuntimeError):
+    """Эмбеддинги запроса несовместимы с индексом (другая модель или размерность)."""
+
+
+def check_index_compatibility(
+    index_info: Dict[str, Any],
+    model: str,
+    dimensions: int | None,
+) -> None:
+    """
+    Сверить модель/размерность эмбеддингов с тем, что записано в индексе при reindex.
+    Индексы без записанной информации (собранные до появления проверки) пропускаем.
+    """
+    indexed_model = index_info.get("embedding_model")
+    if indexed_model and indexed_model != model:
+        raise IndexCompatibilityError(
+            f"Index was built with embedding model {indexed_model!r}, queries use {model!r}; reindex required"
+        )
+    indexed_dims = index_info.get("embedding_dimensions")
+    if indexed_dims and dimensions and int(indexed_dims) != int(dimensions):
+        raise IndexCompatibilityError(
+            f"Index has {indexed_dims}-dim embeddings, queries produce {dimensions}-dim; "
+            "check EMBEDDING_DIMENSIONS or reindex"
+        )
+
+
+def distance_to_similarity(distance: float, metric: str) -> float:
+    """
+    Перевести дистанцию бэкенда в сходство [0, 1] с учётом метрики.
+    Эмбеддинги OpenAI нормированы, поэтому для всех метрик результат — косинусное сходство:
+    cosine: d = 1 - cos; ip: d = 1 - dot; l2: d = ||a - b||^2 = 2 - 2cos.
+    """
+    try:
+        value = float(distance)
+    except (TypeError, ValueError):
+        return 0.0
+    if metric == "l2":
+        similarity = 1.0 - value / 2.0
+    elif metric in ("cosine", "ip"):
+        similarity = 1.0 - value
+    else:
+        raise ValueError(f"Unsupported metric: {metric}")
+    return max(0.0, min(1.0, similarity))
+
+
+def normalize_where(where: WhereFilter | None) -> Dict[str, List[Any]]:
+    """
+    Привести фильтр к виду {поле: [допустимые значения]}.
+    Пустые значения (None) отбрасываются, неизвестные операторы — ошибка.
+    """
+    normalized: Dict[str, List[Any]] = {}
+    for key, condition in (where or {}).items():
+        if condition is None:
+            continue
+        if isinstance(condition, dict):
+            unknown = set(condition) - {"$eq", "$in"}
+            if unknown:
+                raise ValueError(f"Unsupported where operator(s) for {key!r}: {sorted(unknown)}")
+            values: List[Any] = []
+            if "$eq" in condition:
+                values.append(condition["$eq"])
+            values.extend(condition.get("$in") or [])
+        else:
+            values = [condition]
+        normalized[key] = values
+    return normalized
+
+
+def matches_where(metadata: Dict[str, Any], where: WhereFilter | None) -> bool:
+    return all(metadata.get(key) in values for key, values in normalize_where(where).items())
+
+
+__all__ = [
+    "DocumentChunk",
+    "VectorStore",
+    "WhereFilter",
+    "IndexCompatibilityError",
+    "check_index_compatibility",
+    "distance_to_similarity",
+    "normalize_where",
+    "matches_where",
+]
 
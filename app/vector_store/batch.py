@@ -0,0 +1,231 @@
+"""
+Columnar chunk batch: float32 embedding matrix, id/text arrays and metadata columns with zero-copy row views.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+
+from app.vector_store.base import DocumentChunk
+
+# Маркер «ключа нет в метаданных строки» (в отличие от явного None)
+MISSING = type("Missing", (), {"__repr__": lambda self: "MISSING", "__slots__": ()})()
+
+
+def _object_array(values: Iterable[Any]) -> np.ndarray:
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def column(values: Sequence[Any]) -> np.ndarray:
+    """Колонка метаданных: int64 для целых без пропусков, иначе object (строки не копируются)."""
+    if len(values) and all(type(v) is int for v in values):
+        return np.asarray(values, dtype=np.int64)
+    return _object_array(values)
+
+
+class ChunkRow:
+    """
+    Строка батча без копирования: id/text/embedding читаются из колонок, embedding — view
+    на строку матрицы. metadata собирается из колонок при первом обращении и только для
+    чтения: изменения в словаре не попадают в батч (для этого — ChunkBatch.set_column).
+    """
+
+    __slots__ = ("batch", "index", "_metadata")
+
+    def __init__(self, batch: "ChunkBatch", index: int) -> None:
+        self.batch = batch
+        self.index = index
+        self._metadata: Dict[str, Any] | None = None
+
+    @property
+    def id(self) -> str:
+        return self.batch.ids[self.index]
+
+    @property
+    def text(self) -> str:
+        return self.batch.texts[self.index]
+
+    @property
+    def embedding(self) -> np.ndarray:
+        if self.batch.embeddings is None:
+            return np.empty(0, dtype=np.float32)
+        return self.batch.embeddings[self.index]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = self.batch.row_metadata(self.index)
+        return self._metadata
+
+    def to_chunk(self) -> DocumentChunk:
+        return DocumentChunk(id=self.id, text=self.text, metadata=dict(self.metadata), embedding=self.embedding.tolist())
+
+    def __repr__(self) -> str:
+        return f"ChunkRow(id={self.id!r})"
+
+
+class ChunkBatch:
+    """
+    Колоночное представление пачки чанков: ids и texts — object-массивы (строки не копируются),
+    metadata — по колонке на ключ, embeddings — одна матрица float32 (n, dim) или None.
+    Срезы (batch[a:b]) — view без копирования; итерация отдаёт ChunkRow, совместимые
+    по атрибутам с DocumentChunk.
+    """
+
+    __slots__ = ("ids", "texts", "columns", "embeddings")
+
+    def __init__(
+        self,
+        ids: Sequence[str] | np.ndarray,
+        texts: Sequence[str] | np.ndarray,
+        columns: Dict[str, np.ndarray] | None = None,
+        embeddings: np.ndarray | None = None,
+    ) -> None:
+        self.ids = ids if isinstance(ids, np.ndarray) else _object_array(ids)
+        self.texts = texts if isinstance(texts, np.ndarray) else _object_array(texts)
+        self.columns: Dict[str, np.ndarray] = dict(columns or {})
+        self.embeddings = embeddings
+        if len(self.texts) != len(self.ids):
+            raise ValueError(f"ids/texts length mismatch: {len(self.ids)} != {len(self.texts)}")
+        if embeddings is not None and len(embeddings) != len(self.ids):
+            raise ValueError(f"embeddings have {len(embeddings)} rows for {len(self.ids)} chunks")
+
+    # --- Конструкторы ---
+    @classmethod
+    def from_records(
+        cls,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict[str, Any] | None],
+        embeddings: np.ndarray | Sequence[Sequence[float]] | None = None,
+    ) -> "ChunkBatch":
+        keys: Dict[str, None] = {}
+        for metadata in metadatas:
+            keys.update(dict.fromkeys(metadata or ()))
+        columns = {key: column([(m or {}).get(key, MISSING) for m in metadatas]) for key in keys}
+        matrix = None if embeddings is None else np.asarray(embeddings, dtype=np.float32)
+        return cls(ids, texts, columns, matrix)
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[DocumentChunk]) -> "ChunkBatch":
+        if isinstance(chunks, ChunkBatch):
+            return chunks
+        with_embeddings = bool(chunks) and all(len(c.embedding) for c in chunks)
+        return cls.from_records(
+            [c.id for c in chunks],
+            [c.text for c in chunks],
+            [c.metadata for c in chunks],
+            np.asarray([c.embedding for c in chunks], dtype=np.float32) if with_embeddings else None,
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["ChunkBatch"]) -> "ChunkBatch":
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls([], [])
+        keys: Dict[str, None] = {}
+        for batch in batches:
+            keys.update(dict.fromkeys(batch.columns))
+        columns = {}
+        for key in keys:
+            parts = [
+                b.columns[key] if key in b.columns else _object_array([MISSING] * len(b)) for b in batches
+            ]
+            same_dtype = all(p.dtype == parts[0].dtype for p in parts)
+            columns[key] = np.concatenate(parts if same_dtype else [p.astype(object) for p in parts])
+        embeddings = None
+        if all(b.embeddings is not None for b in batches):
+            embeddings = np.concatenate([b.embeddings for b in batches])
+        return cls(
+            np.concatenate([b.ids for b in batches]),
+            np.concatenate([b.texts for b in batches]),
+            columns,
+            embeddings,
+        )
+
+    # --- Доступ ---
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[ChunkRow]:
+        return (ChunkRow(self, i) for i in range(len(self)))
+
+    def __getitem__(self, key: int | slice) -> "ChunkRow | ChunkBatch":
+        if isinstance(key, slice):
+            return ChunkBatch(
+                self.ids[key],
+                self.texts[key],
+                {name: values[key] for name, values in self.columns.items()},
+                None if self.embeddings is None else self.embeddings[key],
+            )
+        index = range(len(self))[key]
+        return ChunkRow(self, index)
+
+    @property
+    def dim(self) -> int:
+        return 0 if self.embeddings is None else int(self.embeddings.shape[1])
+
+    def take(self, indices: Sequence[int] | np.ndarray) -> "ChunkBatch":
+        """Подмножество строк (копируются указатели и строки матрицы, не сами тексты)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return ChunkBatch(
+            self.ids[indices],
+            self.texts[indices],
+            {name: values[indices] for name, values in self.columns.items()},
+            None if self.embeddings is None else self.embeddings[indices],
+        )
+
+    def row_metadata(self, index: int) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        for name, values in self.columns.items():
+            value = values[index]
+            if value is MISSING:
+                continue
+            metadata[name] = value.item() if isinstance(value, np.generic) else value
+        return metadata
+
+    def metadatas(self) -> List[Dict[str, Any]]:
+        """Список словарей метаданных (для API бэкендов): по одному tolist() на колонку."""
+        lists = {name: values.tolist() for name, values in self.columns.items()}
+        rows: List[Dict[str, Any]] = [{} for _ in range(len(self))]
+        for name, values in lists.items():
+            for row, value in zip(rows, values):
+                if value is not MISSING:
+                    row[name] = value
+        return rows
+
+    def set_column(self, name: str, values: Sequence[Any] | np.ndarray) -> None:
+        if len(values) != len(self):
+            raise ValueError(f"Column {name!r} has {len(values)} values for {len(self)} chunks")
+        self.columns[name] = values if isinstance(values, np.ndarray) else column(values)
+
+    def allocate_embeddings(self, dim: int) -> np.ndarray:
+        """Выделить матрицу (n, dim) под эмбеддинги, которые будут дописываться по батчам."""
+        self.embeddings = np.empty((len(self), dim), dtype=np.float32)
+        return self.embeddings
+
+    def dedupe_last(self) -> "ChunkBatch":
+        """Оставить последнее вхождение каждого id (семантика upsert)."""
+        last = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        if len(last) == len(self):
+            return self
+        return self.take(sorted(last.values()))
+
+    def to_chunks(self) -> List[DocumentChunk]:
+        return [row.to_chunk() for row in self]
+
+    def __repr__(self) -> str:
+        return f"ChunkBatch(n={len(self)}, dim={self.dim}, columns={list(self.columns)})"
+
+
+def as_batch(documents: Sequence[DocumentChunk] | ChunkBatch) -> ChunkBatch:
+    """Привести вход upsert_documents к ChunkBatch (списки DocumentChunk конвертируются один раз)."""
+    return documents if isinstance(documents, ChunkBatch) else ChunkBatch.from_chunks(documents)
+
+
+__all__ = ["ChunkBatch", "ChunkRow", "as_batch", "column", "MISSING"]
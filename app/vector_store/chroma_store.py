@@ -5,12 +5,14 @@ Chroma-based VectorStore implementation.
 from __future__ import annotations
 
 import logging
-from typing import List, Tuple
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
 
 import chromadb
+import numpy as np
 
 from app.config import settings
-from app.vector_store.base import DocumentChunk, VectorStore
+from app.vector_store.base import DocumentChunk, VectorStore, WhereFilter, normalize_where
+from app.vector_store.batch import ChunkBatch, as_batch
 
 CHROMA_COLLECTION = "lotr_corpus"
 CHROMA_PERSIST_DIR = settings.vector_store_path
@@ -19,55 +21,159 @@ logger = logging.getLogger(__name__)
 
 
 class ChromaVectorStore(VectorStore):
+    durable_upserts = True
+
     def __init__(self, persist_directory: str | None = None, collection_name: str = CHROMA_COLLECTION) -> None:
         self.persist_directory = persist_directory or CHROMA_PERSIST_DIR
         self.collection_name = collection_name
         self.client = chromadb.PersistentClient(path=self.persist_directory)
-        self.collection = self.client.get_or_create_collection(self.collection_name)
+        self.collection = self._get_or_create_collection()
+        self.metric = _collection_metric(self.collection)
+        if self.metric != settings.vector_metric:
+            # Метрику существующей коллекции поменять нельзя — только пересборкой (reindex)
+            logger.warning(
+                "Chroma collection metric differs from VECTOR_METRIC; reindex to apply",
+                extra={"collection_metric": self.metric, "configured_metric": settings.vector_metric},
+            )
+        if _collection_hnsw(self.collection).get("ef_search") not in (None, settings.hnsw_search_ef):
+            self.set_search_ef(settings.hnsw_search_ef)
         logger.info(
             "ChromaVectorStore initialised",
-            extra={"persist_directory": self.persist_directory, "collection": self.collection_name},
+            extra={
+                "persist_directory": self.persist_directory,
+                "collection": self.collection_name,
+                "metric": self.metric,
+            },
+        )
+
+    def _get_or_create_collection(self):
+        # Параметры HNSW применяются только при создании коллекции (кроме search_ef)
+        return self.client.get_or_create_collection(
+            self.collection_name,
+            metadata={
+                "hnsw:space": settings.vector_metric,
+                "hnsw:M": settings.hnsw_m,
+                "hnsw:construction_ef": settings.hnsw_construction_ef,
+                "hnsw:search_ef": settings.hnsw_search_ef,
+            },
         )
 
+    def set_search_ef(self, search_ef: int) -> None:
+        """Поменять ef при поиске на живой коллекции (компромисс скорость/recall)."""
+        self.collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+        logger.info("Chroma search_ef updated", extra={"collection": self.collection_name, "search_ef": search_ef})
+
+    def get_index_info(self) -> Dict[str, Any]:
+        # Служебные hnsw:* ключи — параметры коллекции, а не информация об индексе
+        return {k: v for k, v in (self.collection.metadata or {}).items() if not k.startswith("hnsw:")}
+
+    def set_index_info(self, info: Dict[str, Any]) -> None:
+        # modify(metadata=...) заменяет метаданные целиком, hnsw:* передавать нельзя
+        self.collection.modify(metadata={**self.get_index_info(), **info})
+        logger.info("Chroma index info updated", extra={"collection": self.collection_name, **info})
+
     def clear(self) -> None:
         self.client.delete_collection(self.collection_name)
-        self.collection = self.client.get_or_create_collection(self.collection_name)
+        self.collection = self._get_or_create_collection()
+        self.metric = _collection_metric(self.collection)
         logger.info("Chroma collection cleared and recreated", extra={"collection": self.collection_name})
 
-    def upsert_documents(self, documents: List[DocumentChunk]) -> None:
-        if not documents:
-            return
-
-        ids = [doc.id for doc in documents]
-        embeddings = [doc.embedding for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-        texts = [doc.text for doc in documents]
+    def count_documents(self) -> int:
+        return self.collection.count()
 
-        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
-        logger.info("Upserted documents into Chroma", extra={"count": len(documents), "collection": self.collection_name})
+    def upsert_documents(self, documents: List[DocumentChunk] | ChunkBatch) -> None:
+        if not len(documents):
+            return
 
-    def search(self, query_embedding: List[float], top_k: int) -> List[Tuple[DocumentChunk, float]]:
+        batch = as_batch(documents)
+        # Один add не может превышать лимит батча клиента (для SQLite ~5k записей);
+        # эмбеддинги уходят срезами матрицы float32, без списков Python float
+        step = self.client.get_max_batch_size()
+        for start in range(0, len(batch), step):
+            part = batch[start : start + step]
+            self.collection.add(
+                ids=part.ids.tolist(),
+                embeddings=part.embeddings,
+                metadatas=part.metadatas(),
+                documents=part.texts.tolist(),
+            )
+        logger.info("Upserted documents into Chroma", extra={"count": len(batch), "collection": self.collection_name})
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[DocumentChunk]]:
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            result = self.collection.get(
+                include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset
+            )
+            yield [
+                DocumentChunk(id=doc_id, text=text, metadata=metadata or {}, embedding=list(map(float, embedding)))
+                for doc_id, text, metadata, embedding in zip(
+                    result["ids"], result["documents"], result["metadatas"], result["embeddings"]
+                )
+            ]
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int,
+        where: WhereFilter | None = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[DocumentChunk, float]]:
         if top_k <= 0:
             return []
 
+        include = ["documents", "metadatas", "distances"]
+        if with_embeddings:
+            include.append("embeddings")
+
+        query_kwargs: Dict[str, Any] = {}
+        chroma_where = _to_chroma_where(where)
+        if chroma_where:
+            query_kwargs["where"] = chroma_where
+
         result = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=np.asarray(query_embedding, dtype=np.float32).reshape(1, -1),
             n_results=top_k,
-            include=["documents", "metadatas", "distances"],
+            include=include,
+            **query_kwargs,
         )
 
         ids = result.get("ids", [[]])[0] or []
-        texts = result.get("documents", [[]])[0] or []
-        metadatas = result.get("metadatas", [[]])[0] or []
         distances = result.get("distances", [[]])[0] or []
+        embeddings = (result.get("embeddings") or [None])[0]
+        batch = ChunkBatch.from_records(
+            ids,
+            result.get("documents", [[]])[0] or [],
+            result.get("metadatas", [[]])[0] or [{}] * len(ids),
+            embeddings if with_embeddings and embeddings is not None and len(embeddings) else None,
+        )
+        return [(row, float(distance)) for row, distance in zip(batch, distances)]
+
+
+def _collection_hnsw(collection) -> Dict[str, Any]:
+    configuration = getattr(collection, "configuration", None) or {}
+    return dict(configuration.get("hnsw") or {})
+
+
+def _collection_metric(collection) -> str:
+    """Фактическая метрика коллекции (у Chroma по умолчанию — l2)."""
+    space = _collection_hnsw(collection).get("space") or (collection.metadata or {}).get("hnsw:space")
+    return str(space or "l2")
 
-        chunks: List[Tuple[DocumentChunk, float]] = []
-        for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
-            chunk = DocumentChunk(id=doc_id, text=text, metadata=metadata or {}, embedding=[])
-            score = float(distance)
-            chunks.append((chunk, score))
 
-        return chunks
+def _to_chroma_where(where: WhereFilter | None) -> Dict[str, Any] | None:
+    """Перевести фильтр VectorStore в where-клаузу Chroma (несколько условий — через $and)."""
+    clauses: List[Dict[str, Any]] = []
+    for key, values in normalize_where(where).items():
+        if len(values) == 1:
+            clauses.append({key: values[0]})
+        else:
+            clauses.append({key: {"$in": values}})
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
 
 
 __all__ = ["ChromaVectorStore", "CHROMA_COLLECTION", "CHROMA_PERSIST_DIR"]
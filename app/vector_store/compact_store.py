@@ -0,0 +1,455 @@
+"""
+Compact on-disk VectorStore: quantized codes for approximate scoring, memory-mapped float32 for exact rescoring.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.base import DocumentChunk, VectorStore, WhereFilter, normalize_where
+from app.vector_store.batch import ChunkBatch, as_batch
+from app.vector_store.quantization import Quantizer, build_quantizer, load_quantizer
+
+COMPACT_INDEX_DIR = os.path.join(settings.vector_store_path, "compact")
+COMPACT_FORMAT_VERSION = 1
+# Поля метаданных, по которым строится инвертированный индекс для where-фильтров
+FILTER_KEYS = ("book", "book_id", "book_part", "chapter_index", "chapter_key", "source_file", "canonical_id")
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+CODES_FILE = "codes.npy"
+QUANTIZER_FILE = "quantizer.npz"
+IDS_FILE = "ids.npy"
+DOCS_FILE = "docs.jsonl"
+DOC_OFFSETS_FILE = "doc_offsets.npy"
+POSTINGS_FILE = "postings.json"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+def write_compact_index(
+    directory: str | Path,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    quantization: str = settings.compact_quantization,
+    pq_subvectors: int = settings.compact_pq_subvectors,
+    index_info: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """
+    Записать индекс в каталог. Векторы нормализуются (метрика — косинус),
+    кодируются квантизатором и сохраняются рядом с исходными float32 для rescoring.
+    Каждый файл пишется во временный и атомарно переименовывается.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    count, dim = vectors.shape if vectors.size else (0, 0)
+
+    quantizer = build_quantizer(quantization, pq_subvectors)
+    codes = quantizer.fit(vectors).encode(vectors) if count else np.empty((0, 0), dtype=np.int8)
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    postings: Dict[str, Dict[Any, List[int]]] = {key: {} for key in FILTER_KEYS}
+    docs_tmp = directory / (DOCS_FILE + ".tmp")
+    with docs_tmp.open("wb") as fh:
+        for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+            line = json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+            fh.write(line)
+            offsets[row + 1] = offsets[row] + len(line)
+            for key in FILTER_KEYS:
+                value = (metadata or {}).get(key)
+                if value is not None:
+                    postings[key].setdefault(value, []).append(row)
+    os.replace(docs_tmp, directory / DOCS_FILE)
+
+    _save_npy(directory / VECTORS_FILE, vectors)
+    _save_npy(directory / CODES_FILE, codes)
+    _save_npy(directory / IDS_FILE, np.asarray(list(ids), dtype=str))
+    _save_npy(directory / DOC_OFFSETS_FILE, offsets)
+    quantizer_tmp = directory / ("tmp_" + QUANTIZER_FILE)
+    quantizer.save(quantizer_tmp)
+    os.replace(quantizer_tmp, directory / QUANTIZER_FILE)
+    _write_json(
+        directory / POSTINGS_FILE,
+        {key: [[value, rows] for value, rows in values.items()] for key, values in postings.items()},
+    )
+
+    manifest = {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "count": int(count),
+        "dim": int(dim),
+        "metric": "cosine",
+        "quantization": quantizer.kind,
+        "code_bytes_per_vector": int(codes.shape[1] * codes.itemsize) if count else 0,
+        "float_bytes_per_vector": int(dim * 4),
+        "index_info": index_info or {},
+    }
+    # manifest пишется последним: его наличие означает, что индекс полностью записан
+    _write_json(directory / MANIFEST_FILE, manifest)
+    return manifest
+
+
+def merge_pending(
+    index: "CompactIndex | None", pending: Sequence[ChunkBatch]
+) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+    """
+    Строки индекса, не перезаписанные pending, плюс сами pending (последняя запись id выигрывает) —
+    входные данные для write_compact_index. Векторы pending склеиваются из матриц батчей целиком.
+    """
+    batch = ChunkBatch.concat(pending).dedupe_last()
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    vectors: List[np.ndarray] = []
+    if index is not None and index.count:
+        replaced = set(batch.ids.tolist())
+        kept = np.asarray([row for row in range(index.count) if str(index.ids[row]) not in replaced], dtype=np.int64)
+        for row in kept:
+            text, metadata = index.document(int(row))
+            ids.append(str(index.ids[row]))
+            texts.append(text)
+            metadatas.append(metadata)
+        if len(kept):
+            vectors.append(np.asarray(index.vectors[kept]))
+    if len(batch):
+        ids.extend(batch.ids.tolist())
+        texts.extend(batch.texts.tolist())
+        metadatas.extend(batch.metadatas())
+        vectors.append(batch.embeddings)
+    return ids, texts, metadatas, np.vstack(vectors)
+
+
+class CompactIndex:
+    """
+    Загруженный read-only индекс: коды в памяти, float32-векторы и тексты — через mmap.
+    mmap_codes=True отображает и коды: страницы делят все процессы, открывшие тот же каталог.
+    """
+
+    def __init__(self, directory: str | Path, mmap_codes: bool = False) -> None:
+        self.directory = Path(directory)
+        self.manifest: Dict[str, Any] = json.loads((self.directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        self.count = int(self.manifest["count"])
+        self.quantizer: Quantizer = load_quantizer(self.directory / QUANTIZER_FILE)
+        self.codes = np.load(self.directory / CODES_FILE, mmap_mode="r" if mmap_codes else None)
+        self.vectors = np.load(self.directory / VECTORS_FILE, mmap_mode="r")
+        self.ids = np.load(self.directory / IDS_FILE, mmap_mode="r")
+        self.offsets = np.load(self.directory / DOC_OFFSETS_FILE, mmap_mode="r")
+        raw_postings = json.loads((self.directory / POSTINGS_FILE).read_text(encoding="utf-8"))
+        self.postings: Dict[str, Dict[Any, np.ndarray]] = {
+            key: {value: np.asarray(rows, dtype=np.int64) for value, rows in pairs}
+            for key, pairs in raw_postings.items()
+        }
+        self._docs_file = (self.directory / DOCS_FILE).open("rb")
+        self._docs = (
+            mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+        )
+        # Счётчик начатых чтений: заменённый индекс закрывается, когда их не останется (retire)
+        self._readers = 0
+        self._retired = False
+        self._lease_lock = threading.Lock()
+
+    def close(self) -> None:
+        if isinstance(self._docs, mmap.mmap) and not self._docs.closed:
+            self._docs.close()
+        self._docs_file.close()
+        # np.memmap держит свой дескриптор до сборки массива: отпускаем ссылки (выборки из них — копии)
+        self.codes = self.vectors = self.ids = self.offsets = None
+
+    def acquire(self) -> None:
+        with self._lease_lock:
+            self._readers += 1
+
+    def release(self) -> None:
+        with self._lease_lock:
+            self._readers -= 1
+            close_now = self._retired and self._readers == 0
+        if close_now:
+            self.close()
+
+    def retire(self) -> None:
+        """Индекс заменён новым: закрыть сразу или после последнего начатого чтения."""
+        with self._lease_lock:
+            self._retired = True
+            close_now = self._readers == 0
+        if close_now:
+            self.close()
+
+    def candidate_rows(self, where: WhereFilter | None) -> np.ndarray | None:
+        """Строки, удовлетворяющие фильтру, через инвертированный индекс; None — все строки."""
+        conditions = normalize_where(where)
+        if not conditions:
+            return None
+        rows: np.ndarray | None = None
+        for key, values in conditions.items():
+            if key not in self.postings:
+                raise ValueError(f"Field {key!r} is not indexed for filtering (indexed: {list(FILTER_KEYS)})")
+            parts = [self.postings[key].get(value) for value in values]
+            matched = np.unique(np.concatenate([p for p in parts if p is not None] or [np.empty(0, np.int64)]))
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        return rows
+
+    def search_rows(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        rescore_factor: int,
+        rows: np.ndarray | None = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Приближённый скоринг по кодам -> top_k * rescore_factor кандидатов ->
+        точный пересчёт по float32. Возвращает (строки, косинусное сходство) по убыванию.
+        """
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if rows is None:
+            rows = np.arange(self.count)
+        if len(rows) == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        shortlist_size = top_k * max(1, rescore_factor)
+        if len(rows) > shortlist_size:
+            codes = self.codes if len(rows) == self.count else self.codes[rows]
+            approx = self.quantizer.approximate_scores(query, codes)
+            shortlist = rows[np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]]
+        else:
+            shortlist = rows
+
+        shortlist = np.sort(shortlist)  # последовательное чтение memmap
+        exact = np.asarray(self.vectors[shortlist]) @ query
+        order = np.argsort(-exact)[:top_k]
+        return shortlist[order], exact[order]
+
+    def iter_chunks(self, batch_size: int) -> Iterator[List[DocumentChunk]]:
+        for start in range(0, self.count, batch_size):
+            yield [self.chunk(row, with_embedding=True) for row in range(start, min(start + batch_size, self.count))]
+
+    def document(self, row: int) -> Tuple[str, Dict[str, Any]]:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        payload = json.loads(self._docs[start:end])
+        return payload["text"], payload["metadata"] or {}
+
+    def batch(self, rows: np.ndarray, with_embeddings: bool = False) -> ChunkBatch:
+        """Строки индекса как ChunkBatch; эмбеддинги — одна выборка из mmap-матрицы."""
+        documents = [self.document(int(row)) for row in rows]
+        return ChunkBatch.from_records(
+            [str(self.ids[row]) for row in rows],
+            [text for text, _ in documents],
+            [metadata for _, metadata in documents],
+            np.asarray(self.vectors[rows]) if with_embeddings and len(rows) else None,
+        )
+
+    def chunk(self, row: int, with_embedding: bool = False) -> DocumentChunk:
+        text, metadata = self.document(row)
+        embedding = self.vectors[row].tolist() if with_embedding else []
+        return DocumentChunk(id=str(self.ids[row]), text=text, metadata=metadata, embedding=embedding)
+
+
+class CompactIndexHandle:
+    """
+    CompactIndex каталога, открытый один раз на процесс (хранилище создаётся на каждый запрос).
+    Перечитывается, когда меняется mtime манифеста (его reindex пишет последним); заменённый
+    индекс закрывается после завершения начатых на нём поисков.
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self._index: CompactIndex | None = None
+        self._mtime: int | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self) -> Iterator[CompactIndex | None]:
+        """Актуальный индекс на время чтения: параллельная замена не закроет его под читающим."""
+        with self._lock:
+            self._refresh_locked()
+            index = self._index
+            if index is not None:
+                index.acquire()
+        try:
+            yield index
+        finally:
+            if index is not None:
+                index.release()
+
+    def current(self) -> CompactIndex | None:
+        """Для метаданных (manifest, count); строки читаются только через open()."""
+        with self._lock:
+            self._refresh_locked()
+            return self._index
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self) -> None:
+        try:
+            mtime: int | None = os.stat(self.directory / MANIFEST_FILE).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        try:
+            index = CompactIndex(self.directory) if mtime is not None else None
+        except FileNotFoundError:
+            logger.warning("Compact index disappeared before it was opened", extra={"directory": str(self.directory)})
+            return
+        previous, self._index, self._mtime = self._index, index, mtime
+        if previous is not None:
+            previous.retire()
+        if index is not None:
+            logger.info("Compact index loaded", extra={"directory": str(self.directory), "count": index.count})
+
+
+_HANDLES: Dict[str, CompactIndexHandle] = {}
+_HANDLES_LOCK = threading.Lock()
+
+
+def get_compact_index_handle(directory: str | Path) -> CompactIndexHandle:
+    key = os.path.abspath(directory)
+    with _HANDLES_LOCK:
+        handle = _HANDLES.get(key)
+        if handle is None:
+            handle = _HANDLES[key] = CompactIndexHandle(key)
+        return handle
+
+
+class CompactVectorStore(VectorStore):
+    """
+    VectorStore поверх CompactIndex. upsert_documents копит документы в памяти,
+    finalize() пересобирает индекс на диске (вызывается в конце reindex).
+    """
+
+    metric = "cosine"
+    durable_upserts = False
+
+    def __init__(
+        self,
+        persist_directory: str | None = None,
+        quantization: str = settings.compact_quantization,
+        pq_subvectors: int = settings.compact_pq_subvectors,
+        rescore_factor: int = settings.compact_rescore_factor,
+    ) -> None:
+        self.persist_directory = persist_directory or COMPACT_INDEX_DIR
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.rescore_factor = rescore_factor
+        self._pending: List[ChunkBatch] = []
+        self.handle = get_compact_index_handle(self.persist_directory)
+        index = self.handle.current()
+        self._index_info: Dict[str, Any] = dict(index.manifest.get("index_info") or {}) if index is not None else {}
+
+    @property
+    def index(self) -> CompactIndex | None:
+        return self.handle.current()
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._index_info = {}
+        shutil.rmtree(self.persist_directory, ignore_errors=True)
+        self.handle.refresh()
+        logger.info("Compact index cleared", extra={"persist_directory": self.persist_directory})
+
+    def upsert_documents(self, documents: List[DocumentChunk] | ChunkBatch) -> None:
+        if len(documents):
+            self._pending.append(as_batch(documents))
+
+    def count_documents(self) -> int:
+        index = self.index
+        return index.count if index is not None else 0
+
+    def get_index_info(self) -> Dict[str, Any]:
+        return dict(self._index_info)
+
+    def set_index_info(self, info: Dict[str, Any]) -> None:
+        # Попадает в manifest при следующем finalize()
+        self._index_info.update(info)
+
+    def finalize(self) -> None:
+        if not self._pending:
+            return
+
+        with self.handle.open() as base:
+            ids, texts, metadatas, vectors = merge_pending(base, self._pending)
+        manifest = write_compact_index(
+            self.persist_directory,
+            ids,
+            vectors,
+            texts,
+            metadatas,
+            quantization=self.quantization,
+            pq_subvectors=self.pq_subvectors,
+            index_info=self._index_info,
+        )
+        self._pending.clear()
+        self.handle.refresh()
+        logger.info("Compact index written", extra={"persist_directory": self.persist_directory, **manifest})
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[DocumentChunk]]:
+        # Только записанное на диск: незафиксированные upsert появятся после finalize()
+        with self.handle.open() as index:
+            if index is not None:
+                yield from index.iter_chunks(batch_size)
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int,
+        where: WhereFilter | None = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        if top_k <= 0:
+            return []
+        with self.handle.open() as index:
+            if index is None:
+                return []
+            rows, similarities = index.search_rows(
+                np.asarray(query_embedding, dtype=np.float32),
+                top_k=top_k,
+                rescore_factor=self.rescore_factor,
+                rows=index.candidate_rows(where),
+            )
+            # Возвращаем косинусную дистанцию, как Chroma с hnsw:space=cosine
+            batch = index.batch(rows, with_embeddings=with_embeddings)
+        return [(row, float(1.0 - sim)) for row, sim in zip(batch, similarities)]
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name("tmp_" + path.name)
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _write_json(path: Path, payload: Any) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+__all__ = [
+    "CompactVectorStore",
+    "CompactIndex",
+    "CompactIndexHandle",
+    "get_compact_index_handle",
+    "write_compact_index",
+    "merge_pending",
+    "normalize_rows",
+    "COMPACT_INDEX_DIR",
+    "FILTER_KEYS",
+]
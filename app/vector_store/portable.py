@@ -0,0 +1,231 @@
+"""
+Portable index snapshots: stream any VectorStore into a columnar archive and bulk-load it back without re-embedding.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator
+
+import numpy as np
+
+from app.vector_store.base import VectorStore
+from app.vector_store.batch import ChunkBatch
+
+SNAPSHOT_FORMAT = "lotr-rag-index"
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_MEMBER = "manifest.json"
+IDS_MEMBER = "ids.jsonl"
+TEXTS_MEMBER = "texts.jsonl"
+METADATAS_MEMBER = "metadatas.jsonl"
+VECTORS_MEMBER = "vectors.f32"  # float32, row-major, little-endian; форма — в manifest
+STATS_MEMBER = "index_stats.json"
+COLUMN_MEMBERS = (IDS_MEMBER, TEXTS_MEMBER, METADATAS_MEMBER, VECTORS_MEMBER)
+HASH_BLOCK_BYTES = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotFormatError(ValueError):
+    """Файл не является снапшотом индекса или повреждён (не сходится контрольная сумма)."""
+
+
+def export_snapshot(
+    store: VectorStore,
+    path: str | Path,
+    batch_size: int = 1000,
+    index_stats: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """
+    Выгрузить store в архив: колонки id/текст/метаданные (jsonl) и float32-векторы
+    пишутся потоково во временные файлы, затем упаковываются с sha256 каждой колонки.
+    """
+    path = Path(path)
+    started = time.perf_counter()
+    count, dim = 0, 0
+    with tempfile.TemporaryDirectory(prefix="index-export-") as tmp:
+        tmp_dir = Path(tmp)
+        handles = {name: (tmp_dir / name).open("wb") for name in COLUMN_MEMBERS}
+        try:
+            for batch in store.iter_documents(batch_size):
+                if not batch:
+                    continue
+                vectors = np.asarray([doc.embedding for doc in batch], dtype="<f4")
+                if dim and vectors.shape[1] != dim:
+                    raise ValueError(f"Mixed embedding dimensions in store: {dim} and {vectors.shape[1]}")
+                dim = vectors.shape[1]
+                handles[VECTORS_MEMBER].write(vectors.tobytes())
+                for doc in batch:
+                    handles[IDS_MEMBER].write(_json_line(doc.id))
+                    handles[TEXTS_MEMBER].write(_json_line(doc.text))
+                    handles[METADATAS_MEMBER].write(_json_line(doc.metadata or {}))
+                count += len(batch)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        members = {name: _file_digest(tmp_dir / name) for name in COLUMN_MEMBERS}
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "count": count,
+            "dim": dim,
+            "dtype": "float32",
+            "source_backend": type(store).__name__,
+            "source_metric": getattr(store, "metric", None),
+            "index_info": store.get_index_info(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "members": members,
+            "checksum": _combined_checksum(members),
+        }
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with zipfile.ZipFile(tmp_path, "w", allowZip64=True) as archive:
+            for name in COLUMN_MEMBERS:
+                # Векторы почти не сжимаются — храним как есть, тексты сжимаем
+                compression = zipfile.ZIP_STORED if name == VECTORS_MEMBER else zipfile.ZIP_DEFLATED
+                archive.write(tmp_dir / name, arcname=name, compress_type=compression)
+            if index_stats is not None:
+                archive.writestr(STATS_MEMBER, json.dumps(index_stats, ensure_ascii=False), zipfile.ZIP_DEFLATED)
+            archive.writestr(MANIFEST_MEMBER, json.dumps(manifest, ensure_ascii=False, indent=2))
+        tmp_path.replace(path)
+
+    logger.info(
+        "Index snapshot exported",
+        extra={"path": str(path), "count": count, "dim": dim, "elapsed_sec": round(time.perf_counter() - started, 2)},
+    )
+    return manifest
+
+
+def read_manifest(path: str | Path) -> Dict[str, Any]:
+    try:
+        with zipfile.ZipFile(path) as archive:
+            manifest = json.loads(archive.read(MANIFEST_MEMBER))
+    except (zipfile.BadZipFile, KeyError) as exc:
+        raise SnapshotFormatError(f"{path} is not an index snapshot: {exc}") from exc
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotFormatError(
+            f"Unsupported snapshot format {manifest.get('format')!r} v{manifest.get('format_version')}"
+        )
+    return manifest
+
+
+def read_index_stats(path: str | Path) -> Dict[str, Any] | None:
+    with zipfile.ZipFile(path) as archive:
+        if STATS_MEMBER not in archive.namelist():
+            return None
+        return json.loads(archive.read(STATS_MEMBER))
+
+
+def verify_snapshot(path: str | Path) -> Dict[str, Any]:
+    """Пересчитать sha256 всех колонок и сверить с manifest; вернуть manifest."""
+    manifest = read_manifest(path)
+    with zipfile.ZipFile(path) as archive:
+        for name, expected in manifest["members"].items():
+            with archive.open(name) as fh:
+                actual = _stream_digest(fh)
+            if actual != expected:
+                raise SnapshotFormatError(f"Checksum mismatch for {name}: expected {expected}, got {actual}")
+    if _combined_checksum(manifest["members"]) != manifest["checksum"]:
+        raise SnapshotFormatError("Manifest checksum mismatch")
+    expected_bytes = manifest["count"] * manifest["dim"] * 4
+    if manifest["members"][VECTORS_MEMBER]["bytes"] != expected_bytes:
+        raise SnapshotFormatError(f"Vector column has wrong size, expected {expected_bytes} bytes")
+    return manifest
+
+
+def iter_snapshot(path: str | Path, batch_size: int = 5000) -> Iterator[ChunkBatch]:
+    """Читать архив пачками: колонки идут параллельно, векторы — блоками batch_size * dim."""
+    manifest = read_manifest(path)
+    dim = int(manifest["dim"])
+    row_bytes = dim * 4
+    with zipfile.ZipFile(path) as archive, archive.open(IDS_MEMBER) as ids_fh, archive.open(
+        TEXTS_MEMBER
+    ) as texts_fh, archive.open(METADATAS_MEMBER) as metas_fh, archive.open(VECTORS_MEMBER) as vectors_fh:
+        ids_lines, texts_lines, metas_lines = (io.TextIOWrapper(fh, encoding="utf-8") for fh in (ids_fh, texts_fh, metas_fh))
+        remaining = int(manifest["count"])
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            raw = vectors_fh.read(size * row_bytes)
+            if len(raw) != size * row_bytes:
+                raise SnapshotFormatError("Vector column ended early")
+            # Векторы отдаются матрицей прямо поверх прочитанного буфера, без списков float
+            yield ChunkBatch.from_records(
+                [json.loads(next(ids_lines)) for _ in range(size)],
+                [json.loads(next(texts_lines)) for _ in range(size)],
+                [json.loads(next(metas_lines)) for _ in range(size)],
+                np.frombuffer(raw, dtype="<f4").reshape(size, dim),
+            )
+            remaining -= size
+
+
+def import_snapshot(
+    path: str | Path,
+    store: VectorStore,
+    batch_size: int = 5000,
+    verify: bool = True,
+    replace: bool = True,
+) -> Dict[str, Any]:
+    """
+    Залить архив в store крупными пачками. replace=True очищает store перед загрузкой.
+    index_info (модель, размерность, версия) переносится, поэтому проверка
+    совместимости запросов работает как после обычного reindex.
+    """
+    started = time.perf_counter()
+    manifest = verify_snapshot(path) if verify else read_manifest(path)
+    if replace:
+        store.clear()
+    loaded = 0
+    for batch in iter_snapshot(path, batch_size=batch_size):
+        store.upsert_documents(batch)
+        loaded += len(batch)
+    store.set_index_info(manifest.get("index_info") or {})
+    store.finalize()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Index snapshot imported",
+        extra={"path": str(path), "count": loaded, "backend": type(store).__name__, "elapsed_sec": round(elapsed, 2)},
+    )
+    return {"count": loaded, "dim": manifest["dim"], "elapsed_sec": elapsed, "index_info": manifest.get("index_info")}
+
+
+def _json_line(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _file_digest(path: Path) -> Dict[str, Any]:
+    with path.open("rb") as fh:
+        return _stream_digest(fh)
+
+
+def _stream_digest(fh: BinaryIO) -> Dict[str, Any]:
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: fh.read(HASH_BLOCK_BYTES), b""):
+        digest.update(block)
+        size += len(block)
+    return {"sha256": digest.hexdigest(), "bytes": size}
+
+
+def _combined_checksum(members: Dict[str, Dict[str, Any]]) -> str:
+    joined = "".join(f"{name}:{members[name]['sha256']}\n" for name in sorted(members))
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+__all__ = [
+    "export_snapshot",
+    "import_snapshot",
+    "iter_snapshot",
+    "read_manifest",
+    "read_index_stats",
+    "verify_snapshot",
+    "SnapshotFormatError",
+]
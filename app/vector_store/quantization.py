@@ -0,0 +1,168 @@
+"""
+Vector quantizers for the compact index: int8 scalar quantization and product quantization.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+# Сколько строк кодов декодировать за раз при приближённом скоринге:
+# ограничивает временный float32-буфер при больших индексах.
+SCORE_BLOCK_ROWS = 65536
+PQ_CENTROIDS = 256
+PQ_TRAIN_POINTS_PER_CENTROID = 40
+PQ_KMEANS_ITERATIONS = 15
+
+
+class Quantizer(Protocol):
+    kind: str
+
+    def fit(self, vectors: np.ndarray) -> "Quantizer":
+        ...
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        ...
+
+    def approximate_scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        ...
+
+    def save(self, path: Path) -> None:
+        ...
+
+
+class ScalarQuantizer:
+    """int8-квантизация по измерениям: x ≈ low + (code + 128) * step; 1 байт на измерение."""
+
+    kind = "int8"
+
+    def __init__(self, low: np.ndarray | None = None, step: np.ndarray | None = None) -> None:
+        self.low = low
+        self.step = step
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        low = vectors.min(axis=0).astype(np.float32)
+        high = vectors.max(axis=0).astype(np.float32)
+        span = np.maximum(high - low, 1e-12)
+        self.low = low
+        self.step = (span / 255.0).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        scaled = np.rint((vectors - self.low) / self.step) - 128.0
+        return np.clip(scaled, -128, 127).astype(np.int8)
+
+    def approximate_scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # q·x ≈ q·low + (q*step)·(code + 128): скоринг прямо по int8-кодам без декодирования векторов
+        weighted = (query * self.step).astype(np.float32)
+        offset = float(query @ self.low) + 128.0 * float(weighted.sum())
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start : start + SCORE_BLOCK_ROWS]
+            scores[start : start + len(block)] = block.astype(np.float32) @ weighted
+        scores += offset
+        return scores
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, low=self.low, step=self.step)
+
+
+class ProductQuantizer:
+    """
+    Product quantization: вектор режется на m подвекторов, каждый кодируется
+    номером ближайшего из 256 центроидов (1 байт на подвектор).
+    """
+
+    kind = "pq"
+
+    def __init__(self, subvectors: int, centroids: np.ndarray | None = None, seed: int = 0) -> None:
+        self.subvectors = subvectors
+        self.centroids = centroids  # [m, ksub, dsub]
+        self.seed = seed
+
+    def fit(self, vectors: np.ndarray) -> "ProductQuantizer":
+        n, dim = vectors.shape
+        if dim % self.subvectors:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by PQ subvectors {self.subvectors}")
+        dsub = dim // self.subvectors
+        ksub = min(PQ_CENTROIDS, n)
+        rng = np.random.default_rng(self.seed)
+        train_size = min(n, ksub * PQ_TRAIN_POINTS_PER_CENTROID)
+        train = vectors[rng.choice(n, size=train_size, replace=False)].astype(np.float32)
+
+        centroids = np.empty((self.subvectors, ksub, dsub), dtype=np.float32)
+        for j in range(self.subvectors):
+            centroids[j] = _kmeans(train[:, j * dsub : (j + 1) * dsub], ksub, rng)
+        self.centroids = centroids
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        m, _, dsub = self.centroids.shape
+        codes = np.empty((vectors.shape[0], m), dtype=np.uint8)
+        for j in range(m):
+            sub = vectors[:, j * dsub : (j + 1) * dsub].astype(np.float32)
+            codes[:, j] = _nearest(sub, self.centroids[j])
+        return codes
+
+    def approximate_scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        m, _, dsub = self.centroids.shape
+        # Таблица скалярных произведений подвектора запроса с каждым центроидом: [m, ksub]
+        lut = np.einsum("mkd,md->mk", self.centroids, query.reshape(m, dsub).astype(np.float32))
+        rows = np.arange(m)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start : start + SCORE_BLOCK_ROWS]
+            scores[start : start + len(block)] = lut[rows, block].sum(axis=1)
+        return scores
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, subvectors=self.subvectors, centroids=self.centroids)
+
+
+def build_quantizer(kind: str, pq_subvectors: int) -> Quantizer:
+    kind = kind.lower()
+    if kind == ScalarQuantizer.kind:
+        return ScalarQuantizer()
+    if kind == ProductQuantizer.kind:
+        return ProductQuantizer(subvectors=pq_subvectors)
+    raise ValueError(f"Unsupported quantization: {kind}")
+
+
+def load_quantizer(path: Path) -> Quantizer:
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        if kind == ScalarQuantizer.kind:
+            return ScalarQuantizer(low=data["low"], step=data["step"])
+        if kind == ProductQuantizer.kind:
+            return ProductQuantizer(subvectors=int(data["subvectors"]), centroids=data["centroids"])
+    raise ValueError(f"Unsupported quantizer file {path}: kind={kind}")
+
+
+def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2; ||x||^2 на argmin не влияет
+    distances = (centroids * centroids).sum(axis=1) - 2.0 * (points @ centroids.T)
+    return distances.argmin(axis=1)
+
+
+def _kmeans(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(PQ_KMEANS_ITERATIONS):
+        assignment = _nearest(points, centroids)
+        counts = np.bincount(assignment, minlength=k).astype(np.float32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+__all__ = [
+    "Quantizer",
+    "ScalarQuantizer",
+    "ProductQuantizer",
+    "build_quantizer",
+    "load_quantizer",
+    "SCORE_BLOCK_ROWS",
+]
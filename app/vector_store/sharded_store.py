@@ -0,0 +1,189 @@
+"""
+Sharded VectorStore: partition chunks across N local stores, scatter queries in parallel and heap-merge the results.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.base import DocumentChunk, VectorStore, WhereFilter, normalize_where
+from app.vector_store.batch import MISSING, ChunkBatch, as_batch
+
+SHARD_BACKENDS = ("chroma", "compact")
+COMPACT_SHARDS_DIR = os.path.join(settings.vector_store_path, "compact_shards")
+
+logger = logging.getLogger(__name__)
+
+# Общий на процесс пул: хранилище создаётся на каждый запрос, потоки — нет
+_EXECUTOR = ThreadPoolExecutor(max_workers=settings.shard_search_workers, thread_name_prefix="shard-search")
+
+
+def shard_for(key: str, shard_count: int) -> int:
+    """Стабильный между процессами номер шарда (crc32, а не hash() с рандомизацией)."""
+    return zlib.crc32(str(key).encode("utf-8")) % shard_count
+
+
+def balance_books(book_sizes: Dict[str, int], shard_count: int) -> Dict[str, int]:
+    """
+    Разложить книги по шардам жадно: крупные первыми, каждая — в наименее загруженный шард.
+    Детерминировано (ничьи — по book_id и номеру шарда), поэтому resume получает ту же раскладку.
+    """
+    if shard_count > len(book_sizes):
+        raise ValueError(
+            f"SHARD_COUNT={shard_count} exceeds the number of books ({len(book_sizes)}) under SHARD_PARTITION=book_id: "
+            "some shards would stay empty; lower SHARD_COUNT or use SHARD_PARTITION=hash"
+        )
+    loads = [0] * shard_count
+    assignment: Dict[str, int] = {}
+    for book_id, size in sorted(book_sizes.items(), key=lambda item: (-item[1], item[0])):
+        shard = min(range(shard_count), key=lambda i: (loads[i], i))
+        assignment[book_id] = shard
+        loads[shard] += size
+    return assignment
+
+
+def build_shard(backend: str, index: int) -> VectorStore:
+    if backend == "chroma":
+        from app.vector_store.chroma_store import CHROMA_COLLECTION, ChromaVectorStore
+
+        return ChromaVectorStore(collection_name=f"{CHROMA_COLLECTION}_shard{index}")
+    if backend == "compact":
+        from app.vector_store.compact_store import CompactVectorStore
+
+        return CompactVectorStore(persist_directory=os.path.join(COMPACT_SHARDS_DIR, f"shard{index}"))
+    raise ValueError(f"Unsupported shard backend: {backend} (supported: {', '.join(SHARD_BACKENDS)})")
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Чанки раскладываются по шардам по хэшу id (равномерная нагрузка, по умолчанию) или по book_id
+    (вся книга в одном шарде, фильтр по книге опрашивает только её шард). Раскладка книг считается
+    в prepare() по размерам книг и хранится в метаданных индекса (shard_map). Поиск идёт во все
+    нужные шарды параллельно, каждый отдаёт свой top_k, глобальный top_k собирается
+    слиянием по дистанции: шарды одного бэкенда и метрики, поэтому дистанции сравнимы.
+    """
+
+    def __init__(self, shards: Sequence[VectorStore], partition: str = settings.shard_partition) -> None:
+        if not shards:
+            raise ValueError("ShardedVectorStore needs at least one shard")
+        metrics = {shard.metric for shard in shards}
+        if len(metrics) > 1:
+            raise ValueError(f"Shards use different metrics {sorted(metrics)}; distances are not comparable")
+        if partition not in ("book_id", "hash"):
+            raise ValueError(f"Unsupported shard partition: {partition}")
+        self.shards = list(shards)
+        self.partition = partition
+        self.metric = self.shards[0].metric
+        self.durable_upserts = all(shard.durable_upserts for shard in self.shards)
+        self.book_shards: Dict[str, int] = {}
+        if partition == "book_id":
+            self.book_shards = json.loads(self.shards[0].get_index_info().get("shard_map") or "{}")
+
+    @classmethod
+    def from_settings(cls) -> "ShardedVectorStore":
+        shards = [build_shard(settings.shard_backend, i) for i in range(settings.shard_count)]
+        return cls(shards, partition=settings.shard_partition)
+
+    def shard_index(self, doc: DocumentChunk) -> int:
+        key = (doc.metadata or {}).get("book_id") if self.partition == "book_id" else None
+        return self._shard_for_key(doc.id if key is None else key)
+
+    def _shard_for_key(self, key: str) -> int:
+        # Книги вне shard_map (индекс собран без prepare, например импорт) — по crc32, как раньше
+        shard = self.book_shards.get(key)
+        return shard if shard is not None else shard_for(key, len(self.shards))
+
+    def prepare(self, chunks: ChunkBatch) -> None:
+        if self.partition != "book_id":
+            return
+        book_ids = chunks.columns.get("book_id")
+        sizes: Dict[str, int] = {}
+        for book_id in book_ids if book_ids is not None else []:
+            if book_id is not None and book_id is not MISSING:
+                sizes[book_id] = sizes.get(book_id, 0) + 1
+        self.book_shards = balance_books(sizes, len(self.shards))
+        self.set_index_info({"shard_map": json.dumps(self.book_shards, sort_keys=True)})
+        logger.info("Planned book shards", extra={"shard_map": self.book_shards})
+
+    def clear(self) -> None:
+        self._scatter(lambda shard: shard.clear())
+        if self.book_shards:
+            # Раскладка, спланированная prepare(), переживает очистку шардов
+            self.set_index_info({"shard_map": json.dumps(self.book_shards, sort_keys=True)})
+
+    def upsert_documents(self, documents: List[DocumentChunk] | ChunkBatch) -> None:
+        if not len(documents):
+            return
+        batch = as_batch(documents)
+        keys = batch.columns.get("book_id") if self.partition == "book_id" else None
+        assignment = np.asarray(
+            [
+                self._shard_for_key(doc_id if key is None or key is MISSING else key)
+                for key, doc_id in zip(keys if keys is not None else batch.ids, batch.ids)
+            ]
+        )
+        # Каждому шарду — своё подмножество строк батча (take копирует строки матрицы, не тексты)
+        groups = [(i, batch.take(np.flatnonzero(assignment == i))) for i in np.unique(assignment)]
+        list(_EXECUTOR.map(lambda item: self.shards[int(item[0])].upsert_documents(item[1]), groups))
+
+    def finalize(self) -> None:
+        self._scatter(lambda shard: shard.finalize())
+
+    def count_documents(self) -> int:
+        return sum(shard.count_documents() for shard in self.shards)
+
+    def get_index_info(self) -> Dict[str, Any]:
+        # set_index_info пишет одно и то же во все шарды
+        return self.shards[0].get_index_info()
+
+    def set_index_info(self, info: Dict[str, Any]) -> None:
+        self._scatter(lambda shard: shard.set_index_info(info))
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[DocumentChunk]]:
+        for shard in self.shards:
+            yield from shard.iter_documents(batch_size)
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int,
+        where: WhereFilter | None = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        if top_k <= 0:
+            return []
+        targets = self._target_shards(where)
+        per_shard = list(
+            _EXECUTOR.map(
+                lambda shard: shard.search(query_embedding, top_k=top_k, where=where, with_embeddings=with_embeddings),
+                targets,
+            )
+        )
+        # Результаты шардов уже отсортированы по дистанции: k-way merge кучей, берём глобальные top_k
+        merged = heapq.merge(*per_shard, key=lambda item: item[1])
+        return list(itertools.islice(merged, top_k))
+
+    def _target_shards(self, where: WhereFilter | None) -> List[VectorStore]:
+        """При партиционировании по книге фильтр book_id сразу отсекает лишние шарды."""
+        if self.partition == "book_id":
+            book_ids = normalize_where(where).get("book_id")
+            if book_ids:
+                indexes = sorted({self._shard_for_key(book_id) for book_id in book_ids})
+                return [self.shards[i] for i in indexes]
+        return self.shards
+
+    def _scatter(self, fn) -> None:
+        list(_EXECUTOR.map(fn, self.shards))
+
+
+__all__ = ["ShardedVectorStore", "balance_books", "build_shard", "shard_for", "SHARD_BACKENDS"]
@@ -0,0 +1,265 @@
+"""
+Read-only serving from immutable, versioned compact-index snapshots shared by all worker processes.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.base import DocumentChunk, VectorStore, WhereFilter
+from app.vector_store.batch import ChunkBatch, as_batch
+from app.vector_store.compact_store import CompactIndex, merge_pending, write_compact_index
+
+SNAPSHOT_ROOT_DIR = os.path.join(settings.vector_store_path, "snapshots")
+CURRENT_FILE = "CURRENT"
+TMP_PREFIX = ".tmp-"
+# Каталог публикации старше этого не пишется: его оставил упавший publish
+STALE_STAGING_SEC = 3600.0
+
+logger = logging.getLogger(__name__)
+
+
+def read_current_version(root: str | Path) -> str | None:
+    try:
+        return (Path(root) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_snapshot(
+    root: str | Path,
+    ids: List[str],
+    vectors: np.ndarray,
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    index_info: Dict[str, Any] | None = None,
+    keep: int = settings.snapshot_keep,
+) -> str:
+    """
+    Записать новую версию во временный каталог, переименовать его в окончательный
+    и атомарно переключить CURRENT. Опубликованные каталоги больше не меняются.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    version = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid4().hex[:8]}"
+    staging = root / (TMP_PREFIX + version)
+    write_compact_index(
+        staging,
+        ids,
+        vectors,
+        texts,
+        metadatas,
+        quantization=settings.compact_quantization,
+        pq_subvectors=settings.compact_pq_subvectors,
+        index_info=index_info,
+    )
+    os.rename(staging, root / version)
+
+    pointer_tmp = root / (CURRENT_FILE + ".tmp")
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, root / CURRENT_FILE)
+    prune_snapshots(root, keep=keep)
+    return version
+
+
+def prune_snapshots(root: str | Path, keep: int) -> List[str]:
+    """
+    Удалить старые версии, оставив `keep` последних и текущую, и брошенные каталоги публикации
+    (.tmp-*, не менявшиеся дольше STALE_STAGING_SEC). Воркеры, ещё держащие mmap удалённой версии,
+    дочитывают её: данные живут до закрытия отображения.
+    """
+    root = Path(root)
+    current = read_current_version(root)
+    versions = sorted(p.name for p in root.iterdir() if p.is_dir() and not p.name.startswith(TMP_PREFIX))
+    stale = [v for v in versions[: max(0, len(versions) - keep)] if v != current]
+    now = time.time()
+    for path in root.glob(TMP_PREFIX + "*"):
+        try:
+            abandoned = path.is_dir() and now - path.stat().st_mtime > STALE_STAGING_SEC
+        except FileNotFoundError:  # параллельный publish как раз переименовал его
+            continue
+        if abandoned:
+            stale.append(path.name)
+    for version in stale:
+        shutil.rmtree(root / version, ignore_errors=True)
+    return stale
+
+
+class SnapshotReader:
+    """
+    Текущая версия снапшота, открытая в этом процессе. Раз в poll_interval_sec
+    перечитывает CURRENT и при смене версии открывает новую; поиск, уже взявший
+    ссылку на старый индекс, завершается на нём.
+    """
+
+    def __init__(self, root: str | Path, poll_interval_sec: float) -> None:
+        self.root = Path(root)
+        self.poll_interval_sec = poll_interval_sec
+        self.version: str | None = None
+        self._index: CompactIndex | None = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def current(self) -> CompactIndex | None:
+        """Для метаданных (manifest, count); строки читаются только через open()."""
+        if time.monotonic() - self._checked_at >= self.poll_interval_sec:
+            self.refresh()
+        return self._index
+
+    @contextmanager
+    def open(self) -> Iterator[CompactIndex | None]:
+        """Текущая версия на время чтения: смена версии закроет её только после этого чтения."""
+        if time.monotonic() - self._checked_at >= self.poll_interval_sec:
+            self.refresh()
+        with self._lock:
+            index = self._index
+            if index is not None:
+                index.acquire()
+        try:
+            yield index
+        finally:
+            if index is not None:
+                index.release()
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = read_current_version(self.root)
+            if version is None or version == self.version:
+                return
+            try:
+                index = CompactIndex(self.root / version, mmap_codes=True)
+            except FileNotFoundError:
+                logger.warning("Snapshot disappeared before it was opened", extra={"version": version})
+                return
+            # Старый индекс может читать параллельный поиск: retire закроет его после последнего чтения
+            previous, self._index, self.version = self._index, index, version
+            if previous is not None:
+                previous.retire()
+        logger.info("Snapshot loaded", extra={"version": version, "count": index.count})
+
+
+_READERS: Dict[str, SnapshotReader] = {}
+_READERS_LOCK = threading.Lock()
+
+
+def get_snapshot_reader(root: str | Path) -> SnapshotReader:
+    key = os.path.abspath(root)
+    with _READERS_LOCK:
+        reader = _READERS.get(key)
+        if reader is None:
+            reader = _READERS[key] = SnapshotReader(key, settings.snapshot_poll_interval_sec)
+        return reader
+
+
+class SnapshotVectorStore(VectorStore):
+    """
+    Read-only VectorStore для нескольких воркеров uvicorn: все процессы отображают
+    одни и те же файлы текущего снапшота (коды, векторы, id, тексты), поэтому память
+    на воркер не растёт с размером индекса. Открытый снапшот общий на процесс.
+
+    Запись (reindex) копит документы и в finalize() публикует новую версию;
+    clear() не трогает опубликованный снапшот — он обслуживает запросы до переключения.
+    """
+
+    metric = "cosine"
+    durable_upserts = False
+
+    def __init__(self, root_directory: str | None = None, rescore_factor: int = settings.compact_rescore_factor) -> None:
+        self.root_directory = root_directory or SNAPSHOT_ROOT_DIR
+        self.rescore_factor = rescore_factor
+        self.reader = get_snapshot_reader(self.root_directory)
+        self._pending: List[ChunkBatch] = []
+        self._index_info: Dict[str, Any] = {}
+        self._replace = False
+
+    @property
+    def version(self) -> str | None:
+        self.reader.current()
+        return self.reader.version
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._index_info = {}
+        self._replace = True
+        logger.info("Snapshot rebuild started", extra={"root_directory": self.root_directory})
+
+    def upsert_documents(self, documents: List[DocumentChunk] | ChunkBatch) -> None:
+        if len(documents):
+            self._pending.append(as_batch(documents))
+
+    def count_documents(self) -> int:
+        index = None if self._replace else self.reader.current()
+        return index.count if index is not None else 0
+
+    def get_index_info(self) -> Dict[str, Any]:
+        index = self.reader.current()
+        info = dict(index.manifest.get("index_info") or {}) if index is not None and not self._replace else {}
+        info.update(self._index_info)
+        return info
+
+    def set_index_info(self, info: Dict[str, Any]) -> None:
+        self._index_info.update(info)
+
+    def finalize(self) -> None:
+        if not self._pending:
+            return
+
+        with self.reader.open() as current:
+            base = None if self._replace else current
+            ids, texts, metadatas, vectors = merge_pending(base, self._pending)
+            index_info = {} if base is None else dict(base.manifest.get("index_info") or {})
+        index_info.update(self._index_info)
+        version = publish_snapshot(self.root_directory, ids, vectors, texts, metadatas, index_info=index_info)
+        self._pending.clear()
+        self._replace = False
+        self.reader.refresh()
+        logger.info("Snapshot published", extra={"version": version, "count": len(ids)})
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[DocumentChunk]]:
+        with self.reader.open() as index:
+            if index is not None:
+                yield from index.iter_chunks(batch_size)
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int,
+        where: WhereFilter | None = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        if top_k <= 0:
+            return []
+        with self.reader.open() as index:  # одна версия на весь поиск, даже если её сменят параллельно
+            if index is None:
+                return []
+            rows, similarities = index.search_rows(
+                np.asarray(query_embedding, dtype=np.float32),
+                top_k=top_k,
+                rescore_factor=self.rescore_factor,
+                rows=index.candidate_rows(where),
+            )
+            batch = index.batch(rows, with_embeddings=with_embeddings)
+        return [(row, float(1.0 - sim)) for row, sim in zip(batch, similarities)]
+
+
+__all__ = [
+    "SnapshotVectorStore",
+    "SnapshotReader",
+    "get_snapshot_reader",
+    "publish_snapshot",
+    "prune_snapshots",
+    "read_current_version",
+    "SNAPSHOT_ROOT_DIR",
+]
@@ -0,0 +1,144 @@
+"""
+Startup warm-up: import heavy backends, open the vector index and run a dummy query before reporting ready.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from app.config import settings
+
+# Модули, которые app.main намеренно не импортирует при старте (openai, chromadb через фабрику)
+WARMUP_MODULES = ("app.embeddings.client", "app.llm.client")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupState:
+    """Состояние прогрева процесса; /ready отвечает 200 только в статусе ready."""
+
+    status: str = "pending"  # pending | running | ready | failed
+    steps: Dict[str, float] = field(default_factory=dict)
+    elapsed_sec: float | None = None
+    error: str | None = None
+    attempts: int = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "elapsed_sec": self.elapsed_sec,
+            "steps": {name: round(sec, 3) for name, sec in self.steps.items()},
+            "error": self.error,
+            "attempts": self.attempts,
+        }
+
+
+STATE = WarmupState()
+_LOCK = threading.Lock()
+
+
+def run_warmup(state: WarmupState = STATE) -> WarmupState:
+    """
+    Выполнить прогрев синхронно: импорт бэкендов, загрузка токенизатора,
+    открытие индекса и пробный поиск. Эмбеддинги и LLM не вызываются.
+    """
+    with _LOCK:
+        if state.status in ("running", "ready"):
+            return state
+        state.status = "running"
+        state.error = None
+        state.attempts += 1
+    started = time.perf_counter()
+    try:
+        _step(state, "imports", _import_backends)
+        _step(state, "tokenizer", _load_tokenizer)
+        store = _step(state, "vector_store", _open_vector_store)
+        _step(state, "dummy_query", lambda: _dummy_query(store))
+    except Exception as exc:  # noqa: BLE001 - причина отдаётся в /ready
+        state.status = "failed"
+        state.error = f"{type(exc).__name__}: {exc}"
+        logger.exception("Warm-up failed")
+    else:
+        state.status = "ready"
+    state.elapsed_sec = round(time.perf_counter() - started, 3)
+    logger.info("Warm-up finished", extra=state.as_dict())
+    return state
+
+
+def run_warmup_until_ready(
+    state: WarmupState = STATE,
+    base_sec: float = settings.warmup_retry_base_sec,
+    max_sec: float = settings.warmup_retry_max_sec,
+) -> WarmupState:
+    """
+    Повторять прогрев с экспоненциальной паузой, пока он не пройдёт: хранилище может быть
+    недоступно в момент старта, а без повтора /ready отвечал бы 503 до рестарта процесса.
+    """
+    while run_warmup(state).status == "failed":
+        delay = min(max_sec, base_sec * 2 ** (state.attempts - 1))
+        logger.warning("Warm-up will be retried", extra={"attempts": state.attempts, "delay_sec": delay})
+        time.sleep(delay)
+    return state
+
+
+def start_warmup(state: WarmupState = STATE) -> threading.Thread | None:
+    """Запустить прогрев в фоне, чтобы /health отвечал сразу; при WARMUP_ENABLED=false процесс готов сразу."""
+    if not settings.warmup_enabled:
+        state.status = "ready"
+        state.elapsed_sec = 0.0
+        return None
+    thread = threading.Thread(target=run_warmup_until_ready, args=(state,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _step(state: WarmupState, name: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    state.steps[name] = time.perf_counter() - started
+    return result
+
+
+def _import_backends() -> List[str]:
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+    return list(WARMUP_MODULES)
+
+
+def _load_tokenizer() -> None:
+    from app.embeddings.tokens import count_tokens
+
+    try:
+        count_tokens("warm-up", settings.embedding_model_name)
+    except Exception as exc:  # noqa: BLE001 - без энкодера tiktoken запрос всё равно обслужится позже
+        logger.warning("Tokenizer warm-up failed", extra={"error": type(exc).__name__})
+
+
+def _open_vector_store():
+    from app.vector_store import get_vector_store
+
+    return get_vector_store()
+
+
+def _dummy_query(store) -> int:
+    """Поиск единичным вектором нужной размерности: подгружает HNSW/mmap-страницы и соединение SQLite."""
+    dimensions = store.get_index_info().get("embedding_dimensions") or settings.embedding_dimensions
+    if not dimensions:
+        logger.info("Warm-up query skipped: index dimensions unknown (empty index?)")
+        return 0
+    query = [0.0] * int(dimensions)
+    query[0] = 1.0
+    return len(store.search(query, top_k=settings.max_context_chunks))
+
+
+__all__ = ["WarmupState", "STATE", "run_warmup", "run_warmup_until_ready", "start_warmup", "WARMUP_MODULES"]
@@ -0,0 +1,160 @@
+"""
+Бенчмарк компактного индекса: память на миллион векторов и recall@k против точного поиска.
+
+Примеры:
+    python -m scripts.bench_compact_index --synthetic 50000 --dim 1536
+    python -m scripts.bench_compact_index --source chroma --queries 200 --json bench_compact.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.vector_store.compact_store import CompactIndex, normalize_rows, write_compact_index
+
+MILLION = 1_000_000
+MIB = 1024 * 1024
+# Оценка для List[float] в DocumentChunk.embedding: 8 байт указатель + 24 байта объект float
+PY_FLOAT_LIST_BYTES_PER_DIM = 32
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк int8/PQ компактного индекса против точного поиска.")
+    parser.add_argument("--source", choices=["synthetic", "chroma"], default="synthetic", help="Откуда брать векторы")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Число синтетических векторов")
+    parser.add_argument("--dim", type=int, default=1536, help="Размерность синтетических векторов")
+    parser.add_argument("--queries", type=int, default=200, help="Сколько запросов прогнать")
+    parser.add_argument("--top-k", type=int, default=10, help="k для recall@k")
+    parser.add_argument("--rescore-factors", default="1,4,10", help="Размеры шортлиста: top_k * factor")
+    parser.add_argument("--pq-subvectors", type=int, default=64, help="Число подвекторов для PQ")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def load_vectors(args: argparse.Namespace) -> np.ndarray:
+    if args.source == "chroma":
+        from app.vector_store.chroma_store import ChromaVectorStore
+
+        collection = ChromaVectorStore().collection
+        total = collection.count()
+        parts: List[np.ndarray] = []
+        for offset in range(0, total, 1000):
+            result = collection.get(include=["embeddings"], limit=1000, offset=offset)
+            parts.append(np.asarray(result["embeddings"], dtype=np.float32))
+        return np.vstack(parts)
+
+    # Синтетика с кластерной структурой, похожей на эмбеддинги текстов
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(1, args.synthetic // 200), args.dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=args.synthetic)
+    return centers[labels] + 0.6 * rng.normal(size=(args.synthetic, args.dim)).astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    picked = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    noise = rng.normal(size=picked.shape).astype(np.float32) * picked.std()
+    return normalize_rows(picked + 0.5 * noise)
+
+
+def run_config(index: CompactIndex, queries: np.ndarray, truth: np.ndarray, top_k: int, factor: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        rows, _ = index.search_rows(query, top_k=top_k, rescore_factor=factor)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(rows.tolist()) & set(expected.tolist()))
+    return {
+        "rescore_factor": factor,
+        f"recall@{top_k}": round(hits / (len(queries) * top_k), 4),
+        "latency_ms_mean": round(float(np.mean(latencies)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    vectors = normalize_rows(load_vectors(args))
+    count, dim = vectors.shape
+    queries = make_queries(vectors, args.queries)
+    factors = [int(x) for x in args.rescore_factors.split(",") if x]
+
+    # Точный baseline: полный перебор по float32, по одному запросу (как в search)
+    truth_rows: List[np.ndarray] = []
+    started = time.perf_counter()
+    for query in queries:
+        scores = vectors @ query
+        top = np.argpartition(-scores, args.top_k - 1)[: args.top_k]
+        truth_rows.append(top[np.argsort(-scores[top])])
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    truth = np.vstack(truth_rows)
+
+    report: Dict[str, Any] = {
+        "vectors": count,
+        "dim": dim,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "baseline": {
+            "float32_mib_per_million": round(dim * 4 * MILLION / MIB, 1),
+            "python_list_mib_per_million": round(dim * PY_FLOAT_LIST_BYTES_PER_DIM * MILLION / MIB, 1),
+            "exact_latency_ms_per_query": round(exact_ms, 3),
+        },
+        "configs": [],
+    }
+
+    ids = [f"v{i}" for i in range(count)]
+    empty_meta: List[Dict[str, Any]] = [{} for _ in range(count)]
+    for quantization in ("int8", "pq"):
+        with tempfile.TemporaryDirectory() as tmp:
+            started = time.perf_counter()
+            manifest = write_compact_index(
+                tmp, ids, vectors, [""] * count, empty_meta,
+                quantization=quantization, pq_subvectors=args.pq_subvectors,
+            )
+            build_sec = time.perf_counter() - started
+            index = CompactIndex(tmp)
+            code_bytes = manifest["code_bytes_per_vector"]
+            entry: Dict[str, Any] = {
+                "quantization": quantization,
+                "build_sec": round(build_sec, 2),
+                "code_bytes_per_vector": code_bytes,
+                # Резидентная память — только коды; float32 читаются с диска через mmap при rescoring
+                "resident_mib_per_million": round(code_bytes * MILLION / MIB, 1),
+                "on_disk_mib_per_million": round((code_bytes + dim * 4) * MILLION / MIB, 1),
+                "results": [run_config(index, queries, truth, args.top_k, f) for f in factors],
+            }
+            index.close()
+            report["configs"].append(entry)
+
+    print(f"Векторов: {count}, dim={dim}, запросов: {len(queries)}")
+    base = report["baseline"]
+    print(
+        f"Baseline float32: {base['float32_mib_per_million']} MiB/1M, "
+        f"List[float]: {base['python_list_mib_per_million']} MiB/1M, "
+        f"точный поиск {base['exact_latency_ms_per_query']} ms/запрос"
+    )
+    for entry in report["configs"]:
+        print(
+            f"\n[{entry['quantization']}] {entry['code_bytes_per_vector']} B/вектор, "
+            f"в памяти {entry['resident_mib_per_million']} MiB/1M, на диске {entry['on_disk_mib_per_million']} MiB/1M"
+        )
+        for res in entry["results"]:
+            print(
+                f"  rescore x{res['rescore_factor']}: recall@{args.top_k}={res[f'recall@{args.top_k}']}, "
+                f"mean={res['latency_ms_mean']} ms, p95={res['latency_ms_p95']} ms"
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Сравнение размерностей эмбеддингов (256/512/1536) на корпусе LOTR:
+размер индекса на диске, латентность поиска и hit rate относительно полной размерности.
+
+По умолчанию корпус эмбеддится один раз в полной размерности, а укороченные векторы
+получаются обрезкой и нормировкой (для text-embedding-3-* это эквивалент параметра
+`dimensions`). `--api-per-dimension` запрашивает каждую размерность у API отдельно.
+
+Пример:
+    python -m scripts.bench_embedding_dimensions --dims 256,512,1536 --cache data/bench_embeddings.npz
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.embeddings.client import EmbeddingsClient
+from app.indexing.pipeline import build_corpus_chunks
+from app.vector_store.base import DocumentChunk
+from app.vector_store.chroma_store import ChromaVectorStore
+
+DEFAULT_QUESTIONS = [
+    "Кто такой Фродо Бэггинс?",
+    "Что такое Кольцо Всевластья?",
+    "Кто такой Горлум и откуда он взялся?",
+    "Что случилось с Гэндальфом в Мории?",
+    "Кто такой Арагорн?",
+    "Что произошло у Амон Хен?",
+    "Как погиб Боромир?",
+    "Кто такая Шелоб?",
+    "Что случилось при Хельмовой Пади?",
+    "Кто такой Саруман и где он жил?",
+    "Как энты напали на Изенгард?",
+    "Что произошло на Пеленнорских полях?",
+    "Кто убил короля-чародея Ангмара?",
+    "Как было уничтожено Кольцо?",
+    "Что такое Палантир?",
+    "Кто такой Том Бомбадил?",
+    "Что произошло в Бри в трактире «Гарцующий пони»?",
+    "Кто такая Галадриэль?",
+    "Что случилось с Широм после возвращения хоббитов?",
+    "Куда уплыли Фродо и Бильбо в конце?",
+]
+UPSERT_BATCH = 500
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк размерностей эмбеддингов на корпусе LOTR.")
+    parser.add_argument("--dims", default="256,512,1536", help="Размерности через запятую")
+    parser.add_argument("--top-k", type=int, default=10, help="k для поиска и hit rate")
+    parser.add_argument("--questions-file", default=None, help="Файл с вопросами (по одному в строке)")
+    parser.add_argument("--cache", default=None, help="npz-кэш эмбеддингов корпуса и вопросов полной размерности")
+    parser.add_argument("--api-per-dimension", action="store_true", help="Запрашивать каждую размерность у API")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    cut = vectors[:, :dim]
+    return cut / np.linalg.norm(cut, axis=1, keepdims=True)
+
+
+def embed(client: EmbeddingsClient, texts: List[str]) -> np.ndarray:
+    return np.asarray(client.embed_texts(texts), dtype=np.float32)
+
+
+def load_full_embeddings(args: argparse.Namespace, texts: List[str], questions: List[str]) -> tuple[np.ndarray, np.ndarray]:
+    if args.cache and Path(args.cache).exists():
+        cached = np.load(args.cache)
+        if len(cached["corpus"]) == len(texts) and len(cached["questions"]) == len(questions):
+            return cached["corpus"], cached["questions"]
+    client = EmbeddingsClient(dimensions=None)
+    corpus, queries = embed(client, texts), embed(client, questions)
+    if args.cache:
+        np.savez(args.cache, corpus=corpus, questions=queries)
+    return corpus, queries
+
+
+def dir_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def bench_dimension(
+    dim: int,
+    chunks: List[DocumentChunk],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    top_k: int,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(persist_directory=tmp, collection_name=f"bench_dim_{dim}")
+        started = time.perf_counter()
+        for i in range(0, len(chunks), UPSERT_BATCH):
+            batch = [
+                DocumentChunk(id=c.id, text=c.text, metadata=c.metadata, embedding=vec.tolist())
+                for c, vec in zip(chunks[i : i + UPSERT_BATCH], corpus[i : i + UPSERT_BATCH])
+            ]
+            store.upsert_documents(batch)
+        build_sec = time.perf_counter() - started
+
+        latencies: List[float] = []
+        results: List[List[str]] = []
+        for query in queries:
+            started = time.perf_counter()
+            hits = store.search(query.tolist(), top_k=top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            results.append([doc.id for doc, _ in hits])
+        size = dir_size(tmp)
+
+    return {
+        "dim": dim,
+        "index_bytes_on_disk": size,
+        "vector_bytes_float32": int(corpus.shape[0] * dim * 4),
+        "build_sec": round(build_sec, 2),
+        "latency_ms_mean": round(float(np.mean(latencies)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "_results": results,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    dims = sorted(int(x) for x in args.dims.split(",") if x)
+    questions = DEFAULT_QUESTIONS
+    if args.questions_file:
+        questions = [line.strip() for line in Path(args.questions_file).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    chunks = build_corpus_chunks()
+    texts = [c.text for c in chunks]
+    full_corpus, full_queries = load_full_embeddings(args, texts, questions)
+
+    rows: List[Dict[str, Any]] = []
+    for dim in dims:
+        if args.api_per_dimension and dim != full_corpus.shape[1]:
+            client = EmbeddingsClient(dimensions=dim)
+            corpus, queries = embed(client, texts), embed(client, questions)
+        else:
+            corpus, queries = truncate(full_corpus, dim), truncate(full_queries, dim)
+        rows.append(bench_dimension(dim, chunks, corpus, queries, args.top_k))
+
+    # Hit rate: доля top-k полной (максимальной) размерности, найденная на укороченной
+    reference = rows[-1]["_results"]
+    for row in rows:
+        overlap = [len(set(got) & set(ref)) / max(1, len(ref)) for got, ref in zip(row.pop("_results"), reference)]
+        row[f"hit_rate@{args.top_k}"] = round(float(np.mean(overlap)), 4)
+
+    print(f"Чанков: {len(chunks)}, вопросов: {len(questions)}, k={args.top_k}, эталон — dim={dims[-1]}")
+    print(f"{'dim':>6} {'index_MiB':>10} {'vectors_MiB':>12} {'mean_ms':>8} {'p95_ms':>8} {'hit_rate':>9}")
+    for row in rows:
+        print(
+            f"{row['dim']:>6} {row['index_bytes_on_disk'] / 2**20:>10.1f} {row['vector_bytes_float32'] / 2**20:>12.1f} "
+            f"{row['latency_ms_mean']:>8} {row['latency_ms_p95']:>8} {row[f'hit_rate@{args.top_k}']:>9}"
+        )
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump({"top_k": args.top_k, "chunks": len(chunks), "results": rows}, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
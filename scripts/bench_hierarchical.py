@@ -0,0 +1,152 @@
+"""
+Иерархический поиск (главы -> чанки) против плоского: recall@k и латентность.
+
+Запросы — векторы чанков индекса с шумом (офлайн, без вызовов API); эталон —
+точный косинусный top-k по всем векторам. --synthetic строит временный
+compact-индекс из кластеров-«глав», чтобы посмотреть на масштабирование.
+
+Пример:
+    python -m scripts.bench_hierarchical --top-chapters 2,4,8,16 --queries 200
+    python -m scripts.bench_hierarchical --synthetic 200000 --chapters 2000 --dim 256
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.indexing.chapters import ChapterIndex, build_chapter_index, chapter_key
+from app.rag.hierarchy import get_chapter_index
+from app.vector_store import get_vector_store
+from app.vector_store.base import DocumentChunk, VectorStore
+from app.vector_store.compact_store import CompactVectorStore
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark hierarchical vs flat retrieval.")
+    parser.add_argument("--top-chapters", default="2,4,8,16", help="Сколько глав выбирать, через запятую")
+    parser.add_argument("--queries", type=int, default=200, help="Сколько запросов")
+    parser.add_argument("--noise", type=float, default=0.3, help="Доля шума, добавляемого к вектору-запросу")
+    parser.add_argument("--top-k", type=int, default=10, help="k для recall@k")
+    parser.add_argument("--synthetic", type=int, default=0, help="Синтетический индекс из N чанков (compact)")
+    parser.add_argument("--chapters", type=int, default=500, help="Число глав в синтетическом индексе")
+    parser.add_argument("--dim", type=int, default=256, help="Размерность синтетических векторов")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def load_store(store: VectorStore) -> Tuple[List[DocumentChunk], np.ndarray]:
+    chunks: List[DocumentChunk] = []
+    for batch in store.iter_documents(1000):
+        chunks.extend(batch)
+    vectors = np.asarray([c.embedding for c in chunks], dtype=np.float32)
+    return chunks, vectors
+
+
+def synthetic_store(count: int, chapters: int, dim: int, directory: str) -> CompactVectorStore:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(chapters, dim)).astype(np.float32)
+    assignment = rng.integers(0, chapters, size=count)
+    vectors = centers[assignment] + 0.8 * rng.normal(size=(count, dim)).astype(np.float32)
+    store = CompactVectorStore(persist_directory=directory)
+    store.upsert_documents(
+        [
+            DocumentChunk(
+                id=f"syn_{i}",
+                text="",
+                metadata={"book_id": "syn", "chapter_index": int(c), "chapter_key": f"syn:{int(c)}"},
+                embedding=vectors[i].tolist(),
+            )
+            for i, c in enumerate(assignment)
+        ]
+    )
+    store.finalize()
+    return store
+
+
+def exact_top_k(normalized: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = normalized @ (query / np.linalg.norm(query))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def run(
+    store: VectorStore,
+    ids: List[str],
+    queries: np.ndarray,
+    truth: List[set],
+    k: int,
+    chapter_index: ChapterIndex | None,
+    top_chapters: int | None,
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        where = None
+        if chapter_index is not None:
+            where = {"chapter_key": {"$in": chapter_index.select(query, top_chapters)}}
+        results = store.search(query.tolist(), top_k=k, where=where)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({chunk.id for chunk, _ in results} & expected) / k)
+    return {
+        "mode": "flat" if chapter_index is None else f"hierarchical/{top_chapters}",
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    tmp = None
+    if args.synthetic:
+        tmp = tempfile.TemporaryDirectory(prefix="bench-hier-")
+        store: VectorStore = synthetic_store(args.synthetic, args.chapters, args.dim, tmp.name)
+    else:
+        store = get_vector_store()
+    chunks, vectors = load_store(store)
+    if not chunks:
+        print("Индекс пуст — сначала выполните reindex.")
+        return
+    if "chapter_key" not in chunks[0].metadata:
+        print("В метаданных нет chapter_key — индекс собран до иерархического поиска, выполните reindex.")
+        return
+
+    chapter_index = None if args.synthetic else get_chapter_index()
+    if chapter_index is None:
+        chapter_index = build_chapter_index(chunks)
+    for chunk in chunks:
+        assert chunk.metadata["chapter_key"] == chapter_key(chunk.metadata)
+
+    rng = np.random.default_rng(1)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    noise = rng.normal(size=(len(picks), vectors.shape[1])).astype(np.float32)
+    queries = normalized[picks] + args.noise * noise / np.linalg.norm(noise, axis=1, keepdims=True)
+    ids = [c.id for c in chunks]
+    truth = [{ids[i] for i in exact_top_k(normalized, q, args.top_k)} for q in queries]
+
+    print(f"Чанков: {len(chunks)}, глав: {len(chapter_index)}, backend: {type(store).__name__}")
+    results = [run(store, ids, queries, truth, args.top_k, None, None)]
+    for top_chapters in (int(x) for x in args.top_chapters.split(",")):
+        results.append(run(store, ids, queries, truth, args.top_k, chapter_index, top_chapters))
+    print(f"{'mode':<20}{'recall@' + str(args.top_k):>12}{'p50, ms':>12}{'p95, ms':>12}")
+    for row in results:
+        print(f"{row['mode']:<20}{row['recall_at_k']:>12.4f}{row['latency_ms_p50']:>12.3f}{row['latency_ms_p95']:>12.3f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump({"chunks": len(chunks), "chapters": len(chapter_index), "results": results}, fh, indent=2)
+        print(f"Результаты сохранены в {args.json_path}")
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Пиковая память и аллокации reindex: старый путь (DocumentChunk со списками float,
+словарь метаданных на чанк) против колоночного ChunkBatch (матрица float32, колонки метаданных).
+
+Эмбеддинги отдаёт офлайн-заглушка API с тем же форматом ответа, что и OpenAI
+(base64 или списки float), поэтому замер не зависит от сети и квот. Каждый режим
+запускается в отдельном процессе, чтобы ru_maxrss не смешивался.
+
+Пример:
+    python -m scripts.bench_reindex_memory --dim 1536 --copies 4 --backend compact
+    python -m scripts.bench_reindex_memory --mode batch --dim 256 --json data/bench_reindex_memory.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.embeddings.client import EmbeddingsClient
+from app.indexing.pipeline import build_corpus_batch
+from app.vector_store.base import DocumentChunk, VectorStore
+from app.vector_store.batch import ChunkBatch
+
+MODES = ("lists", "batch")
+
+
+class OfflineEmbeddingsAPI:
+    """Детерминированные единичные векторы в формате ответа embeddings.create."""
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.embeddings = self
+
+    def _vector(self, text: str) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vector = rng.standard_normal(self.dim).astype("<f4")
+        return vector / np.linalg.norm(vector)
+
+    def create(self, model: str, input: List[str], dimensions: int | None = None, encoding_format: str | None = None):
+        if encoding_format == "base64":
+            data = [SimpleNamespace(embedding=base64.b64encode(self._vector(t).tobytes()).decode()) for t in input]
+        else:
+            # Без encoding_format SDK декодирует base64 в списки float — так работал старый путь
+            data = [SimpleNamespace(embedding=self._vector(t).tolist()) for t in input]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=0))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти reindex: списки vs ChunkBatch.")
+    parser.add_argument("--mode", choices=("both",) + MODES, default="both", help="Какой путь замерять")
+    parser.add_argument("--dim", type=int, default=1536, help="Размерность эмбеддингов")
+    parser.add_argument("--copies", type=int, default=1, help="Сколько раз повторить корпус")
+    parser.add_argument("--backend", choices=("compact", "chroma"), default="compact", help="Куда писать индекс")
+    parser.add_argument("--batch-size", type=int, default=64, help="Начальный размер батча эмбеддингов")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def make_store(backend: str, directory: str) -> VectorStore:
+    if backend == "chroma":
+        from app.vector_store.chroma_store import ChromaVectorStore
+
+        return ChromaVectorStore(persist_directory=directory)
+    from app.vector_store.compact_store import CompactVectorStore
+
+    return CompactVectorStore(persist_directory=directory)
+
+
+def corpus(copies: int) -> ChunkBatch:
+    base = build_corpus_batch()
+    if copies <= 1:
+        return base
+    parts = []
+    for copy in range(copies):
+        part = base[:]
+        part.ids = np.asarray([f"{doc_id}_c{copy}" for doc_id in base.ids], dtype=object)
+        part.texts = np.asarray([f"{text} [{copy}]" for text in base.texts], dtype=object)
+        parts.append(part)
+    return ChunkBatch.concat(parts)
+
+
+def run_lists(chunks: List[DocumentChunk], client: EmbeddingsClient, store: VectorStore) -> None:
+    """Путь до ChunkBatch: вектор — список Python float, upsert списками DocumentChunk."""
+    texts = [c.text for c in chunks]
+    for offset, embeddings in client.iter_embeddings(texts):
+        batch = chunks[offset : offset + len(embeddings)]
+        for chunk, embedding in zip(batch, embeddings):
+            chunk.embedding = embedding
+        store.upsert_documents(batch)
+    store.finalize()
+
+
+def run_batch(batch: ChunkBatch, client: EmbeddingsClient, store: VectorStore) -> None:
+    for offset, count in client.iter_batch_embeddings(batch):
+        store.upsert_documents(batch[offset : offset + count])
+    store.finalize()
+
+
+def measure(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    client = EmbeddingsClient(client=OfflineEmbeddingsAPI(args.dim), dimensions=None, batch_size=args.batch_size)
+    if mode == "lists":
+        # Старый API-запрос без encoding_format: ответ приходит списками float
+        client._request_kwargs = lambda batch: {"model": client.model, "input": batch}  # type: ignore[method-assign]
+    with tempfile.TemporaryDirectory(prefix="bench-reindex-") as tmp:
+        store = make_store(args.backend, tmp)
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        started = time.perf_counter()
+        data = corpus(args.copies)
+        if mode == "lists":
+            data = data.to_chunks()
+            run_lists(data, client, store)
+        else:
+            run_batch(data, client, store)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Живые блоки аллокатора, пока чанки ещё держатся: объекты float/dict на чанк видны здесь
+        live_blocks = sys.getallocatedblocks() - blocks_before
+        count = len(data)
+        del data, store
+    return {
+        "mode": mode,
+        "chunks": count,
+        "dim": args.dim,
+        "backend": args.backend,
+        "elapsed_sec": round(elapsed, 2),
+        "tracemalloc_peak_mb": round(peak / 2**20, 1),
+        "live_blocks": live_blocks,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    if args.mode != "both":
+        print(json.dumps(measure(args.mode, args)))
+        return
+
+    results = []
+    for mode in MODES:
+        cmd = [sys.executable, "-m", "scripts.bench_reindex_memory", "--mode", mode, "--dim", str(args.dim),
+               "--copies", str(args.copies), "--backend", args.backend, "--batch-size", str(args.batch_size)]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Чанков: {results[0]['chunks']}, dim={args.dim}, backend: {args.backend}")
+    print(f"{'mode':<8}{'time, s':>10}{'peak (tracemalloc), MB':>26}{'maxrss, MB':>14}{'live blocks':>14}")
+    for row in results:
+        print(
+            f"{row['mode']:<8}{row['elapsed_sec']:>10}{row['tracemalloc_peak_mb']:>26}"
+            f"{row['max_rss_mb']:>14}{row['live_blocks']:>14}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Результаты сохранены в {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Замер холодного старта сервиса: импорт app.main, время до /health и до /ready (после warm-up).
+
+Каждый прогон — отдельный процесс uvicorn на свободном порту.
+
+Пример:
+    python -m scripts.bench_startup --runs 5
+    python -m scripts.bench_startup --runs 3 --no-warmup --json startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+POLL_INTERVAL_SEC = 0.02
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark service cold start.")
+    parser.add_argument("--runs", type=int, default=5, help="Сколько холодных стартов замерить")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Сколько ждать /ready, сек")
+    parser.add_argument("--no-warmup", action="store_true", help="Запускать с WARMUP_ENABLED=false (сравнение)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def measure_import() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float) -> float | None:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(POLL_INTERVAL_SEC)
+    return None
+
+
+def measure_start(timeout: float, warmup: bool) -> Dict[str, float | None]:
+    port = free_port()
+    env = {**os.environ, "WARMUP_ENABLED": "true" if warmup else "false"}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        health_at = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        ready_at = wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        ready_info = None
+        if ready_at is not None:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                ready_info = json.loads(response.read())
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {
+        "health_sec": round(health_at - started, 3) if health_at else None,
+        "ready_sec": round(ready_at - started, 3) if ready_at else None,
+        "warmup_steps": (ready_info or {}).get("steps"),
+    }
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3), "max": round(max(values), 3)}
+
+
+def main() -> None:
+    args = parse_args()
+    imports = [measure_import() for _ in range(args.runs)]
+    starts = [measure_start(args.timeout, warmup=not args.no_warmup) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "warmup": not args.no_warmup,
+        "import_app_main_sec": summarize(imports),
+        "time_to_health_sec": summarize([s["health_sec"] for s in starts if s["health_sec"] is not None]),
+        "time_to_ready_sec": summarize([s["ready_sec"] for s in starts if s["ready_sec"] is not None])
+        if any(s["ready_sec"] is not None for s in starts)
+        else None,
+        "last_warmup_steps": starts[-1]["warmup_steps"],
+    }
+    print(f"import app.main: {report['import_app_main_sec']}")
+    print(f"до /health:      {report['time_to_health_sec']}")
+    print(f"до /ready:       {report['time_to_ready_sec'] or 'не дождались (см. /ready)'}")
+    print(f"шаги warm-up:    {report['last_warmup_steps']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Оценка качества и скорости поиска на эталонных вопросах: recall@k, MRR, доля отказов
+(_should_refuse) и латентность поиска для текущего VECTOR_STORE_BACKEND.
+
+Эмбеддинги вопросов кэшируются в data/eval (по файлу на модель и размерность); с --offline
+скрипт не обращается к API и падает, если кэша не хватает. Отчёт — JSON с отсортированными
+ключами, его удобно сравнивать между прогонами (--compare или обычный diff).
+
+Пример:
+    python -m scripts.eval_retrieval --output data/eval/report_baseline.json
+    RELEVANCE_THRESHOLD=0.7 python -m scripts.eval_retrieval --offline --compare data/eval/report_baseline.json
+    VECTOR_STORE_BACKEND=compact python -m scripts.eval_retrieval --offline --ks 1,5,10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from app.config import settings
+from app.rag.evaluation import (
+    DEFAULT_KS,
+    GOLDEN_SET_FILE,
+    CachedQueryEmbedder,
+    MissingQueryEmbeddings,
+    QueryEmbeddingCache,
+    compare_reports,
+    load_golden_set,
+    query_cache_path,
+    run_evaluation,
+)
+from app.vector_store import get_vector_store
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Оценка retrieval на эталонных вопросах LOTR.")
+    parser.add_argument("--golden", default=GOLDEN_SET_FILE, help="JSON с эталонными вопросами")
+    parser.add_argument("--ks", default=",".join(map(str, DEFAULT_KS)), help="Значения k через запятую")
+    parser.add_argument("--cache", default=None, help="npz-кэш эмбеддингов вопросов (по умолчанию data/eval/...)")
+    parser.add_argument("--offline", action="store_true", help="Не обращаться к API, только кэш эмбеддингов")
+    parser.add_argument(
+        "--hierarchical",
+        choices=("auto", "on", "off"),
+        default="auto",
+        help="Иерархический поиск: auto — как HIERARCHICAL_RETRIEVAL_ENABLED",
+    )
+    parser.add_argument("--output", default=None, help="Сохранить отчёт в JSON")
+    parser.add_argument("--compare", default=None, help="Предыдущий отчёт для сравнения метрик")
+    parser.add_argument("--per-query", action="store_true", help="Показать результаты по каждому вопросу")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    golden = load_golden_set(args.golden)
+    cache_path = args.cache or query_cache_path(settings.embedding_model_name, settings.embedding_dimensions)
+    cache = QueryEmbeddingCache(cache_path, settings.embedding_model_name, settings.embedding_dimensions)
+    try:
+        computed = cache.fill([q.question for q in golden.questions], offline=args.offline)
+    except MissingQueryEmbeddings as exc:
+        print(f"Ошибка: {exc}")
+        sys.exit(1)
+    if computed:
+        print(f"Досчитано эмбеддингов вопросов: {computed} (кэш {cache.path})")
+
+    hierarchical = {"auto": None, "on": True, "off": False}[args.hierarchical]
+    ks = [int(k) for k in args.ks.split(",")]
+    report = run_evaluation(get_vector_store(), golden, CachedQueryEmbedder(cache), ks=ks, hierarchical=hierarchical)
+
+    summary = report["summary"]
+    config = report["config"]
+    print(
+        f"Набор: {report['golden_set']} ({summary['answerable']} вопросов из корпуса, "
+        f"{summary['unanswerable']} вне корпуса), backend: {config['store']}, индекс: {config['index_version']}"
+    )
+    if report["unlabeled_questions"]:
+        print(f"Нет релевантных чанков в индексе для: {', '.join(report['unlabeled_questions'])}")
+    print(f"{'k':>4}{'recall@k':>12}{'hit@k':>10}{'chapter@k':>12}")
+    for k in report["config"]["ks"]:
+        key = str(k)
+        print(
+            f"{k:>4}{summary['recall_at_k'][key]:>12.4f}{summary['hit_at_k'][key]:>10.4f}"
+            f"{summary['chapter_hit_at_k'][key]:>12.4f}"
+        )
+    print(f"MRR: {summary['mrr']:.4f}, chapter MRR: {summary['chapter_mrr']:.4f}")
+    print(
+        f"Отказы: {summary['refusal_rate_answerable']:.1%} на вопросах из корпуса, "
+        f"{summary['refusal_rate_unanswerable']:.1%} на вопросах вне корпуса "
+        f"(RELEVANCE_THRESHOLD={config['relevance_threshold']}, MIN_GOOD_CHUNKS={config['min_good_chunks']})"
+    )
+    latency = summary["latency_ms"]
+    print(f"Поиск, мс: p50={latency['p50']}, p95={latency['p95']}, max={latency['max']}")
+
+    if args.per_query:
+        for row in report["queries"]:
+            rank = row.get("first_relevant_rank", "-") if row["answerable"] else "n/a"
+            print(
+                f"  {row['id']:<5} rank={rank!s:<5} score={row['top_score']} "
+                f"refused={row['refused']} {row['latency_ms']:.2f} мс"
+            )
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"Сравнение с {args.compare}:")
+        for name, before, after in compare_reports(previous, report):
+            if before != after:
+                print(f"  {name:<32}{before:>10.4f} -> {after:<10.4f} ({after - before:+.4f})")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+        print(f"Отчёт сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
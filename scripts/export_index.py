@@ -0,0 +1,48 @@
+"""
+CLI для выгрузки индекса в переносимый снапшот (без повторного расчёта эмбеддингов).
+
+Колонки id/текст/метаданные и float32-векторы пишутся потоково, с sha256 каждой колонки.
+Вместе с индексом сохраняется манифест статистики (если есть).
+
+Пример:
+    python -m scripts.export_index --output data/index_snapshot.zip
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from app.config import setup_logging
+from app.indexing.stats import load_index_stats
+from app.vector_store import get_vector_store
+from app.vector_store.portable import export_snapshot
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export vector index to a portable snapshot file.")
+    parser.add_argument("--output", required=True, help="Путь к файлу снапшота")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Сколько документов читать из индекса за раз")
+    return parser.parse_args()
+
+
+def main() -> None:
+    setup_logging()
+    args = parse_args()
+    started = time.perf_counter()
+    manifest = export_snapshot(
+        get_vector_store(),
+        args.output,
+        batch_size=args.batch_size,
+        index_stats=load_index_stats(),
+    )
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(
+        f"Exported {manifest['count']} chunks (dim={manifest['dim']}) to {args.output}: "
+        f"{size_mb:.1f} MiB in {time.perf_counter() - started:.2f}s, checksum {manifest['checksum'][:16]}…"
+    )
+
+
+if __name__ == "__main__":
+    main()
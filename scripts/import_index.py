@@ -0,0 +1,72 @@
+"""
+CLI для загрузки переносимого снапшота в настроенный VECTOR_STORE_BACKEND.
+
+Проверяет контрольные суммы, очищает индекс и заливает документы крупными пачками;
+модель/размерность эмбеддингов и манифест статистики переносятся из снапшота.
+
+Пример:
+    python -m scripts.import_index --input data/index_snapshot.zip --batch-size 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from app.config import settings, setup_logging
+from app.indexing.stats import write_index_stats
+from app.vector_store import get_vector_store
+from app.vector_store.portable import SnapshotFormatError, import_snapshot, read_index_stats, read_manifest
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-load a portable snapshot into the vector store.")
+    parser.add_argument("--input", required=True, help="Путь к файлу снапшота")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Размер пачки upsert")
+    parser.add_argument("--no-verify", action="store_true", help="Не сверять контрольные суммы перед загрузкой")
+    parser.add_argument("--append", action="store_true", help="Не очищать индекс перед загрузкой")
+    parser.add_argument("--no-stats", action="store_true", help="Не восстанавливать манифест статистики")
+    return parser.parse_args()
+
+
+def main() -> None:
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    args = parse_args()
+
+    try:
+        manifest = read_manifest(args.input)
+    except SnapshotFormatError as exc:
+        print(f"Ошибка: {exc}")
+        sys.exit(1)
+    snapshot_model = (manifest.get("index_info") or {}).get("embedding_model")
+    if snapshot_model and snapshot_model != settings.embedding_model_name:
+        logger.warning(
+            "Snapshot embedding model differs from EMBEDDING_MODEL_NAME; queries will be rejected",
+            extra={"snapshot_model": snapshot_model, "configured_model": settings.embedding_model_name},
+        )
+
+    try:
+        result = import_snapshot(
+            args.input,
+            get_vector_store(),
+            batch_size=args.batch_size,
+            verify=not args.no_verify,
+            replace=not args.append,
+        )
+    except SnapshotFormatError as exc:
+        print(f"Снапшот повреждён: {exc}")
+        sys.exit(1)
+
+    stats = None if args.no_stats else read_index_stats(args.input)
+    if stats is not None:
+        write_index_stats(stats)
+    print(
+        f"Imported {result['count']} chunks (dim={result['dim']}) into {settings.vector_store_backend} "
+        f"in {result['elapsed_sec']:.2f}s; index version {(result['index_info'] or {}).get('index_version')}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+CLI для просмотра манифеста статистики индекса (пишется при reindex, читается за O(1)).
+
+Пример:
+    python -m scripts.index_stats
+    python -m scripts.index_stats --chapters
+    python -m scripts.index_stats --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+from app.indexing.stats import INDEX_STATS_FILE, load_index_stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Показать статистику индекса из манифеста.")
+    parser.add_argument("--path", default=INDEX_STATS_FILE, help="Путь к манифесту")
+    parser.add_argument("--chapters", action="store_true", help="Показать число чанков по главам")
+    parser.add_argument("--json", action="store_true", help="Вывести манифест целиком в JSON")
+    args = parser.parse_args()
+
+    stats = load_index_stats(args.path)
+    if stats is None:
+        print(f"Манифест {args.path} не найден — выполните reindex.")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return
+
+    totals = stats["totals"]
+    sizes = stats["text_size_chars"]
+    print(f"Версия индекса: {stats['index_version']} (backend {stats['vector_store_backend']})")
+    print(f"Собран: {stats['build']['started_at']} за {stats['build']['duration_sec']} с")
+    print(f"Эмбеддинги: {stats['embedding']['model']}, dim={stats['embedding']['dimensions']}")
+    print(f"Чанкинг: {json.dumps(stats['chunking'], ensure_ascii=False)}")
+    print(f"Книг: {totals['books']}, глав: {totals['chapters']}, чанков: {totals['chunks']}")
+    if sizes.get("count"):
+        print(
+            f"Размер чанка (символы): min={sizes['min']} p50={sizes['p50']} p90={sizes['p90']} "
+            f"p99={sizes['p99']} max={sizes['max']} mean={sizes['mean']}"
+        )
+    dedup = stats.get("dedup")
+    if dedup:
+        saved = dedup["index_bytes_saved"]
+        print(
+            f"Почти-дубли (порог {dedup['threshold']}): {dedup['duplicates']} из {dedup['input_chunks']}; "
+            f"сэкономлено эмбеддингов {dedup['embeddings_saved']} (~{dedup['embedding_tokens_saved']} токенов), "
+            f"индекса {saved['total']} байт (векторы)"
+        )
+    print("Файлы корпуса:")
+    for item in stats["corpus_files"]:
+        print(f"  {item['file']}: {item['bytes']} байт, sha256 {item['sha256'][:16]}…")
+    print("Чанков по книгам и частям:")
+    for book in stats["books"]:
+        parts = ", ".join(f"{part}: {count}" for part, count in book["book_parts"].items())
+        print(f"  {book['book_id']} ({book['book']}): {book['chunks']} [{parts}]")
+        if args.chapters:
+            for chapter in book["chapters"]:
+                print(f"    гл. {chapter['chapter_index']} {chapter['chapter_title']!r}: {chapter['chunks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 """
-CLI для вывода уникальных значений метадаты `book_part` из Chroma.
+CLI для вывода уникальных значений метадаты `book_part`.
+
+По умолчанию читает манифест статистики, записанный reindex (O(1));
+`--scan` обходит всю коллекцию Chroma, как раньше.
 
 Пример:
-    python -m scripts.list_book_parts --page-size 500
+    python -m scripts.list_book_parts
+    python -m scripts.list_book_parts --scan --page-size 500
 """
 
 from __future__ import annotations
@@ -11,9 +15,18 @@ import argparse
 from collections import Counter
 from typing import Counter as CounterType, Tuple
 
+from app.indexing.stats import load_index_stats
 from app.vector_store import get_vector_store
 
 
+def book_parts_from_stats() -> Tuple[CounterType[str], int] | None:
+    """book_part и их частота из манифеста; None, если манифеста нет."""
+    stats = load_index_stats()
+    if stats is None:
+        return None
+    return Counter(stats.get("book_parts") or {}), int(stats["totals"]["chunks"])
+
+
 def collect_book_parts(page_size: int = 500) -> Tuple[CounterType[str], int]:
     """
     Собрать уникальные book_part и их частоту во всём индексе.
@@ -49,9 +62,16 @@ def collect_book_parts(page_size: int = 500) -> Tuple[CounterType[str], int]:
 def main() -> None:
     parser = argparse.ArgumentParser(description="Показать все book_part, присутствующие в индексе.")
     parser.add_argument("--page-size", type=int, default=500, help="Размер страницы для обхода .get")
+    parser.add_argument("--scan", action="store_true", help="Обойти коллекцию вместо чтения манифеста")
     args = parser.parse_args()
 
-    counts, total = collect_book_parts(page_size=args.page_size)
+    from_stats = None if args.scan else book_parts_from_stats()
+    if from_stats is None:
+        if not args.scan:
+            print("Манифест статистики не найден — обходим коллекцию (выполните reindex, чтобы он появился).")
+        counts, total = collect_book_parts(page_size=args.page_size)
+    else:
+        counts, total = from_stats
 
     print(f"Всего документов в коллекции: {total}")
     if not counts:
@@ -0,0 +1,59 @@
+"""
+Собрать готовые ответы на частые вопросы для текущего индекса (то же, что стадия
+PRECOMPUTE_AFTER_REINDEX после reindex). /api/v1/ask отдаёт их при точном совпадении
+вопроса без эмбеддинга и вызова LLM, пока index_version не сменится.
+
+Пример:
+    python -m scripts.precompute_answers
+    python -m scripts.precompute_answers --questions data/precomputed/questions_lotr.json --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from app.config import settings, setup_logging
+from app.embeddings.client import EmbeddingsClient
+from app.llm.client import LLMClient
+from app.rag.precomputed import PRECOMPUTED_ANSWERS_FILE, load_question_list, precompute_answers
+from app.vector_store import get_vector_store
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Готовые ответы на частые вопросы для текущего индекса.")
+    parser.add_argument("--questions", default=settings.precomputed_questions_file, help="JSON со списком вопросов")
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.precompute_concurrency, help="Сколько вопросов считать параллельно"
+    )
+    parser.add_argument("--output", default=PRECOMPUTED_ANSWERS_FILE, help="Куда записать таблицу ответов")
+    return parser.parse_args()
+
+
+def main() -> None:
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    args = parse_args()
+
+    try:
+        summary = precompute_answers(
+            get_vector_store(),
+            EmbeddingsClient(),
+            LLMClient(),
+            load_question_list(args.questions),
+            concurrency=args.concurrency,
+            path=args.output,
+        )
+    except Exception:
+        logger.exception("Precompute failed")
+        sys.exit(1)
+
+    print(
+        f"Вопросов: {summary.questions}, ответов сохранено: {summary.answered}, отказов: {summary.refused}, "
+        f"ошибок: {summary.failed} ({summary.elapsed_sec:.2f}s, индекс {summary.index_version}) -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
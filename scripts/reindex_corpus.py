@@ -1,8 +1,15 @@
 """
 CLI для полной переиндексации корпуса.
 
+Каждый записанный батч фиксируется в чекпоинте (VECTOR_STORE_PATH/reindex_checkpoint);
+после падения --resume продолжает с него и эмбеддит только недостающие чанки.
+--profile сохраняет JSON-профиль прогона (время по стадиям, chunks/sec, перцентили upsert,
+пиковая память) в REINDEX_PROFILE_DIR.
+
 Пример:
     python -m scripts.reindex_corpus --embed-batch 64
+    python -m scripts.reindex_corpus --resume
+    python -m scripts.reindex_corpus --profile
 """
 
 from __future__ import annotations
@@ -14,6 +21,7 @@ import sys
 from app.config import setup_logging
 from app.embeddings.client import EmbeddingsClient
 from app.indexing.pipeline import ReindexService
+from app.rag.precomputed import precompute_after_reindex
 from app.vector_store import get_vector_store
 
 
@@ -23,7 +31,18 @@ def parse_args() -> argparse.Namespace:
         "--embed-batch",
         type=int,
         default=64,
-        help="Размер батча для запроса эмбеддингов.",
+        help="Начальный размер батча эмбеддингов (дальше подстраивается под латентность и троттлинг).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить прерванный reindex с чекпоинта (если корпус и модель не менялись).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=None,
+        help="Профилировать прогон и сохранить JSON-отчёт (по умолчанию REINDEX_PROFILE_ENABLED).",
     )
     return parser.parse_args()
 
@@ -38,15 +57,29 @@ def main() -> None:
         EmbeddingsClient(),
         embed_batch=args.embed_batch,
         logger_=logger,
+        precompute=precompute_after_reindex,
     )
 
     try:
-        summary = service.run()
+        summary = service.run(resume=args.resume, profile=args.profile)
     except Exception:
         logger.exception("Reindex failed")
         sys.exit(1)
 
-    print(f"Indexed chunks: {summary.indexed_chunks} (elapsed {summary.elapsed_sec:.2f}s)")
+    print(
+        f"Indexed chunks: {summary.indexed_chunks} (elapsed {summary.elapsed_sec:.2f}s, "
+        f"index version {summary.index_version}, near-duplicates skipped {summary.skipped_duplicates}, "
+        f"resumed from checkpoint {summary.resumed_chunks})"
+    )
+    if summary.profile:
+        profile = summary.profile
+        stages = ", ".join(f"{name} {entry['wall_sec']:.2f}s" for name, entry in profile["stages"].items())
+        print(
+            f"Profile: wall {profile['wall_sec']:.2f}s, cpu {profile['cpu_sec']:.2f}s; {stages}; "
+            f"embeddings {profile['embedding']['chunks_per_sec']} chunks/s, "
+            f"upsert p95 {profile['upsert']['latency_ms'].get('p95')} ms, "
+            f"peak RSS {profile['memory']['peak_rss_mb']} MB -> {profile['artifact']}"
+        )
 
 
 if __name__ == "__main__":
@@ -1,30 +1,172 @@
 """
 CLI для поиска по векторному индексу по текстовому запросу.
 
+Пакетный режим (--queries): запросы из файла или stdin (по строке; либо JSON-строка
+{"id": ..., "query": ...}), эмбеддинги — крупными батчами, поиск — параллельно в потоках,
+результаты — JSONL с временем поиска по каждому запросу. С --cache эмбеддинги запросов
+сохраняются в npz и при повторном прогоне берутся оттуда (--offline — без обращений к API).
+
 Пример:
     python -m scripts.search_query --query "Горлум исчез; Фродо..." --top-k 5
+    python -m scripts.search_query --query "Шелоб" --book-id two_towers --book-part 4
+    python -m scripts.search_query --queries data/eval/queries.txt --cache data/eval/search_queries.npz --output results.jsonl
+    cat queries.txt | python -m scripts.search_query --queries - --workers 8 --offline --cache data/eval/search_queries.npz
 """
 
 from __future__ import annotations
 
 import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, TextIO, Tuple
+
+import numpy as np
 
+from app.config import settings
 from app.embeddings.client import EmbeddingsClient
+from app.indexing.profiling import latency_percentiles
+from app.rag.evaluation import MissingQueryEmbeddings, QueryEmbeddingCache
 from app.vector_store import get_vector_store
+from app.vector_store.base import VectorStore, WhereFilter
 
 
-def main() -> None:
+def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Search indexed chunks by text query.")
-    parser.add_argument("--query", "-q", required=True, help="Текст запроса")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--query", "-q", help="Текст запроса")
+    source.add_argument("--queries", help="Файл с запросами (по строке или JSONL с полями id/query); '-' — stdin")
     parser.add_argument("--top-k", type=int, default=5, help="Сколько результатов вернуть")
     parser.add_argument("--snippet", type=int, default=300, help="Длина сниппета текста")
-    args = parser.parse_args()
+    parser.add_argument("--book-id", default=None, help="Искать только в книге (fellowship, two_towers, ...)")
+    parser.add_argument("--book-part", type=int, default=None, help="Искать только в части 1–6")
+    parser.add_argument("--chapter-index", type=int, default=None, help="Искать только в главе (вместе с --book-id)")
+    bulk = parser.add_argument_group("пакетный режим (--queries)")
+    bulk.add_argument("--output", "-o", default=None, help="Куда писать JSONL с результатами (по умолчанию stdout)")
+    bulk.add_argument("--embed-batch", type=int, default=256, help="Начальный размер батча эмбеддингов запросов")
+    bulk.add_argument("--workers", type=int, default=4, help="Сколько поисков выполнять параллельно")
+    bulk.add_argument("--cache", default=None, help="npz-кэш эмбеддингов запросов: недостающие досчитываются и сохраняются")
+    bulk.add_argument("--offline", action="store_true", help="Не обращаться к API, только кэш эмбеддингов (нужен --cache)")
+    return parser.parse_args()
+
+
+def read_queries(source: TextIO) -> List[Tuple[str, str]]:
+    """(id, запрос): строка файла — текст запроса или JSON-объект с полями query (question) и id."""
+    queries: List[Tuple[str, str]] = []
+    for line_no, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            item = json.loads(line)
+            text = item.get("query") or item.get("question")
+            if not text:
+                raise ValueError(f"Line {line_no}: JSON query without 'query' field")
+            queries.append((str(item.get("id", line_no)), text))
+        else:
+            queries.append((str(line_no), line))
+    return queries
+
+
+def embed_queries(texts: List[str], args: argparse.Namespace) -> Tuple[Dict[str, np.ndarray], int]:
+    """Эмбеддинги уникальных запросов и число запросов к API (0, если всё нашлось в кэше)."""
+    unique = list(dict.fromkeys(texts))
+    cache = None
+    if args.cache:
+        cache = QueryEmbeddingCache(args.cache, settings.embedding_model_name, settings.embedding_dimensions)
+    # Клиент (и ключ API) нужен, только если чего-то нет в кэше
+    client = None
+    if cache is None or (cache.missing(unique) and not args.offline):
+        client = EmbeddingsClient()
+        client.adaptive.reset(args.embed_batch)
+
+    if cache is not None:
+        cache.fill(unique, offline=args.offline, client=client)
+        vectors = {text: np.asarray(cache.vectors[text], dtype=np.float32) for text in unique}
+    else:
+        vectors = {}
+        for offset, matrix in client.iter_embedding_arrays(unique):
+            vectors.update(zip(unique[offset : offset + len(matrix)], matrix))
+    return vectors, client.stats.requests if client is not None else 0
+
+
+def search_one(
+    vs: VectorStore, query_id: str, text: str, vector: np.ndarray, where: WhereFilter | None, args: argparse.Namespace
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    results = vs.search(vector, top_k=args.top_k, where=where)
+    search_ms = (time.perf_counter() - started) * 1000
+    return {
+        "id": query_id,
+        "query": text,
+        "search_ms": round(search_ms, 3),
+        "results": [
+            {
+                "rank": rank,
+                "id": doc.id,
+                "distance": round(float(distance), 6),
+                "metadata": doc.metadata,
+                "text": doc.text[: args.snippet],
+            }
+            for rank, (doc, distance) in enumerate(results, start=1)
+        ],
+    }
+
+
+def run_bulk(args: argparse.Namespace, where: WhereFilter | None) -> None:
+    if args.offline and not args.cache:
+        print("Ошибка: --offline работает только с --cache", file=sys.stderr)
+        sys.exit(1)
+    if args.queries == "-":
+        queries = read_queries(sys.stdin)
+    else:
+        with open(args.queries, encoding="utf-8") as fh:
+            queries = read_queries(fh)
+    if not queries:
+        print("Нет запросов", file=sys.stderr)
+        return
 
+    started = time.perf_counter()
+    try:
+        vectors, api_requests = embed_queries([text for _, text in queries], args)
+    except MissingQueryEmbeddings as exc:
+        print(f"Ошибка: {exc}", file=sys.stderr)
+        sys.exit(1)
+    embed_sec = time.perf_counter() - started
+
+    vs = get_vector_store()
+    started = time.perf_counter()
+    # map сохраняет порядок входного файла; numpy/Chroma отпускают GIL на самом поиске
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="search-query") as pool:
+        rows = list(
+            pool.map(lambda item: search_one(vs, item[0], item[1], vectors[item[1]], where, args), queries)
+        )
+    search_sec = time.perf_counter() - started
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for row in rows:
+            output.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+    latency = latency_percentiles([row["search_ms"] / 1000 for row in rows])
+    print(
+        f"Запросов: {len(rows)} (уникальных {len(vectors)}), эмбеддинги: {embed_sec:.2f}s, "
+        f"запросов к API: {api_requests}; поиск: {search_sec:.2f}s в {args.workers} потоков, "
+        f"мс p50={latency['p50']} p95={latency['p95']} max={latency['max']}",
+        file=sys.stderr,
+    )
+
+
+def run_single(args: argparse.Namespace, where: WhereFilter | None) -> None:
     vs = get_vector_store()
     emb = EmbeddingsClient()
 
     q_vec = emb.embed_text(args.query)
-    results = vs.search(q_vec, top_k=args.top_k)
+    results = vs.search(q_vec, top_k=args.top_k, where=where)
 
     if not results:
         print("Нет результатов")
@@ -37,6 +179,24 @@ def main() -> None:
         print("text:", snippet + ("..." if len(doc.text) > args.snippet else ""))
 
 
+def main() -> None:
+    args = parse_args()
+
+    where = {
+        key: value
+        for key, value in (
+            ("book_id", args.book_id),
+            ("book_part", args.book_part),
+            ("chapter_index", args.chapter_index),
+        )
+        if value is not None
+    }
+
+    if args.queries:
+        run_bulk(args, where or None)
+    else:
+        run_single(args, where or None)
+
+
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,110 @@
+"""
+Перебор HNSW search_ef: латентность запроса против recall@k относительно точного поиска.
+
+Пример:
+    python -m scripts.sweep_search_ef --ef 10,20,40,80,160,320 --queries 200 --top-k 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.config import settings
+from app.vector_store.chroma_store import ChromaVectorStore
+
+PAGE_SIZE = 1000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sweep HNSW search_ef: latency vs recall@k.")
+    parser.add_argument("--ef", default="10,20,40,80,160,320", help="Значения search_ef через запятую")
+    parser.add_argument("--queries", type=int, default=200, help="Сколько запросов (случайные векторы индекса + шум)")
+    parser.add_argument("--noise", type=float, default=0.3, help="Доля шума, добавляемого к вектору-запросу")
+    parser.add_argument("--top-k", type=int, default=10, help="k для recall@k")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить результаты в JSON")
+    return parser.parse_args()
+
+
+def load_embeddings(store: ChromaVectorStore) -> tuple[List[str], np.ndarray]:
+    ids: List[str] = []
+    parts: List[np.ndarray] = []
+    total = store.collection.count()
+    for offset in range(0, total, PAGE_SIZE):
+        result = store.collection.get(include=["embeddings"], limit=PAGE_SIZE, offset=offset)
+        ids.extend(result["ids"])
+        parts.append(np.asarray(result["embeddings"], dtype=np.float32))
+    if not parts:
+        return ids, np.empty((0, 0), dtype=np.float32)
+    return ids, np.vstack(parts)
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, metric: str, k: int) -> np.ndarray:
+    if metric == "l2":
+        scores = -((vectors - query) ** 2).sum(axis=1)
+    elif metric == "cosine":
+        scores = (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+    else:
+        scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def main() -> None:
+    args = parse_args()
+    store = ChromaVectorStore()
+    ids, vectors = load_embeddings(store)
+    if not ids:
+        print("Коллекция пуста — сначала выполните reindex.")
+        return
+
+    rng = np.random.default_rng(0)
+    picked = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = picked + args.noise * rng.normal(size=picked.shape).astype(np.float32) * picked.std()
+    truth = [set(ids[i] for i in exact_top_k(vectors, q, store.metric, args.top_k)) for q in queries]
+
+    report: Dict[str, Any] = {
+        "collection": store.collection_name,
+        "metric": store.metric,
+        "vectors": len(ids),
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "results": [],
+    }
+    print(f"Коллекция {store.collection_name}: {len(ids)} векторов, metric={store.metric}, k={args.top_k}")
+    print(f"{'search_ef':>10} {'recall':>8} {'mean_ms':>9} {'p95_ms':>9}")
+
+    try:
+        for ef in [int(x) for x in args.ef.split(",") if x]:
+            store.set_search_ef(ef)
+            store.search(queries[0].tolist(), top_k=args.top_k)  # прогрев после смены параметра
+            latencies: List[float] = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                results = store.search(query.tolist(), top_k=args.top_k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len({doc.id for doc, _ in results} & expected)
+            row = {
+                "search_ef": ef,
+                "recall": round(hits / (len(queries) * args.top_k), 4),
+                "latency_ms_mean": round(float(np.mean(latencies)), 3),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            }
+            report["results"].append(row)
+            print(f"{ef:>10} {row['recall']:>8} {row['latency_ms_mean']:>9} {row['latency_ms_p95']:>9}")
+    finally:
+        # Возвращаем значение из настроек, чтобы перебор не менял поведение сервиса
+        store.set_search_ef(settings.hnsw_search_ef)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-client round-robin queueing and load shedding in FairLimiter.
+"""
+
+import itertools
+import threading
+import time
+
+import pytest
+
+from app.rag.admission import AdmissionRejected, FairLimiter
+
+_names = itertools.count()
+
+
+def _limiter(limit=1, max_queue=10, max_wait_sec=5.0) -> FairLimiter:
+    # Метрики регистрируются по имени лимитера, поэтому у каждого теста своё имя
+    return FairLimiter(f"test_{next(_names)}", limit, max_queue, max_wait_sec, retry_after_sec=2.0)
+
+
+def _wait_queued(limiter: FairLimiter, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while limiter._queued != count:
+        assert time.monotonic() < deadline, f"expected {count} queued, got {limiter._queued}"
+        time.sleep(0.001)
+
+
+def test_slots_are_granted_round_robin_across_clients():
+    limiter = _limiter()
+    limiter.acquire("holder")
+    granted = []
+    granted_event = threading.Condition()
+
+    def wait_for_slot(client, label):
+        limiter.acquire(client)
+        with granted_event:
+            granted.append(label)
+            granted_event.notify_all()
+
+    threads = []
+    for client, label in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1")]:
+        thread = threading.Thread(target=wait_for_slot, args=(client, label))
+        thread.start()
+        threads.append(thread)
+        _wait_queued(limiter, len(threads))
+
+    for expected in range(1, len(threads) + 1):
+        limiter.release()
+        with granted_event:
+            assert granted_event.wait_for(lambda: len(granted) == expected, timeout=5)
+    for thread in threads:
+        thread.join(5)
+
+    assert granted == ["a1", "b1", "c1", "a2", "a3"]
+    limiter.release()
+    assert limiter._active == 0
+
+
+def test_full_queue_is_rejected_with_429():
+    limiter = _limiter(limit=1, max_queue=1)
+    limiter.acquire("a")
+    waiter = threading.Thread(target=limiter.acquire, args=("b",))
+    waiter.start()
+    _wait_queued(limiter, 1)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        limiter.acquire("c")
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.reason == "queue full"
+    assert excinfo.value.retry_after_sec == 2.0
+
+    limiter.release()
+    waiter.join(5)
+    limiter.release()
+
+
+def test_queue_wait_timeout_is_rejected_with_503_and_dequeued():
+    limiter = _limiter(limit=1, max_wait_sec=0.05)
+    with limiter.slot("a"):
+        with pytest.raises(AdmissionRejected) as excinfo:
+            limiter.acquire("b")
+        assert excinfo.value.status_code == 503
+        assert limiter._queued == 0
+    # Просроченный тикет не должен забрать освободившийся слот
+    with limiter.slot("c"):
+        assert limiter._active == 1
+    assert limiter._active == 0
+
+
+def test_free_slots_do_not_queue():
+    limiter = _limiter(limit=2, max_queue=0)
+    limiter.acquire("a")
+    limiter.acquire("a")
+    with pytest.raises(AdmissionRejected):
+        limiter.acquire("b")
+    limiter.release()
+    limiter.release()
@@ -0,0 +1,100 @@
+"""
+Columnar ChunkBatch: conversion to and from DocumentChunk, views, concatenation and upsert semantics.
+"""
+
+import numpy as np
+import pytest
+
+from app.vector_store.base import DocumentChunk
+from app.vector_store.batch import MISSING, ChunkBatch, as_batch
+
+
+def _chunks():
+    return [
+        DocumentChunk("a", "Фродо", {"book_id": "fellowship", "chapter_index": 1}, [0.1, 0.2]),
+        DocumentChunk("b", "Сэм", {"book_id": "fellowship", "chapter_index": 2, "note": None}, [0.3, 0.4]),
+        DocumentChunk("c", "Голлум", {"book_id": "two_towers"}, [0.5, 0.6]),
+    ]
+
+
+def test_round_trip_preserves_chunks():
+    batch = ChunkBatch.from_chunks(_chunks())
+    assert len(batch) == 3 and batch.dim == 2
+    assert batch.embeddings.dtype == np.float32
+    assert batch.columns["chapter_index"].dtype == object  # у "c" ключа нет
+    restored = batch.to_chunks()
+    assert [chunk.id for chunk in restored] == ["a", "b", "c"]
+    assert [chunk.metadata for chunk in restored] == [chunk.metadata for chunk in _chunks()]
+    assert np.allclose([chunk.embedding for chunk in restored], [chunk.embedding for chunk in _chunks()])
+
+
+def test_missing_key_differs_from_explicit_none():
+    batch = ChunkBatch.from_chunks(_chunks())
+    assert batch.columns["note"][0] is MISSING
+    assert batch.metadatas()[1] == {"book_id": "fellowship", "chapter_index": 2, "note": None}
+    assert "note" not in batch.row_metadata(0)
+
+
+def test_integer_columns_are_typed_and_unboxed():
+    batch = ChunkBatch.from_records(["a", "b"], ["x", "y"], [{"n": 1}, {"n": 2}])
+    assert batch.columns["n"].dtype == np.int64
+    assert type(batch[0].metadata["n"]) is int
+    assert batch.embeddings is None and batch.dim == 0
+    assert batch.to_chunks()[0].embedding == []
+
+
+def test_slices_are_views_and_take_copies():
+    batch = ChunkBatch.from_chunks(_chunks())
+    view = batch[1:]
+    view.embeddings[0, 0] = 9.0
+    assert batch.embeddings[1, 0] == 9.0
+    picked = batch.take([2, 0])
+    assert list(picked.ids) == ["c", "a"]
+    picked.embeddings[0, 0] = -1.0
+    assert batch.embeddings[2, 0] == np.float32(0.5)
+    assert batch[-1].id == "c"
+    with pytest.raises(IndexError):
+        batch[3]
+
+
+def test_concat_fills_missing_columns():
+    left = ChunkBatch.from_records(["a"], ["x"], [{"n": 1}], [[1.0, 0.0]])
+    right = ChunkBatch.from_records(["b"], ["y"], [{"book_id": "rotk"}], [[0.0, 1.0]])
+    merged = ChunkBatch.concat([left, ChunkBatch([], []), right])
+    assert list(merged.ids) == ["a", "b"]
+    assert merged.metadatas() == [{"n": 1}, {"book_id": "rotk"}]
+    assert merged.embeddings.shape == (2, 2)
+    assert len(ChunkBatch.concat([])) == 0
+
+
+def test_concat_drops_embeddings_when_any_part_lacks_them():
+    left = ChunkBatch.from_records(["a"], ["x"], [{}], [[1.0]])
+    right = ChunkBatch.from_records(["b"], ["y"], [{}])
+    assert ChunkBatch.concat([left, right]).embeddings is None
+
+
+def test_set_column_and_length_checks():
+    batch = ChunkBatch.from_chunks(_chunks())
+    batch.set_column("canonical_id", ["a", "a", "c"])
+    assert batch[1].metadata["canonical_id"] == "a"
+    with pytest.raises(ValueError):
+        batch.set_column("canonical_id", ["a"])
+    with pytest.raises(ValueError):
+        ChunkBatch(["a", "b"], ["x"])
+    with pytest.raises(ValueError):
+        ChunkBatch(["a"], ["x"], embeddings=np.zeros((2, 3), dtype=np.float32))
+
+
+def test_dedupe_last_keeps_latest_occurrence():
+    batch = ChunkBatch.from_records(["a", "b", "a"], ["old", "b", "new"], [{}, {}, {}])
+    deduped = batch.dedupe_last()
+    assert list(deduped.ids) == ["b", "a"]
+    assert list(deduped.texts) == ["b", "new"]
+    unique = ChunkBatch.from_records(["a"], ["x"], [{}])
+    assert unique.dedupe_last() is unique
+
+
+def test_as_batch_converts_lists_once():
+    batch = as_batch(_chunks())
+    assert isinstance(batch, ChunkBatch)
+    assert as_batch(batch) is batch
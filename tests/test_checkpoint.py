@@ -0,0 +1,119 @@
+"""
+Reindex checkpoints: manifest hashing, commit/resume and recovery from interrupted batches.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from app.indexing.checkpoint import ReindexCheckpoint, manifest_hash
+from app.vector_store.batch import ChunkBatch
+
+
+def _corpus(texts=("Фродо", "Сэм", "Мерри", "Пин")):
+    return ChunkBatch.from_records(
+        [f"chunk-{i}" for i in range(len(texts))],
+        list(texts),
+        [{"book_id": "fellowship", "chapter_index": i} for i in range(len(texts))],
+    )
+
+
+def _vectors(start, count, dim=3):
+    return np.arange(start * dim, (start + count) * dim, dtype=np.float32).reshape(count, dim)
+
+
+def test_manifest_hash_tracks_corpus_model_and_store():
+    base = manifest_hash(_corpus(), "text-embedding-3-small", 256, "compact")
+    assert base == manifest_hash(_corpus(), "text-embedding-3-small", 256, "compact")
+    assert base != manifest_hash(_corpus(("Фродо", "Сэм", "Мерри", "Пиппин")), "text-embedding-3-small", 256, "compact")
+    assert base != manifest_hash(_corpus(), "text-embedding-3-large", 256, "compact")
+    assert base != manifest_hash(_corpus(), "text-embedding-3-small", None, "compact")
+    assert base != manifest_hash(_corpus(), "text-embedding-3-small", 256, "chroma")
+    reordered = _corpus().take([1, 0, 2, 3])
+    assert base != manifest_hash(reordered, "text-embedding-3-small", 256, "compact")
+
+
+def test_resume_returns_committed_vectors(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 2))
+    checkpoint.commit(2, _vectors(2, 1))
+
+    resumed = ReindexCheckpoint(tmp_path / "ckpt")
+    vectors = resumed.resume("m1")
+    np.testing.assert_array_equal(vectors, _vectors(0, 3))
+    assert resumed.committed == 3
+    assert resumed.state["last_batch"] == {"offset": 2, "count": 1}
+
+    resumed.commit(3, _vectors(3, 1))
+    np.testing.assert_array_equal(ReindexCheckpoint(tmp_path / "ckpt").resume("m1"), _vectors(0, 4))
+
+
+def test_resume_ignores_other_manifest(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 2))
+    assert ReindexCheckpoint(tmp_path / "ckpt").resume("m2") is None
+    assert ReindexCheckpoint(tmp_path / "missing").resume("m1") is None
+
+
+def test_resume_without_commits_is_empty(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    vectors = ReindexCheckpoint(tmp_path / "ckpt").resume("m1")
+    assert vectors is not None and len(vectors) == 0
+
+
+def test_uncommitted_tail_is_discarded(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 2))
+    # Падение после записи векторов следующего батча, но до замены state.json
+    with checkpoint.embeddings_path.open("ab") as fh:
+        fh.write(_vectors(2, 1).tobytes())
+
+    resumed = ReindexCheckpoint(tmp_path / "ckpt")
+    np.testing.assert_array_equal(resumed.resume("m1"), _vectors(0, 2))
+    assert checkpoint.embeddings_path.stat().st_size == 2 * 3 * 4
+    resumed.commit(2, _vectors(2, 2))
+    np.testing.assert_array_equal(ReindexCheckpoint(tmp_path / "ckpt").resume("m1"), _vectors(0, 4))
+
+
+def test_truncated_embeddings_are_rejected(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 2))
+    with checkpoint.embeddings_path.open("r+b") as fh:
+        fh.truncate(10)
+    assert ReindexCheckpoint(tmp_path / "ckpt").resume("m1") is None
+
+
+def test_unknown_format_version_is_ignored(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    state = json.loads(checkpoint.state_path.read_text())
+    state["format_version"] = 99
+    checkpoint.state_path.write_text(json.dumps(state))
+    assert ReindexCheckpoint(tmp_path / "ckpt").resume("m1") is None
+
+
+def test_commit_rejects_gaps_and_dimension_changes(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 1))
+    with pytest.raises(ValueError, match="offset 1"):
+        checkpoint.commit(2, _vectors(2, 1))
+    with pytest.raises(ValueError, match="dim"):
+        checkpoint.commit(1, _vectors(1, 1, dim=4))
+
+
+def test_start_and_clear_drop_previous_run(tmp_path):
+    checkpoint = ReindexCheckpoint(tmp_path / "ckpt")
+    checkpoint.start("m1", total=4, embedding_model="model")
+    checkpoint.commit(0, _vectors(0, 2))
+    checkpoint.start("m1", total=4, embedding_model="model")
+    assert len(ReindexCheckpoint(tmp_path / "ckpt").resume("m1")) == 0
+    checkpoint.clear()
+    assert not (tmp_path / "ckpt").exists()
+    assert checkpoint.state == {}
@@ -0,0 +1,90 @@
+"""
+Accept-Encoding negotiation and the response compression middleware.
+"""
+
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.api import compression
+from app.api.compression import CompressionMiddleware, negotiate_encoding
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    # Поведение окружения без пакета brotli
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("GZIP, deflate", "gzip"),
+        ("deflate", None),
+        ("gzip;q=0", None),
+        ("gzip; Q=0", None),
+        ("gzip;q=0.0, *", None),
+        ("*", "gzip"),
+        ("*;q=0", None),
+        ("identity, *;q=0.5", "gzip"),
+        ("gzip;q=bogus", None),
+    ],
+)
+def test_negotiate_gzip(gzip_only, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_brotli_preferred_at_equal_weight():
+    pytest.importorskip("brotli")
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("*") == "br"
+
+
+def test_q_values_override_brotli_preference():
+    pytest.importorskip("brotli")
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert negotiate_encoding("br;Q=0, *") == "gzip"
+
+
+def _client(minimum_size=64):
+    async def big(request):
+        return JSONResponse({"answer": "Фродо несёт Кольцо в Мордор. " * 20})
+
+    async def small(request):
+        return JSONResponse({"ok": True})
+
+    async def binary(request):
+        return Response(b"\x00" * 500, media_type="application/octet-stream")
+
+    app = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/binary", binary)])
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+    return TestClient(app)
+
+
+def test_middleware_compresses_large_json(gzip_only):
+    response = _client().get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["answer"].startswith("Фродо")
+
+
+def test_middleware_passes_small_binary_and_refused(gzip_only):
+    client = _client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/binary", headers={"Accept-Encoding": "gzip"}).headers
+    refused = client.get("/big", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+    assert refused.json()["answer"].startswith("Фродо")
+
+
+def test_gzip_output_is_deterministic():
+    body = b'{"answer": "..."}' * 10
+    assert compression.compress(body, "gzip") == compression.compress(body, "gzip")
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
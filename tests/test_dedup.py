@@ -0,0 +1,86 @@
+"""
+MinHash/LSH near-duplicate grouping and the side table of duplicates kept outside the vector index.
+"""
+
+import pytest
+
+from app.indexing.dedup import DuplicateTable, MinHasher, find_near_duplicates, lsh_params, shingles
+from app.vector_store.base import DocumentChunk
+
+BASE = (
+    "Фродо сидел у окна в Бэг-Энде и смотрел, как над Хоббитоном садится солнце, "
+    "а Гэндальф рассказывал ему о Кольце, найденном Бильбо в пещере под Мглистыми горами"
+)
+
+
+def _chunk(chunk_id, text, **metadata):
+    return DocumentChunk(id=chunk_id, text=text, metadata=metadata, embedding=[])
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingles("Фродо, Сэм и Пин!", 2) == shingles("фродо сэм   и пин", 2)
+    assert len(shingles("одно слово", 3)) == 1
+
+
+def test_lsh_params_fit_signature():
+    bands, rows = lsh_params(128, 0.85)
+    assert bands * rows <= 128
+    assert abs((1 / bands) ** (1 / rows) - 0.85) < 0.05
+
+
+def test_signature_is_deterministic():
+    hashes = shingles(BASE, 3)
+    assert (MinHasher(64).signature(hashes) == MinHasher(64).signature(hashes)).all()
+
+
+def test_near_duplicates_point_to_first_occurrence():
+    chunks = [
+        _chunk("a", BASE, book_id="fellowship"),
+        _chunk("b", "Совсем другой текст: Арагорн ведёт отряд через болота к Заверти, а назгулы идут по следу"),
+        _chunk("c", BASE.upper() + "!", book_id="two_towers"),
+        _chunk("d", BASE + " ночью"),
+    ]
+    result = find_near_duplicates(chunks, threshold=0.8)
+
+    assert [chunk.id for chunk in result.canonical] == ["a", "b"]
+    assert [(match.id, match.canonical_id) for match in result.duplicates] == [("c", "a"), ("d", "a")]
+    assert result.duplicates[0].similarity == 1.0
+    assert 0.8 <= result.duplicates[1].similarity < 1.0
+
+
+def test_distinct_texts_are_all_canonical():
+    chunks = [_chunk(str(i), f"глава {i}: " + " ".join(f"слово{i}_{j}" for j in range(20))) for i in range(10)]
+    result = find_near_duplicates(chunks, threshold=0.85)
+    assert len(result.canonical) == 10
+    assert not result.duplicates
+
+
+def test_duplicate_table_filters_and_survives_save(tmp_path):
+    table = DuplicateTable(
+        [
+            _chunk("c", "текст", canonical_id="a", book_id="two_towers"),
+            _chunk("d", "текст", canonical_id="a", book_id="fellowship"),
+            _chunk("f", "другой", canonical_id="e", book_id="fellowship"),
+        ],
+        index_version="v1",
+    )
+    assert len(table) == 3
+    assert [chunk.id for chunk in table.duplicates_of("a")] == ["c", "d"]
+    assert [chunk.id for chunk in table.duplicates_of("a", {"book_id": "two_towers"})] == ["c"]
+    assert table.duplicates_of("missing") == []
+    assert table.groups_matching({"book_id": "two_towers"}) == ["a"]
+    assert table.groups_matching(None) == ["a", "e"]
+
+    path = tmp_path / "near_duplicates.json"
+    table.save(path)
+    loaded = DuplicateTable.load(path)
+    assert loaded.index_version == "v1"
+    assert loaded.by_canonical == table.by_canonical
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.9])
+def test_identical_texts_group_at_any_threshold(threshold):
+    chunks = [_chunk(str(i), BASE) for i in range(3)]
+    result = find_near_duplicates(chunks, threshold=threshold)
+    assert [chunk.id for chunk in result.canonical] == ["0"]
+    assert {match.canonical_id for match in result.duplicates} == {"0"}
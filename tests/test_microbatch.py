@@ -0,0 +1,65 @@
+"""
+Batching, fan-out of results and errors, and caller timeouts in EmbeddingMicroBatcher.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.embeddings.microbatch import EmbeddingMicroBatcher
+
+
+def _embed_concurrently(batcher: EmbeddingMicroBatcher, texts):
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        futures = [pool.submit(batcher.embed, text) for text in texts]
+        return [future.exception(5) or future.result() for future in futures]
+
+
+def test_concurrent_calls_share_one_request_and_get_their_own_vectors():
+    calls = []
+
+    def embed_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    # Окно длинное: батч уходит, когда набирается max_batch_size
+    batcher = EmbeddingMicroBatcher(embed_fn, window_sec=5.0, max_batch_size=4, timeout_sec=5.0)
+    results = _embed_concurrently(batcher, ["a", "bb", "a", "cccc"])
+
+    assert results == [[1.0], [2.0], [1.0], [4.0]]
+    assert len(calls) == 1
+    assert sorted(calls[0]) == ["a", "bb", "cccc"]  # одинаковые тексты эмбеддятся один раз
+
+
+def test_api_error_fails_every_caller_in_batch():
+    def embed_fn(texts):
+        raise ConnectionError("embeddings API unavailable")
+
+    batcher = EmbeddingMicroBatcher(embed_fn, window_sec=5.0, max_batch_size=3, timeout_sec=5.0)
+    results = _embed_concurrently(batcher, ["a", "b", "c"])
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_short_response_fails_every_caller_in_batch():
+    batcher = EmbeddingMicroBatcher(lambda texts: [[0.0]], window_sec=5.0, max_batch_size=2, timeout_sec=5.0)
+    results = _embed_concurrently(batcher, ["a", "b"])
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert "1 vectors for 2 texts" in str(results[0])
+
+
+def test_caller_times_out_when_request_hangs():
+    release = threading.Event()
+
+    def embed_fn(texts):
+        release.wait(5)
+        return [[0.0] for _ in texts]
+
+    batcher = EmbeddingMicroBatcher(embed_fn, window_sec=0.0, max_batch_size=1, timeout_sec=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.embed("a")
+    finally:
+        release.set()
@@ -0,0 +1,137 @@
+"""
+Round-trip and integrity checks for portable index snapshots.
+"""
+
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+from app.vector_store.base import DocumentChunk, VectorStore
+from app.vector_store.portable import (
+    MANIFEST_MEMBER,
+    TEXTS_MEMBER,
+    VECTORS_MEMBER,
+    SnapshotFormatError,
+    export_snapshot,
+    import_snapshot,
+    iter_snapshot,
+    verify_snapshot,
+)
+
+
+class _MemoryStore(VectorStore):
+    """Минимальное хранилище в памяти: только то, что нужно экспорту и импорту."""
+
+    metric = "cosine"
+    durable_upserts = True
+
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+        self.index_info = {"embedding_model": "test-model", "embedding_dimensions": 3}
+        self.cleared = False
+
+    def clear(self):
+        self.cleared = True
+        self.documents = []
+
+    def upsert_documents(self, documents):
+        self.documents.extend(row.to_chunk() for row in documents)
+
+    def iter_documents(self, batch_size=1000):
+        for start in range(0, len(self.documents), batch_size):
+            yield self.documents[start : start + batch_size]
+
+    def get_index_info(self):
+        return self.index_info
+
+    def set_index_info(self, info):
+        self.index_info = info
+
+
+def _documents(count=5):
+    return [
+        DocumentChunk(
+            id=f"chunk-{i}",
+            text=f"Фродо и Сэм, глава {i}",
+            metadata={"book_id": "fellowship", "chapter_index": i},
+            embedding=[float(i), 0.5, -1.0],
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "index.zip"
+    export_snapshot(_MemoryStore(_documents()), path, batch_size=2)
+    return path
+
+
+def _rewrite_member(path, member, transform):
+    """Пересобрать архив, подменив содержимое одной колонки (manifest остаётся прежним)."""
+    with zipfile.ZipFile(path) as archive:
+        contents = {name: archive.read(name) for name in archive.namelist()}
+    contents[member] = transform(contents[member])
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in contents.items():
+            archive.writestr(name, data)
+
+
+def test_iter_snapshot_round_trip(snapshot):
+    batches = list(iter_snapshot(snapshot, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    chunks = [chunk for batch in batches for chunk in batch.to_chunks()]
+    assert chunks == _documents()
+    assert batches[0].embeddings.dtype == np.float32
+
+
+def test_import_restores_documents_and_index_info(snapshot):
+    store = _MemoryStore(_documents(1))
+    result = import_snapshot(snapshot, store, batch_size=3)
+    assert result["count"] == 5 and result["dim"] == 3
+    assert store.cleared
+    assert store.documents == _documents()
+    assert store.index_info == {"embedding_model": "test-model", "embedding_dimensions": 3}
+
+
+def test_tampered_column_fails_checksum(snapshot):
+    _rewrite_member(snapshot, TEXTS_MEMBER, lambda data: data.replace("Сэм".encode(), "Пин".encode(), 1))
+    with pytest.raises(SnapshotFormatError, match=f"Checksum mismatch for {TEXTS_MEMBER}"):
+        verify_snapshot(snapshot)
+
+
+def test_import_rejects_corrupt_snapshot_before_clearing_store(snapshot):
+    _rewrite_member(snapshot, VECTORS_MEMBER, lambda data: b"\xff" * 4 + data[4:])
+    store = _MemoryStore(_documents(2))
+    with pytest.raises(SnapshotFormatError, match="Checksum mismatch"):
+        import_snapshot(snapshot, store)
+    assert not store.cleared
+    assert store.documents == _documents(2)
+
+
+def test_tampered_manifest_checksum_is_detected(snapshot):
+    def bump(data):
+        manifest = json.loads(data)
+        manifest["checksum"] = "0" * 64
+        return json.dumps(manifest).encode()
+
+    _rewrite_member(snapshot, MANIFEST_MEMBER, bump)
+    with pytest.raises(SnapshotFormatError, match="Manifest checksum mismatch"):
+        verify_snapshot(snapshot)
+
+
+def test_iter_snapshot_detects_truncated_vectors(snapshot):
+    _rewrite_member(snapshot, VECTORS_MEMBER, lambda data: data[:-4])
+    with pytest.raises(SnapshotFormatError, match="ended early"):
+        list(iter_snapshot(snapshot, batch_size=2))
+    with pytest.raises(SnapshotFormatError):
+        verify_snapshot(snapshot)
+
+
+def test_non_snapshot_file_is_rejected(tmp_path):
+    path = tmp_path / "not-a-snapshot.zip"
+    path.write_bytes(b"plain text")
+    with pytest.raises(SnapshotFormatError, match="not an index snapshot"):
+        list(iter_snapshot(path))
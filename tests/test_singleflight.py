@@ -0,0 +1,103 @@
+"""
+Coalescing of identical concurrent calls in SingleFlight.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.rag.singleflight import SingleFlight
+
+
+def _tracking_joins(flight: SingleFlight, expected: int) -> threading.Event:
+    """Событие, которое взводится, когда expected вызовов встали в очередь за ключом."""
+    joined = threading.Event()
+    lock = threading.Lock()
+    count = 0
+    original = flight._join
+
+    def join(key):
+        nonlocal count
+        result = original(key)
+        with lock:
+            count += 1
+            if count == expected:
+                joined.set()
+        return result
+
+    flight._join = join
+    return joined
+
+
+def test_concurrent_calls_share_one_execution():
+    flight: SingleFlight[str] = SingleFlight()
+    joined = _tracking_joins(flight, 4)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        assert joined.wait(5)
+        release.wait(5)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "q", work) for _ in range(4)]
+        assert joined.wait(5)
+        assert flight.in_flight() == 1
+        release.set()
+        results = [f.result(5) for f in futures]
+
+    assert len(calls) == 1
+    assert [value for value, _ in results] == ["answer"] * 4
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert flight.in_flight() == 0
+
+
+def test_leader_exception_reaches_every_waiter():
+    flight: SingleFlight[str] = SingleFlight()
+    joined = _tracking_joins(flight, 3)
+
+    def fail():
+        assert joined.wait(5)
+        raise RuntimeError("llm down")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, "q", fail) for _ in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="llm down"):
+                future.result(5)
+    assert flight.in_flight() == 0
+
+
+def test_key_is_released_and_result_not_cached():
+    flight: SingleFlight[int] = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do("q", lambda: next(counter)) == (0, False)
+    assert flight.do("q", lambda: next(counter)) == (1, False)
+    assert flight.do("other", lambda: next(counter)) == (2, False)
+
+
+def test_do_async_shares_result():
+    flight: SingleFlight[str] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("q", work))
+        while not flight.in_flight():
+            await asyncio.sleep(0.001)
+        follower = asyncio.create_task(flight.do_async("q", work))
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(main()) == [("answer", False), ("answer", True)]
+    assert len(calls) == 1
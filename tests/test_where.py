@@ -0,0 +1,38 @@
+"""
+Metadata filter normalization and in-memory matching shared by the vector store backends.
+"""
+
+import pytest
+
+from app.vector_store.base import matches_where, normalize_where
+
+
+def test_normalize_plain_value_and_operators():
+    where = {"book_id": "fellowship", "book_part": {"$eq": 2}, "chapter_index": {"$in": [3, 4]}}
+    assert normalize_where(where) == {"book_id": ["fellowship"], "book_part": [2], "chapter_index": [3, 4]}
+
+
+def test_normalize_combines_eq_and_in():
+    assert normalize_where({"chapter_index": {"$eq": 1, "$in": [2, 3]}}) == {"chapter_index": [1, 2, 3]}
+
+
+def test_normalize_drops_empty_conditions():
+    assert normalize_where(None) == {}
+    assert normalize_where({"book_id": None, "book_part": 1}) == {"book_part": [1]}
+
+
+def test_normalize_rejects_unknown_operator():
+    with pytest.raises(ValueError, match=r"\$gt"):
+        normalize_where({"chapter_index": {"$gt": 3}})
+
+
+def test_matches_where_requires_every_field():
+    metadata = {"book_id": "two_towers", "book_part": 1, "chapter_index": 5}
+    assert matches_where(metadata, None)
+    assert matches_where(metadata, {"book_id": "two_towers", "chapter_index": {"$in": [4, 5]}})
+    assert not matches_where(metadata, {"book_id": "two_towers", "chapter_index": {"$in": [1, 2]}})
+    assert not matches_where(metadata, {"book_id": "fellowship"})
+
+
+def test_matches_where_missing_field_does_not_match():
+    assert not matches_where({"book_id": "fellowship"}, {"book_part": 1})